@@ -5,12 +5,20 @@ from fastapi import FastAPI, Depends, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from typing import Optional
+import os
 import time
 
 from core.database import get_db
 # Models imported lazily by repositories/endpoints; keep app surface minimal
-from core.repositories import ServiceRepository, DocumentRepository, FAQRepository
+from core.repositories import (
+    ServiceRepository, DocumentRepository, FAQRepository,
+    SERVICE_LIST_COLUMNS, DOCUMENT_LIST_COLUMNS, FAQ_LIST_COLUMNS,
+)
 from core.search import SearchEngine
+from core.model_registry import start_background_warm_up
+from core.embedding_cache import get_query_cache
+from core.search_cache import get_result_cache
+from core.vector_index import start_background_refresh
 from routes.api_endpoints import router as api_router
 from routes.v1_endpoints import router as v1_router
 from routes.graphql_schema import get_graphql_router
@@ -50,6 +58,13 @@ except Exception:
 register_middlewares(app)
 register_exception_handlers(app)
 
+@app.on_event("startup")
+async def warm_up_embedding_model():
+    # Load the shared embedding model off the request path
+    start_background_warm_up()
+    if os.getenv('SEARCH_INDEX_BACKEND', 'pgvector').lower() == 'numpy':
+        start_background_refresh()
+
 # Health Check
 @app.get("/health")
 async def health_check():
@@ -63,20 +78,23 @@ async def metrics(db: Session = Depends(get_db), _auth: bool = Depends(require_a
     d = DocumentRepository(db).count()
     f = FAQRepository(db).count()
     c = ContentChunkRepository(db).count()
-    return {"services": s, "documents": d, "faqs": f, "content_chunks": c}
+    return {"services": s, "documents": d, "faqs": f, "content_chunks": c, "embedding_cache": get_query_cache().stats(), "search_cache": get_result_cache().stats()}
 
-# Search Endpoint
+# Search Endpoint (plain def: FastAPI runs it on the threadpool, so concurrent searches
+# embed their queries in one batch instead of blocking the event loop one by one)
 @app.post("/search")
-async def search(
+def search(
     query: str,
     service_id: Optional[int] = None,
     limit: int = Query(10, ge=1, le=100),
+    language: Optional[str] = None,
+    category: Optional[str] = None,
     db: Session = Depends(get_db),
     _auth: bool = Depends(require_api_key)
 ):
     """Search across all content types"""
     search_engine = SearchEngine(db)
-    results = search_engine.search(query, service_id, limit)
+    results = search_engine.search(query, service_id, limit, language=language, category=category)
     return results
 
 # Services Endpoints
@@ -93,11 +111,11 @@ async def get_services(
     service_repo = ServiceRepository(db)
     
     if category:
-        services = service_repo.get_by_category(category)
+        services = service_repo.get_by_category(category, columns=SERVICE_LIST_COLUMNS)
     elif active_only:
-        services = service_repo.get_active_services()
+        services = service_repo.get_active_services(columns=SERVICE_LIST_COLUMNS)
     else:
-        services = service_repo.get_all(skip=skip, limit=limit)
+        services = service_repo.get_all(skip=skip, limit=limit, columns=SERVICE_LIST_COLUMNS)
     
     return [{
         'service_id': s.service_id,
@@ -140,12 +158,13 @@ async def get_documents(
     """Get documents with optional filtering"""
     document_repo = DocumentRepository(db)
     
+    # Projected rows: raw_content and embedding stay in the database
     if service_id and mandatory_only:
-        documents = document_repo.get_mandatory_documents(service_id)
+        documents = document_repo.get_mandatory_documents(service_id, columns=DOCUMENT_LIST_COLUMNS)
     elif service_id:
-        documents = document_repo.get_by_service(service_id)
+        documents = document_repo.get_by_service(service_id, columns=DOCUMENT_LIST_COLUMNS)
     else:
-        documents = document_repo.get_all(skip=skip, limit=limit)
+        documents = document_repo.get_all(skip=skip, limit=limit, columns=DOCUMENT_LIST_COLUMNS)
     
     return [{
         'doc_id': d.doc_id,
@@ -170,9 +189,9 @@ async def get_faqs(
     faq_repo = FAQRepository(db)
     
     if service_id:
-        faqs = faq_repo.get_by_service(service_id)
+        faqs = faq_repo.get_by_service(service_id, columns=FAQ_LIST_COLUMNS)
     else:
-        faqs = faq_repo.get_all(skip=skip, limit=limit)
+        faqs = faq_repo.get_all(skip=skip, limit=limit, columns=FAQ_LIST_COLUMNS)
     
     return [{
         'faq_id': f.faq_id,
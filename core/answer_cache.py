@@ -0,0 +1,146 @@
+"""
+Semantic answer cache for the chat service's /chat pipeline.
+
+An entry maps (query embedding, retrieved-context fingerprint, prompt version)
+to the final response. A new query is served from the cache when an unexpired
+entry has cosine similarity >= ANSWER_CACHE_THRESHOLD with it, the same prompt
+version, and the same fingerprint, i.e. the main-query FAISS search returned the
+same chunks. The fingerprint check keeps "similar wording, different documents"
+from sharing an answer.
+
+Entries are tagged with the global FAISS index version; when the index is
+rebuilt the whole cache is dropped. The fingerprint also covers the version of
+the store that served the main query, so a rebuilt service shard (which keeps
+its chunk ids) does not match older entries either. Only answers the model
+actually wrote are stored. Eviction is LRU with a TTL.
+"""
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+import numpy as np
+
+
+def context_fingerprint(doc_ids: Iterable[str], top: int = 5, version: Optional[Hashable] = None) -> str:
+    """Order-insensitive digest of the top retrieved chunk ids and the version of the index holding them."""
+    ids = sorted(list(doc_ids)[:top])
+    return hashlib.sha1("\0".join([str(version)] + ids).encode("utf-8")).hexdigest()[:16]
+
+
+def _unit(vector: Any) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+class SemanticAnswerCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, threshold: float = 0.92):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl = float(ttl)
+        self.threshold = float(threshold)
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        self._index_version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _sync_version(self, index_version: Optional[Hashable]) -> None:
+        # Caller holds the lock
+        if index_version != self._index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._index_version = index_version
+
+    def _candidates(self, vector: np.ndarray, prompt_version: str):
+        """(similarity, entry id) of live entries above the threshold, best first. Caller holds the lock."""
+        now = time.monotonic()
+        for entry_id in [i for i, e in self._entries.items() if now - e["created"] > self.ttl]:
+            del self._entries[entry_id]
+        scored = [
+            (float(np.dot(vector, entry["vector"])), entry_id)
+            for entry_id, entry in self._entries.items()
+            if entry["prompt_version"] == prompt_version
+        ]
+        return sorted((s for s in scored if s[0] >= self.threshold), reverse=True)
+
+    def has_similar(self, vector: Any, prompt_version: str, index_version: Optional[Hashable] = None) -> bool:
+        """Cheap pre-check before retrieval: is there any entry the query could match?"""
+        with self._lock:
+            self._sync_version(index_version)
+            return bool(self._candidates(_unit(vector), prompt_version))
+
+    def get(self, vector: Any, fingerprint: str, prompt_version: str,
+            index_version: Optional[Hashable] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._sync_version(index_version)
+            for similarity, entry_id in self._candidates(_unit(vector), prompt_version):
+                entry = self._entries[entry_id]
+                if entry["fingerprint"] == fingerprint:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    payload = copy.deepcopy(entry["payload"])
+                    payload["similarity"] = round(similarity, 4)
+                    return payload
+            self.misses += 1
+            return None
+
+    def put(self, vector: Any, fingerprint: str, prompt_version: str, payload: Dict[str, Any],
+            index_version: Optional[Hashable] = None) -> None:
+        with self._lock:
+            self._sync_version(index_version)
+            self._entries[self._next_id] = {
+                "vector": _unit(vector),
+                "fingerprint": fingerprint,
+                "prompt_version": prompt_version,
+                "payload": copy.deepcopy(payload),
+                "created": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+_ANSWER_CACHE: Optional[SemanticAnswerCache] = None
+_ANSWER_CACHE_LOCK = threading.Lock()
+
+
+def answer_cache_enabled() -> bool:
+    return os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Process-wide semantic answer cache configured from the environment."""
+    global _ANSWER_CACHE
+    if _ANSWER_CACHE is None:
+        with _ANSWER_CACHE_LOCK:
+            if _ANSWER_CACHE is None:
+                _ANSWER_CACHE = SemanticAnswerCache(
+                    max_entries=int(os.getenv('ANSWER_CACHE_SIZE', '1024')),
+                    ttl=float(os.getenv('ANSWER_CACHE_TTL', '3600')),
+                    threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.92')),
+                )
+    return _ANSWER_CACHE
@@ -1,8 +1,12 @@
 import os
 import sys
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
 # =============================================
 # CRITICAL FIX: Add parent directory to Python path
@@ -47,10 +51,19 @@ try:
         ActionPlanningAgent,
         LocationServiceAgent,
         FormAssistanceAgent,
-        initialize_llm,
-        LLM_INITIALIZED,
-        GEMINI_LLM
+        start_llm_initialization,
+        llm_ready,
+        llm_status,
+        VECTOR_DB,
+        VECTOR_SHARDS,
+        get_rate_limiter,
+        get_llm_memo,
+        agenerate_answer,
+        astream_answer,
+        embed_query_vector,
+        PROMPT_VERSION
     )
+    from core.answer_cache import answer_cache_enabled, context_fingerprint, get_answer_cache
     print("✅ Successfully imported all agents")
 except ImportError as e:
     print(f"❌ Failed to import agents: {e}")
@@ -64,18 +77,44 @@ app = FastAPI(
     description="A service for routing complex user queries to specialized LLM agents.",
 )
 
+# Gemini calls are awaited on the event loop; FAISS search and embedding run on a small
+# thread pool, and at most CHAT_MAX_CONCURRENCY chats are in the pipeline at once.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "32"))
+CHAT_CPU_WORKERS = int(os.getenv("CHAT_CPU_WORKERS", "4"))
+_chat_slots = asyncio.Semaphore(CHAT_MAX_CONCURRENCY)
+_cpu_executor = ThreadPoolExecutor(max_workers=CHAT_CPU_WORKERS, thread_name_prefix="chat-cpu")
+_chats_in_flight = 0
+SPECULATIVE_RETRIEVAL = os.getenv("CHAT_SPECULATIVE_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+
+async def run_cpu(fn, *args):
+    """Run blocking/CPU-bound agent work off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_cpu_executor, fn, *args)
+
+def _primary_fingerprint(primary):
+    """Identity of the chunks the main query retrieved, and of the index generation (global or
+    shard) they came from; None when retrieval was unavailable."""
+    if not primary:
+        return None
+    generation = primary["generation"]
+    return context_fingerprint((doc_id for _, doc_id, _ in primary["hits"]),
+                               version=generation.version if generation is not None else None)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize LLM when the FastAPI app starts"""
     print("🚀 Starting FastAPI application...")
-    print("🔑 LLM initialization status:")
-    print(f"   - LLM Initialized: {LLM_INITIALIZED}")
-    print(f"   - LLM Available: {LLM_INITIALIZED and GEMINI_LLM is not None}")
-    
-    if LLM_INITIALIZED and GEMINI_LLM is not None:
-        print("✅ LLM available - API is ready with comprehensive response capabilities!")
-    else:
-        print("⚠️  LLM not available - API will use enhanced fallback modes")
+    # Probing Gemini models runs in the background (and is refreshed every LLM_PROBE_TTL);
+    # chats use the enhanced fallback modes until /health reports llm.state == "ready"
+    start_llm_initialization()
+    print("🔄 Initializing Gemini LLM in the background...")
+
+    # Open the FAISS index off the startup path; /health reports when it is ready
+    if os.getenv("FAISS_PRELOAD", "true").lower() in ("1", "true", "yes"):
+        VECTOR_DB.start_background_load()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    _cpu_executor.shutdown(wait=False)
 
 class ChatRequest(BaseModel):
     message: str
@@ -94,9 +133,12 @@ async def health_check():
     
     return {
         "status": "healthy",
-        "llm_initialized": LLM_INITIALIZED,
-        "llm_available": LLM_INITIALIZED and GEMINI_LLM is not None,
+        "llm_initialized": llm_ready(),
+        "llm_available": llm_ready(),
+        "llm": llm_status(),
         "api_key_available": bool(gemini_key),
+        "vector_store": VECTOR_DB.status(),
+        "vector_shards": VECTOR_SHARDS.status(),
         "service": "Multi-Agent Chat Service",
         "capabilities": "Comprehensive document search with natural responses"
     }
@@ -106,21 +148,96 @@ async def chat_endpoint(request: ChatRequest):
     """
     Processes the user query through the agent pipeline and routes to the appropriate response agent.
     """
+    global _chats_in_flight
+    # Requests beyond the limit wait here without holding any pipeline resources
+    async with _chat_slots:
+        _chats_in_flight += 1
+        try:
+            async for event, data in chat_events(request):
+                if event == "done":
+                    return data
+        finally:
+            _chats_in_flight -= 1
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Server-sent events for the same pipeline as /chat: `stage` events as each agent starts,
+    `token` events while the answer is generated, then `done` with the full ChatResponse
+    (whose `response` is authoritative, e.g. when a too-short answer was replaced). An `error`
+    event means Gemini failed mid-answer and the tokens so far should be discarded.
+    """
+    async def sse():
+        global _chats_in_flight
+        yield _sse("stage", {"stage": "queued"})
+        async with _chat_slots:
+            _chats_in_flight += 1
+            try:
+                async for event, data in chat_events(request, stream=True):
+                    yield _sse(event, data.model_dump() if isinstance(data, ChatResponse) else data)
+            finally:
+                _chats_in_flight -= 1
+
+    # No proxy buffering, or the first bytes would only arrive with the last
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def chat_events(request: ChatRequest, stream: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """The agent pipeline as (event, data) pairs; always ends with ("done", ChatResponse).
+
+    With `stream`, the answering agent's completion is streamed as "token" events, and an
+    "error" event reports a completion that broke off midway (never cached).
+    """
     query = request.message
     print(f"\n💬 Received query: {query}")
     
     try:
+        # 0. Semantic answer cache: embed once (retrieval below reuses the cached vector)
+        cache = get_answer_cache() if answer_cache_enabled() and llm_ready() else None
+        query_vector = None
+        if cache is not None:
+            try:
+                query_vector = await run_cpu(embed_query_vector, query)
+            except Exception as e:
+                # No embedding model: answer without the cache
+                print(f"⚠️ Answer cache skipped: {e}")
+                cache = None
+        index_version = VECTOR_DB.index_version()
+
+        # Main-query retrieval doesn't need the understanding result: start it now so the
+        # FAISS search overlaps the LLM round trip of step 1
+        d_agent = DocumentRetrievalAgent()
+        primary_task = None
+        if SPECULATIVE_RETRIEVAL or cache is not None:
+            primary_task = asyncio.ensure_future(run_cpu(d_agent.primary, query))
+
+        if cache is not None and cache.has_similar(query_vector, PROMPT_VERSION, index_version):
+            # A similar question was answered before: serve it if it was built on the same chunks
+            fingerprint = _primary_fingerprint(await primary_task)
+            cached = cache.get(query_vector, fingerprint, PROMPT_VERSION, index_version) if fingerprint else None
+            if cached is not None:
+                print(f"   ⚡ Semantic cache hit (similarity {cached['similarity']})")
+                cached["context"]["answer_cache"] = {"similarity": cached.pop("similarity")}
+                yield "done", ChatResponse(**cached)
+                return
+
         # 1. Query Understanding Agent
+        yield "stage", {"stage": "understanding"}
         q_agent = QueryUnderstandingAgent()
-        understanding_result = q_agent.process(query)
+        understanding_result = await q_agent.aprocess(query)
         print(f"   Understanding: topic={understanding_result.get('topic')}, action={understanding_result.get('action_required')}")
         
         # CRITICAL FIX: Store original query in context for better action planning
         understanding_result["original_query"] = query
         
-        # 2. Document Retrieval Agent
-        d_agent = DocumentRetrievalAgent()
-        retrieved_docs = d_agent.process(query, understanding_result)
+        # 2. Document Retrieval Agent (focus areas and related terms; main query only if the
+        # speculative search went to a different shard than the detected topic)
+        yield "stage", {"stage": "retrieval", "topic": understanding_result.get("topic")}
+        primary = await primary_task if primary_task is not None else None
+        retrieved_docs = await run_cpu(d_agent.process, query, understanding_result, primary)
         print(f"   Retrieved {len(retrieved_docs)} documents for comprehensive coverage")
         
         # Prepare list of unique document sources
@@ -129,23 +246,25 @@ async def chat_endpoint(request: ChatRequest):
             doc_sources = [doc['source'] for doc in retrieved_docs if doc.get('source')]
         
         # 3. Action Planning Agent (with enhanced context)
+        yield "stage", {"stage": "planning"}
         a_agent = ActionPlanningAgent()
         plan = a_agent.process(understanding_result)
         final_action = plan.get("action", "respond")
         print(f"   Action Plan: {final_action} (Confidence: {plan.get('confidence', 'medium')})")
         
         final_response_text = "I'm sorry, I couldn't process that request. Please try rephrasing."
+        # Only the model's own answer may be cached: not fallbacks, canned replies or error text
+        from_model = False
 
         # --- 4. EXECUTE THE PLANNED ACTION ---
+        answer = None  # (agent, *arguments) when an LLM-backed agent writes the reply
         if final_action == "form_assistance":
             print("   → Routing to FormAssistanceAgent for comprehensive form guidance")
-            f_agent = FormAssistanceAgent()
-            final_response_text = f_agent.process(retrieved_docs, query)
+            answer = (FormAssistanceAgent(), retrieved_docs, query)
             
         elif final_action == "location_service":
             print("   → Routing to LocationServiceAgent for location help")
-            l_agent = LocationServiceAgent()
-            final_response_text = l_agent.process(query)
+            answer = (LocationServiceAgent(), query)
 
         elif final_action == "ask":
             print("   → Asking for clarification")
@@ -153,8 +272,21 @@ async def chat_endpoint(request: ChatRequest):
             
         else: # final_action == "respond"
             print("   → Routing to SummarizationAgent for comprehensive response")
-            s_agent = SummarizationAgent()
-            final_response_text = s_agent.process(retrieved_docs, query)
+            answer = (SummarizationAgent(), retrieved_docs, query)
+
+        if answer is not None:
+            agent, *args = answer
+            yield "stage", {"stage": "generating", "action": final_action}
+            if stream:
+                async for event, data in astream_answer(agent, *args):
+                    if event == "token":
+                        yield "token", {"text": data}
+                    elif event == "error":
+                        yield "error", {"stage": "generating", "message": data}
+                    else:
+                        final_response_text, from_model = data
+            else:
+                final_response_text, from_model = await agenerate_answer(agent, *args)
 
         # --- 5. COMPOSE FINAL RESPONSE ---
         updated_context = {
@@ -170,16 +302,22 @@ async def chat_endpoint(request: ChatRequest):
             print("   ⚠️ Response too short, using enhanced fallback")
             from core.llm_agent_logic import enhanced_fallback_response
             final_response_text = enhanced_fallback_response(query, "summarization")
+            from_model = False
         
         print(f"   ✅ Comprehensive response generated successfully")
         print(f"   📝 Response length: {len(final_response_text)} characters")
         
-        return ChatResponse(
+        result = ChatResponse(
             response=final_response_text,
             action=final_action,
             context=updated_context,
             sources=list(set(doc_sources))
         )
+        fingerprint = _primary_fingerprint(primary)
+        # A fallback understanding (LLM error) may have picked the wrong topic and action
+        if cache is not None and fingerprint and from_model and understanding_result.get("source") != "fallback":
+            cache.put(query_vector, fingerprint, PROMPT_VERSION, result.model_dump(), index_version)
+        yield "done", result
         
     except Exception as e:
         print(f"❌ Error in chat endpoint: {e}")
@@ -190,7 +328,7 @@ async def chat_endpoint(request: ChatRequest):
         from core.llm_agent_logic import enhanced_fallback_response
         fallback_response = enhanced_fallback_response(query, "summarization")
         
-        return ChatResponse(
+        yield "done", ChatResponse(
             response=fallback_response if fallback_response else "I encountered an error while processing your request. Please try again.",
             action="error",
             context={"error": str(e)},
@@ -201,9 +339,14 @@ async def chat_endpoint(request: ChatRequest):
 async def debug_agents():
     """Debug endpoint to check agent status and capabilities"""
     return {
-        "llm_initialized": LLM_INITIALIZED,
-        "gemini_available": GEMINI_LLM is not None,
-        "vector_db_loaded": True,  # Assuming VECTOR_DB is loaded in llm_agent_logic
+        "llm_initialized": llm_ready(),
+        "gemini_available": llm_ready(),
+        "llm": llm_status(),
+        "vector_db_loaded": VECTOR_DB.ready,
+        "llm_rate_limit": get_rate_limiter().stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "llm_memo": get_llm_memo().stats(),
+        "chat_concurrency": {"limit": CHAT_MAX_CONCURRENCY, "in_flight": _chats_in_flight, "cpu_workers": CHAT_CPU_WORKERS},
         "agents_available": {
             "QueryUnderstandingAgent": True,
             "DocumentRetrievalAgent": True,
@@ -226,11 +369,11 @@ async def test_query(request: ChatRequest):
     try:
         # Test Query Understanding
         q_agent = QueryUnderstandingAgent()
-        understanding_result = q_agent.process(query)
+        understanding_result = await q_agent.aprocess(query)
         
         # Test Document Retrieval
         d_agent = DocumentRetrievalAgent()
-        retrieved_docs = d_agent.process(query, understanding_result)
+        retrieved_docs = await run_cpu(d_agent.process, query, understanding_result)
         
         # Test Action Planning
         a_agent = ActionPlanningAgent()
@@ -242,14 +385,14 @@ async def test_query(request: ChatRequest):
             "understanding": understanding_result,
             "documents_retrieved": len(retrieved_docs),
             "action_plan": plan,
-            "llm_initialized": LLM_INITIALIZED
+            "llm_initialized": llm_ready()
         }
         
     except Exception as e:
         return {
             "query": query,
             "error": str(e),
-            "llm_initialized": LLM_INITIALIZED
+            "llm_initialized": llm_ready()
         }
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
 """
 Streamlined Database Configuration
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
@@ -16,6 +16,27 @@ engine = create_engine(
     max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
     pool_recycle=1800,
 )
+# ANN search-time knobs, applied to every pooled connection
+VECTOR_HNSW_EF_SEARCH = int(os.getenv("VECTOR_HNSW_EF_SEARCH", "64"))
+VECTOR_IVFFLAT_PROBES = int(os.getenv("VECTOR_IVFFLAT_PROBES", "10"))
+
+@event.listens_for(engine, "connect")
+def _set_vector_search_params(dbapi_connection, connection_record):
+    # One transaction per setting: a server that rejects one still gets the other
+    for setting in (f"SET hnsw.ef_search = {VECTOR_HNSW_EF_SEARCH}",
+                    f"SET ivfflat.probes = {VECTOR_IVFFLAT_PROBES}"):
+        try:
+            cursor = dbapi_connection.cursor()
+            cursor.execute(setting)
+            cursor.close()
+            dbapi_connection.commit()
+        except Exception:
+            # Not PostgreSQL or setting rejected; that index type runs with the server default
+            try:
+                dbapi_connection.rollback()
+            except Exception:
+                pass
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -0,0 +1,110 @@
+"""
+Micro-batching front-end for query embeddings.
+
+Concurrent callers each submit one text; a worker thread gathers whatever arrives
+within a short window (EMBEDDING_BATCH_WINDOW_MS, up to EMBEDDING_BATCH_MAX items)
+and runs a single batched `encode`, then hands every caller its own vector.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from .model_registry import get_embedding_model, get_model_name
+
+_BATCHERS: Dict[Tuple[str, Optional[str]], "EmbeddingBatcher"] = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+class EmbeddingBatcher:
+    def __init__(self, model: Any, window_ms: float = 3.0, max_batch: int = 32, timeout: float = 30.0):
+        self.model = model
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(int(max_batch), 1)
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def encode(self, text: str):
+        """Encode one text; blocks until the batch containing it has been computed."""
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts: List[str]) -> List[Any]:
+        """Submit several texts at once; they may share a batch with other callers."""
+        self._ensure_worker()
+        futures = []
+        for text in texts:
+            fut: Future = Future()
+            self._queue.put((text or "", fut))
+            futures.append(fut)
+        return [fut.result(timeout=self.timeout) for fut in futures]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": (self.items / self.batches) if self.batches else 0.0,
+        }
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.model.encode(texts, batch_size=len(texts))
+                self.batches += 1
+                self.items += len(texts)
+                for (_, fut), vec in zip(batch, vectors):
+                    fut.set_result(vec)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+
+def batching_enabled() -> bool:
+    return os.getenv('EMBEDDING_BATCHING', 'true').lower() in ('1', 'true', 'yes')
+
+def get_batcher(model_name: Optional[str] = None, device: Optional[str] = None) -> Optional[EmbeddingBatcher]:
+    """Return the process-wide batcher for a registry model, or None if the model is unavailable."""
+    key = (model_name or get_model_name(), device)
+    batcher = _BATCHERS.get(key)
+    if batcher is not None:
+        return batcher
+    model = get_embedding_model(*key)
+    if model is None:
+        return None
+    with _BATCHERS_LOCK:
+        if key not in _BATCHERS:
+            _BATCHERS[key] = EmbeddingBatcher(
+                model,
+                window_ms=float(os.getenv('EMBEDDING_BATCH_WINDOW_MS', '3')),
+                max_batch=int(os.getenv('EMBEDDING_BATCH_MAX', '32')),
+            )
+        return _BATCHERS[key]
@@ -0,0 +1,142 @@
+"""
+Bounded LRU cache for query embeddings.
+
+Keys are (model name, normalized query text), so "Link Aadhaar with mobile?" and
+"link aadhaar  with mobile" share one entry. An optional on-disk tier
+(EMBEDDING_CACHE_DIR) keeps vectors across restarts as one .npy file per key.
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+_WS_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t\n.,;:!?¿¡\"'()[]{}-–—।"
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold, NFKC-normalize, collapse whitespace and trim edge punctuation."""
+    norm = unicodedata.normalize("NFKC", text or "").casefold()
+    norm = _WS_RE.sub(" ", norm)
+    return norm.strip(_EDGE_PUNCT)
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int = 2048, disk_dir: Optional[str] = None):
+        self.max_entries = max(int(max_entries), 1)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, text: str, model_name: str, compute: Callable[[str], Any]) -> np.ndarray:
+        """Return the cached vector for `text`, computing it from the normalized text on a miss."""
+        norm = normalize_query(text)
+        key = (model_name, norm)
+        vec = self.get(key)
+        if vec is not None:
+            return vec
+        vec = np.asarray(compute(norm), dtype=np.float32)
+        self.put(key, vec)
+        return vec
+
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vec
+        vec = self._read_disk(key)
+        with self._lock:
+            if vec is not None:
+                self.disk_hits += 1
+                self._store(key, vec)
+            else:
+                self.misses += 1
+        return vec
+
+    def put(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        with self._lock:
+            self._store(key, vec)
+        self._write_disk(key, vec)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk_tier": str(self.disk_dir) if self.disk_dir else None,
+            }
+
+    def _store(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        self._entries[key] = vec
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: Tuple[str, str]) -> Optional[Path]:
+        if self.disk_dir is None:
+            return None
+        digest = hashlib.md5(f"{key[0]}\0{key[1]}".encode("utf-8")).hexdigest()
+        return self.disk_dir / f"{digest}.npy"
+
+    def _read_disk(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        path = self._disk_path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            return np.load(path)
+        except Exception:
+            return None
+
+    def _write_disk(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        path = self._disk_path(key)
+        if path is None:
+            return
+        try:
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, vec)
+            os.replace(tmp, path)
+        except Exception:
+            pass
+
+
+_QUERY_CACHE: Optional[QueryEmbeddingCache] = None
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+def query_cache_enabled() -> bool:
+    return os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def get_query_cache() -> QueryEmbeddingCache:
+    """Process-wide query embedding cache configured from the environment."""
+    global _QUERY_CACHE
+    if _QUERY_CACHE is None:
+        with _QUERY_CACHE_LOCK:
+            if _QUERY_CACHE is None:
+                _QUERY_CACHE = QueryEmbeddingCache(
+                    max_entries=int(os.getenv('EMBEDDING_CACHE_SIZE', '2048')),
+                    disk_dir=os.getenv('EMBEDDING_CACHE_DIR') or None,
+                )
+    return _QUERY_CACHE
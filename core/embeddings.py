@@ -1,23 +1,16 @@
-import os
 from typing import List, Dict, Any
 from sqlalchemy import text
-from .database import SessionLocal
+from .database import SessionLocal, engine
+from .ops.vector_indexes import VectorIndexManager
 from .search import SearchEngine
+from .model_registry import get_model_name, get_embedding_model, embeddings_enabled
 
 
-def get_model_name() -> str:
-    return os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
-
 def get_transformer():
-    """Lazily import transformer only if embeddings are enabled."""
-    enabled = os.getenv('EMBEDDING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
-    if not enabled:
-        return None
-    try:
-        from sentence_transformers import SentenceTransformer
-        return SentenceTransformer(get_model_name())
-    except Exception:
+    """Return the shared transformer from the model registry if embeddings are enabled."""
+    if not embeddings_enabled():
         return None
+    return get_embedding_model(get_model_name())
 
 def configure_pgvector() -> bool:
     """Verify pgvector extension is available."""
@@ -46,19 +39,14 @@ def vector_similarity_search(db, query: str, limit: int = 5) -> Dict[str, Any]:
     return SearchEngine(db).search(query, limit=limit)
 
 def optimize_vector_indexing() -> bool:
-    """Create ivfflat indexes for vector columns if pgvector is available."""
-    db = SessionLocal()
+    """Create or re-plan HNSW/IVFFlat indexes for vector columns if pgvector is available."""
     try:
-        conn = db.connection()
-        res = conn.execute(text("SELECT extname FROM pg_extension WHERE extname='vector'"))
-        if res.fetchone():
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_documents_embedding ON documents USING ivfflat (embedding vector_cosine_ops);"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_chunks_embedding ON content_chunks USING ivfflat (embedding vector_cosine_ops);"))
-            db.commit()
-        db.close()
-        return True
+        report = VectorIndexManager(engine).ensure_indexes()
+        for entry in report:
+            print(f"   {entry['index']}: {entry.get('action')} rows={entry.get('rows')} "
+                  f"plan={entry.get('plan')} size={entry.get('size_bytes')} build_s={entry.get('build_seconds')}")
+        return all(entry.get("action") != "error" for entry in report)
     except Exception:
-        db.close()
         return False
 
 def ensure_multilingual_model() -> str:
@@ -0,0 +1,174 @@
+"""
+Trained FAISS ANN indexes (IVF-Flat, IVF-PQ) for the chat agents' store, and a
+recall/latency benchmark against exact search.
+
+The builder always keeps the exact flat index (`index.faiss`) as the source of
+truth, since incremental ingest deletes and appends vectors by position. When
+FAISS_INDEX_TYPE is `ivf_flat` or `ivf_pq`, a trained copy is written next to it
+as `index.ann.faiss` with the same vector positions, and that is what
+LazyFaissStore serves. Knobs:
+
+- FAISS_NLIST: inverted lists (default ~4*sqrt(n), capped so each list gets
+  at least 39 training points)
+- FAISS_NPROBE: lists visited per query, set at load time (default 8)
+- FAISS_PQ_M / FAISS_PQ_BITS: PQ code size, m sub-quantizers of `bits` bits
+  each, i.e. m*bits/8 bytes per vector (default 48 x 8 = 48 bytes vs 1536
+  for 384-d float32)
+"""
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ANN_INDEX_FILE = "index.ann.faiss"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq")
+
+
+def default_nlist(n: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def index_type_from_env() -> str:
+    """FAISS_INDEX_TYPE, validated; builders call this before embedding anything."""
+    kind = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{kind}' (expected one of {INDEX_TYPES})")
+    return kind
+
+
+def unsupported_reason(n: int, d: int, kind: str, nlist: Optional[int] = None,
+                       pq_m: int = 48, pq_bits: int = 8) -> Optional[str]:
+    """Why `kind` cannot be trained on n vectors of dimension d, or None if it can."""
+    if kind not in INDEX_TYPES:
+        return f"Unknown FAISS index type '{kind}' (expected one of {INDEX_TYPES})"
+    if kind == "flat":
+        return None
+    lists = nlist or default_nlist(n)
+    if lists > n:
+        return f"{kind} with {lists} lists needs at least {lists} vectors, got {n}"
+    if kind == "ivf_pq":
+        if d % pq_m:
+            return f"FAISS_PQ_M={pq_m} must divide the embedding dimension {d}"
+        if n < 2 ** pq_bits:
+            return f"IVF-PQ with {pq_bits}-bit codes needs at least {2 ** pq_bits} vectors, got {n}"
+    return None
+
+
+def build_ann_index(vectors: np.ndarray, kind: str, nlist: Optional[int] = None,
+                    pq_m: int = 48, pq_bits: int = 8, nprobe: int = 8):
+    """Train an index of type `kind` on `vectors` and add them in order (position i == vector i)."""
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    reason = unsupported_reason(n, d, kind, nlist, pq_m, pq_bits)
+    if reason:
+        raise ValueError(reason)
+    if kind == "flat":
+        index = faiss.IndexFlatL2(d)
+        index.add(vectors)
+        return index
+    nlist = nlist or default_nlist(n)
+    quantizer = faiss.IndexFlatL2(d)
+    if kind == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_L2)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, pq_bits)
+    index.train(vectors)
+    index.add(vectors)
+    index.nprobe = min(nprobe, nlist)
+    return index
+
+
+def set_nprobe(index: Any, nprobe: int) -> None:
+    import faiss
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return
+    ivf.nprobe = min(int(nprobe), ivf.nlist)
+
+
+def index_kind(index: Any) -> str:
+    import faiss
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return "flat"
+    return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+
+
+def flat_vectors(index: Any) -> np.ndarray:
+    """All vectors of a flat index, in position order."""
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_from_env(vectors: np.ndarray):
+    """ANN index configured by FAISS_INDEX_TYPE & co.; None when the flat index is served directly.
+
+    A corpus the configured index cannot be trained on (e.g. fewer vectors than PQ
+    centroids) also gets None, with a warning, rather than failing the build.
+    """
+    kind = index_type_from_env()
+    if kind == "flat":
+        return None
+    nlist = int(os.getenv("FAISS_NLIST", "0")) or None
+    pq_m, pq_bits = int(os.getenv("FAISS_PQ_M", "48")), int(os.getenv("FAISS_PQ_BITS", "8"))
+    reason = unsupported_reason(len(vectors), vectors.shape[1], kind, nlist, pq_m, pq_bits)
+    if reason:
+        print(f"⚠️ {reason}; serving the exact flat index instead")
+        return None
+    return build_ann_index(vectors, kind, nlist=nlist, pq_m=pq_m, pq_bits=pq_bits,
+                           nprobe=int(os.getenv("FAISS_NPROBE", "8")))
+
+
+def index_bytes(index: Any) -> int:
+    import faiss
+    return int(faiss.serialize_index(index).size)
+
+
+def benchmark(vectors: np.ndarray, configs: List[Dict[str, Any]], k: int = 10,
+              n_queries: int = 200, seed: int = 0) -> List[Dict[str, Any]]:
+    """Recall@k against exact search and single-query p50/p99 latency for each config.
+
+    Queries are stored chunk vectors sampled from `vectors`, so the numbers
+    reflect our own corpus rather than a synthetic distribution.
+    """
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for config in configs:
+        entry: Dict[str, Any] = dict(config)
+        try:
+            started = time.perf_counter()
+            index = build_ann_index(
+                vectors, config["kind"], nlist=config.get("nlist"),
+                pq_m=config.get("pq_m", 48), pq_bits=config.get("pq_bits", 8),
+                nprobe=config.get("nprobe", 8),
+            )
+            entry["build_seconds"] = round(time.perf_counter() - started, 3)
+            latencies = []
+            found = np.empty_like(truth)
+            for i, query in enumerate(queries):
+                started = time.perf_counter()
+                _, ids = index.search(query.reshape(1, -1), k)
+                latencies.append((time.perf_counter() - started) * 1000.0)
+                found[i] = ids[0]
+            hits = sum(len(set(found[i]) & set(truth[i])) for i in range(len(queries)))
+            entry.update({
+                f"recall@{k}": round(hits / float(truth.size), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+                "index_bytes": index_bytes(index),
+            })
+        except Exception as e:
+            entry["error"] = str(e)
+        results.append(entry)
+    return results
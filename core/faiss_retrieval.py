@@ -0,0 +1,60 @@
+"""
+Multi-query retrieval against a LangChain FAISS store.
+
+The retrieval agent looks up the user query plus several focus areas and
+related terms. Instead of one encode and one FAISS search per sub-query, all
+sub-queries are encoded in a single batch and searched with one
+`index.search(matrix, k)` call; hits are deduplicated by docstore id, which is
+stable per stored vector, rather than by a hash of the text.
+"""
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+
+def embed_queries(embeddings: Any, texts: Sequence[str]) -> np.ndarray:
+    """Encode all `texts` in one call; uses `embed_queries` when the embeddings object offers it."""
+    if hasattr(embeddings, "embed_queries"):
+        vectors = embeddings.embed_queries(list(texts))
+    else:
+        # SentenceTransformer-backed embeddings encode queries and documents the same way
+        vectors = embeddings.embed_documents(list(texts))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def multi_query_search(vector_store: Any, queries: Sequence[Tuple[str, int]]) -> List[Tuple[Any, str, float]]:
+    """Search `vector_store` for every (text, k) in `queries` with one batched FAISS call.
+
+    Returns (document, docstore id, score) in query order, then rank order within
+    each query, keeping only the first occurrence of each docstore id.
+    """
+    queries = [(text, k) for text, k in queries if text and k > 0]
+    if not queries:
+        return []
+    matrix = embed_queries(vector_store.embeddings, [text for text, _ in queries])
+    if getattr(vector_store, "_normalize_L2", False):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+    # A LazyFaissStore can swap in a rebuilt index mid-request; use one generation throughout
+    generation = vector_store.pinned() if hasattr(vector_store, "pinned") else vector_store
+    k_max = max(k for _, k in queries)
+    scores, ids = generation.index.search(np.ascontiguousarray(matrix, dtype=np.float32), k_max)
+
+    results: List[Tuple[Any, str, float]] = []
+    seen = set()
+    for row, (_, k) in enumerate(queries):
+        for pos in range(k):
+            idx = int(ids[row][pos])
+            if idx == -1:
+                break
+            doc_id = generation.index_to_docstore_id.get(idx)
+            if doc_id is None or doc_id in seen:
+                continue
+            doc = generation.docstore.search(doc_id)
+            if isinstance(doc, str):
+                # InMemoryDocstore returns an error string for unknown ids
+                continue
+            seen.add(doc_id)
+            results.append((doc, doc_id, float(scores[row][pos])))
+    return results
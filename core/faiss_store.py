@@ -0,0 +1,369 @@
+"""
+Lazily opened, memory-mapped FAISS store for the chat agents.
+
+`FAISS.load_local` reads the whole index into RAM and unpickles `index.pkl`,
+the complete docstore, in every worker at import time. `LazyFaissStore`
+instead:
+
+- opens `index.faiss` on first use (or from a background thread at startup)
+  with FAISS memory-mapped I/O, so workers share the vector pages through the
+  OS page cache;
+- keeps documents in a compact SQLite docstore (`docstore.sqlite`), converted
+  once from `index.pkl` and read one document at a time on demand;
+- reports a readiness state (not_loaded, loading, ready, missing, error) for
+  `/health`.
+
+The index and its docstore connection are opened together as one generation.
+When the builder swaps in a rebuilt index, the next request (checked at most
+every FAISS_RELOAD_CHECK_SECONDS) opens the new pair and swaps it in as a
+unit. The builder writes `manifest.json` last and stamps its build generation
+into the docstore too, so an index read in the middle of a swap is rejected.
+A failed load is remembered and only retried once the index changes again,
+while the previous generation keeps serving.
+
+It exposes the attributes `multi_query_search` relies on (`index`,
+`index_to_docstore_id`, `docstore`, `embeddings`), plus `similarity_search`.
+
+The builder also writes one shard per service directory under `shards/<name>/`;
+`ShardRouter` maps a QueryUnderstandingAgent topic to its shard and falls back
+to the global store.
+"""
+import json
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+DOCSTORE_FILE = "docstore.sqlite"
+MANIFEST_FILE = "manifest.json"
+SHARDS_DIR = "shards"
+
+# QueryUnderstandingAgent topics whose spelling differs from the data/docs directory
+TOPIC_SHARDS = {"aadhar": "aadhaar", "uidai": "aadhaar"}
+_SHARD_NAME_RE = re.compile(r"^[a-z0-9_-]+$")
+
+
+class CompactDocstore:
+    """Read-only SQLite docstore: vector position -> docstore id -> (page_content, metadata)."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        # Opened once, here: the connection keeps reading this file even after the builder
+        # os.replace()s a new docstore in at the same path, so it stays paired with its index
+        self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _fetchone(self, sql: str, params: tuple = ()):
+        # Point lookups by primary key; one shared connection, serialized
+        with self._lock:
+            return self._db.execute(sql, params).fetchone()
+
+    @classmethod
+    def build(cls, path: str, documents: Dict[str, Any], index_to_docstore_id: Dict[int, str],
+              generation: Optional[int] = None) -> "CompactDocstore":
+        """Write `documents` (id -> object with page_content/metadata) atomically to `path`.
+
+        `generation` stamps the build so a reader can check the docstore against manifest.json.
+        """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.execute("CREATE TABLE docs (doc_id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT)")
+            conn.execute("CREATE TABLE ids (pos INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)")
+            conn.executemany(
+                "INSERT INTO docs VALUES (?, ?, ?)",
+                ((doc_id, doc.page_content, json.dumps(doc.metadata or {}, default=str)) for doc_id, doc in documents.items()),
+            )
+            conn.executemany("INSERT INTO ids VALUES (?, ?)", ((int(pos), doc_id) for pos, doc_id in index_to_docstore_id.items()))
+            if generation is not None:
+                conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+                conn.execute("INSERT INTO meta VALUES ('generation', ?)", (str(generation),))
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, path)
+        return cls(path)
+
+    def doc_id_at(self, pos: int) -> Optional[str]:
+        row = self._fetchone("SELECT doc_id FROM ids WHERE pos = ?", (int(pos),))
+        return row[0] if row else None
+
+    def search(self, doc_id: str):
+        """Same contract as LangChain's InMemoryDocstore.search: a Document, or an error string."""
+        from langchain_core.documents import Document
+        row = self._fetchone("SELECT page_content, metadata FROM docs WHERE doc_id = ?", (doc_id,))
+        if row is None:
+            return f"ID {doc_id} not found."
+        return Document(id=doc_id, page_content=row[0], metadata=json.loads(row[1] or "{}"))
+
+    def __len__(self) -> int:
+        return int(self._fetchone("SELECT count(*) FROM ids")[0])
+
+    @property
+    def generation(self) -> Optional[int]:
+        """Build generation stamped by the builder; None for docstores converted from index.pkl."""
+        try:
+            row = self._fetchone("SELECT value FROM meta WHERE key = 'generation'")
+        except sqlite3.OperationalError:
+            return None
+        return int(row[0]) if row else None
+
+
+class _PositionMap:
+    """Dict-like `index_to_docstore_id` backed by the compact docstore."""
+
+    def __init__(self, docstore: CompactDocstore):
+        self._docstore = docstore
+
+    def get(self, pos: int, default: Optional[str] = None) -> Optional[str]:
+        doc_id = self._docstore.doc_id_at(pos)
+        return default if doc_id is None else doc_id
+
+    def __getitem__(self, pos: int) -> str:
+        doc_id = self._docstore.doc_id_at(pos)
+        if doc_id is None:
+            raise KeyError(pos)
+        return doc_id
+
+    def __len__(self) -> int:
+        return len(self._docstore)
+
+
+class _Generation:
+    """An index and the docstore it was built with, opened together and replaced as a unit."""
+
+    def __init__(self, index, docstore: CompactDocstore, version: Optional[int]):
+        self.index = index
+        self.docstore = docstore
+        self.index_to_docstore_id = _PositionMap(docstore)
+        self.version = version
+
+
+def _read_index(path: str):
+    import faiss
+    # Zero-copy mmap of flat codes where this FAISS build supports it, then plain mmap
+    for flag in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP"):
+        if hasattr(faiss, flag):
+            try:
+                return faiss.read_index(path, getattr(faiss, flag) | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                continue
+    return faiss.read_index(path)
+
+
+def compact_docstore(index_dir: str, generation: Optional[int] = None) -> CompactDocstore:
+    """Convert `index.pkl` (LangChain's pickled docstore) into `docstore.sqlite`."""
+    with open(os.path.join(index_dir, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return CompactDocstore.build(os.path.join(index_dir, DOCSTORE_FILE), docstore._dict, index_to_docstore_id, generation)
+
+
+def manifest_generation(index_dir: str) -> Optional[int]:
+    """Build generation recorded in `manifest.json`; None for indexes built without one."""
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            generation = json.load(f).get("generation")
+    except (OSError, ValueError):
+        return None
+    return int(generation) if generation is not None else None
+
+
+class LazyFaissStore:
+    def __init__(self, index_dir: str, embeddings_factory: Callable[[], Any],
+                 reload_check_seconds: Optional[float] = None):
+        self.index_dir = str(index_dir)
+        self._embeddings_factory = embeddings_factory
+        self._embeddings = None
+        self._lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+        self._reload_check_seconds = (float(os.getenv("FAISS_RELOAD_CHECK_SECONDS", "5"))
+                                      if reload_check_seconds is None else reload_check_seconds)
+        self._checked_at = 0.0
+        # Version of the last load attempt, good or bad; only a different version is tried again
+        self._attempted_version: Optional[int] = None
+        self._generation: Optional[_Generation] = None
+        self.state = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.index_type: Optional[str] = None
+        # Matches LangChain's FAISS default for indexes built with from_documents
+        self._normalize_L2 = False
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = self._embeddings_factory()
+        return self._embeddings
+
+    @property
+    def index(self):
+        return self._generation.index if self._generation is not None else None
+
+    @property
+    def docstore(self) -> Optional[CompactDocstore]:
+        return self._generation.docstore if self._generation is not None else None
+
+    @property
+    def index_to_docstore_id(self) -> Optional[_PositionMap]:
+        return self._generation.index_to_docstore_id if self._generation is not None else None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def pinned(self) -> Optional[_Generation]:
+        """The generation currently served; hold on to it for the whole of one search."""
+        return self._generation
+
+    def _changed_on_disk(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < self._reload_check_seconds:
+            return False
+        self._checked_at = now
+        return self.index_version() != self._attempted_version
+
+    def ensure_loaded(self) -> bool:
+        """Open the index on first use and reopen it when the builder swaps in a new one.
+
+        Otherwise a flag check plus, every FAISS_RELOAD_CHECK_SECONDS, one stat. Requests
+        arriving during the first load wait for it on the lock.
+        """
+        if self.state not in ("not_loaded", "loading") and not self._changed_on_disk():
+            return self.state == "ready"
+        with self._lock:
+            if self.state == "not_loaded" or self.index_version() != self._attempted_version:
+                self._load()
+        return self.state == "ready"
+
+    def _load(self) -> None:
+        version = self.index_version()
+        self._attempted_version = version
+        reloading = self._generation is not None
+        if version is None:
+            if not reloading:
+                self.state = "missing"
+            print(f"⚠️ FAISS index not found at {self.index_dir}")
+            return
+        if not reloading:
+            self.state = "loading"
+        started = time.time()
+        try:
+            # The builder writes manifest.json last: read it first, then the index, then the docstore
+            expected = manifest_generation(self.index_dir)
+            from .faiss_ann import ANN_INDEX_FILE, index_kind, set_nprobe
+            ann_path = os.path.join(self.index_dir, ANN_INDEX_FILE)
+            if os.path.exists(ann_path):
+                # Trained IVF/PQ copy built alongside the flat index; same vector positions
+                index = _read_index(ann_path)
+                set_nprobe(index, int(os.getenv("FAISS_NPROBE", "8")))
+            else:
+                index = _read_index(os.path.join(self.index_dir, "index.faiss"))
+            docstore_path = Path(self.index_dir) / DOCSTORE_FILE
+            pickle_path = Path(self.index_dir) / "index.pkl"
+            if not docstore_path.exists() or (pickle_path.exists() and pickle_path.stat().st_mtime > docstore_path.stat().st_mtime):
+                # One-off conversion; later loads never unpickle the docstore
+                print("🔄 Compacting FAISS docstore...")
+                docstore = compact_docstore(self.index_dir)
+            else:
+                docstore = CompactDocstore(str(docstore_path))
+            if expected is not None and docstore.generation != expected:
+                # The docstore is swapped in before the index, so a mid-swap read always shows up here
+                raise ValueError(f"docstore generation {docstore.generation} does not match manifest "
+                                 f"generation {expected} (index being replaced)")
+            positions = len(docstore)
+            if positions != index.ntotal:
+                raise ValueError(f"docstore maps {positions} positions but the index holds {index.ntotal} vectors")
+            self._generation = _Generation(index, docstore, version)
+            self.index_type = index_kind(index)
+            self.load_seconds = round(time.time() - started, 3)
+            self.error = None
+            self.state = "ready"
+            print(f"✅ FAISS index {'reopened' if reloading else 'opened'} ({index.ntotal} vectors, {self.load_seconds}s)")
+        except Exception as e:
+            self.error = str(e)
+            if reloading:
+                print(f"❌ FAISS index reload failed, still serving the previous index: {e}")
+            else:
+                self.state = "error"
+                print(f"❌ FAISS index load failed: {e}")
+
+    def index_version(self) -> Optional[int]:
+        """mtime of manifest.json (written last by the builder), or of index.faiss for indexes
+        built without a manifest; changes whenever the builder swaps in a new index."""
+        if not os.path.exists(os.path.join(self.index_dir, "index.faiss")):
+            return None
+        for name in (MANIFEST_FILE, "index.faiss"):
+            try:
+                return os.stat(os.path.join(self.index_dir, name)).st_mtime_ns
+            except OSError:
+                continue
+        return None
+
+    def start_background_load(self) -> Optional[threading.Thread]:
+        """Open the index off the request path; requests arriving earlier wait on the same lock."""
+        if self.state == "ready" or (self._loader is not None and self._loader.is_alive()):
+            return self._loader
+        self._loader = threading.Thread(target=self.ensure_loaded, name="faiss-load", daemon=True)
+        self._loader.start()
+        return self._loader
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Any]:
+        from .faiss_retrieval import multi_query_search
+        if not self.ensure_loaded():
+            return []
+        return [doc for doc, _, _ in multi_query_search(self, [(query, k)])]
+
+    def status(self) -> Dict[str, Any]:
+        generation = self._generation
+        return {
+            "state": self.state,
+            "index_dir": self.index_dir,
+            "index_type": self.index_type,
+            "vectors": int(generation.index.ntotal) if generation is not None else None,
+            "version": generation.version if generation is not None else None,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+class ShardRouter:
+    """Per-topic LazyFaissStores over `shards/<name>/`, opened on first use."""
+
+    def __init__(self, global_store: LazyFaissStore):
+        self.global_store = global_store
+        self._shards: Dict[str, LazyFaissStore] = {}
+        self._lock = threading.Lock()
+
+    def shard_name(self, topic: Optional[str]) -> Optional[str]:
+        name = TOPIC_SHARDS.get((topic or "").lower(), (topic or "").lower())
+        # 'general' (or anything without a shard) goes to the global index
+        if not name or name == "general" or not _SHARD_NAME_RE.match(name):
+            return None
+        if not os.path.exists(os.path.join(self.global_store.index_dir, SHARDS_DIR, name, "index.faiss")):
+            return None
+        return name
+
+    def for_topic(self, topic: Optional[str]) -> LazyFaissStore:
+        name = self.shard_name(topic)
+        if name is None:
+            return self.global_store
+        with self._lock:
+            store = self._shards.get(name)
+            if store is None:
+                # Shards share the global store's embeddings (same model, one instance)
+                store = LazyFaissStore(
+                    os.path.join(self.global_store.index_dir, SHARDS_DIR, name),
+                    embeddings_factory=lambda: self.global_store.embeddings,
+                )
+                self._shards[name] = store
+        return store
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: store.status() for name, store in self._shards.items()}
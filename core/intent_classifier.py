@@ -0,0 +1,195 @@
+"""
+Local query-understanding model for the chat service.
+
+A linear softmax classifier per output field (intent, topic, action_required,
+complexity) over hashed features: word unigrams and bigrams plus character
+trigrams of each word, so spelling variants ("aadhar"/"aadhaar") share most of
+their features. The feature space has a fixed size (`dim`), so there is no
+vocabulary to keep in sync.
+
+Training data comes from the LLM itself: with INTENT_LOG_PATH set, every
+successfully parsed QueryUnderstandingAgent result is appended there as a JSON
+line, and `scripts/train_intent_classifier.py` fits the model to that log and
+writes INTENT_MODEL_PATH. Pure numpy; no extra dependency.
+"""
+import json
+import os
+import re
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embedding_cache import normalize_query
+
+HEADS = ("intent", "topic", "action_required", "complexity")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def hashed_features(text: str, dim: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(indices, values) of the L2-normalized hashed n-gram vector of `text`."""
+    words = _TOKEN_RE.findall(normalize_query(text))
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    counts: Dict[int, float] = {}
+    for gram in grams:
+        idx = zlib.crc32(gram.encode("utf-8")) % dim
+        counts[idx] = counts.get(idx, 0.0) + 1.0
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    indices = np.fromiter(counts.keys(), dtype=np.int64)
+    values = np.fromiter(counts.values(), dtype=np.float32)
+    return indices, values / np.linalg.norm(values)
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max()
+    e = np.exp(z)
+    return e / e.sum()
+
+
+class HashedIntentModel:
+    def __init__(self, dim: int, labels: Dict[str, List[str]], weights: Dict[str, np.ndarray],
+                 bias: Dict[str, np.ndarray]):
+        self.dim = int(dim)
+        self.labels = labels
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def train(cls, samples: Sequence[Tuple[str, Dict[str, Any]]], dim: int = 1 << 16, epochs: int = 15,
+              lr: float = 0.5, l2: float = 1e-6, heads: Iterable[str] = HEADS, seed: int = 0) -> "HashedIntentModel":
+        """Fit one softmax head per field with SGD; samples are (query, LLM understanding dict)."""
+        rng = np.random.default_rng(seed)
+        feats = [hashed_features(q, dim) for q, _ in samples]
+        labels: Dict[str, List[str]] = {}
+        weights: Dict[str, np.ndarray] = {}
+        bias: Dict[str, np.ndarray] = {}
+        for head in heads:
+            rows = [(i, str(s[1][head])) for i, s in enumerate(samples) if s[1].get(head) not in (None, "")]
+            names = sorted({label for _, label in rows})
+            if not names:
+                continue
+            index = {name: j for j, name in enumerate(names)}
+            W = np.zeros((dim, len(names)), dtype=np.float32)
+            b = np.zeros(len(names), dtype=np.float32)
+            for _ in range(epochs):
+                for i in rng.permutation(len(rows)):
+                    sample, label = rows[i]
+                    idx, val = feats[sample]
+                    p = _softmax(val @ W[idx] + b)
+                    p[index[label]] -= 1.0  # gradient of cross-entropy w.r.t. logits
+                    W[idx] -= lr * (np.outer(val, p) + l2 * W[idx])
+                    b -= lr * p
+            labels[head], weights[head], bias[head] = names, W, b
+        return cls(dim, labels, weights, bias)
+
+    def predict(self, text: str) -> Dict[str, Tuple[str, float]]:
+        """{field: (label, probability)} for every trained head."""
+        idx, val = hashed_features(text, self.dim)
+        out = {}
+        for head, names in self.labels.items():
+            p = _softmax(val @ self.weights[head][idx] + self.bias[head])
+            j = int(p.argmax())
+            out[head] = (names[j], float(p[j]))
+        return out
+
+    def save(self, path: str) -> None:
+        arrays = {f"W_{head}": W for head, W in self.weights.items()}
+        arrays.update({f"b_{head}": b for head, b in self.bias.items()})
+        meta = json.dumps({"dim": self.dim, "labels": self.labels})
+        tmp = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp, meta=np.array(meta), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedIntentModel":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            weights = {head: data[f"W_{head}"] for head in meta["labels"]}
+            bias = {head: data[f"b_{head}"] for head in meta["labels"]}
+        return cls(meta["dim"], meta["labels"], weights, bias)
+
+
+def log_understanding(query: str, understanding: Dict[str, Any]) -> None:
+    """Append one LLM-labelled example to INTENT_LOG_PATH (no-op when unset)."""
+    path = os.getenv("INTENT_LOG_PATH")
+    if not path:
+        return
+    record = {"query": query, **{head: understanding.get(head) for head in HEADS}}
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError:
+        pass
+
+def read_intent_log(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("query"):
+                samples.append((record.pop("query"), record))
+    return samples
+
+
+# Rules alone (no trained model) never clear the default threshold, so the LLM stays in charge
+# until INTENT_MODEL_PATH holds a model trained on logged LLM answers
+RULE_TOPIC_CONFIDENCE = 0.75
+
+
+def guess_topic(query: str) -> str:
+    """Keyword topic guess used before QueryUnderstandingAgent has answered."""
+    words = set(re.findall(r"[a-z]+", query.lower()))
+    if words & {"aadhar", "aadhaar", "uidai"}:
+        return "aadhar"
+    if "pan" in words:
+        return "pan"
+    if "passport" in words:
+        return "passport"
+    return "general"
+
+
+def understanding_confidence(predicted: Dict[str, Tuple[str, float]], rule_topic: str) -> float:
+    """Confidence of a local understanding: the weakest head's probability.
+
+    The keyword rule only speaks to the topic, so only the topic head is adjusted:
+    combined noisy-or style with RULE_TOPIC_CONFIDENCE when both agree, halved when
+    they contradict each other. The chat service and the training report share this.
+    """
+    if not predicted:
+        return 0.0
+    scores = {head: p for head, (_, p) in predicted.items()}
+    if rule_topic != "general" and "topic" in predicted:
+        label, p = predicted["topic"]
+        scores["topic"] = 1.0 - (1.0 - p) * (1.0 - RULE_TOPIC_CONFIDENCE) if label == rule_topic else p * 0.5
+    return min(scores.values())
+
+
+_INTENT_MODEL: Optional[HashedIntentModel] = None
+_INTENT_MODEL_LOADED = False
+_INTENT_MODEL_LOCK = threading.Lock()
+
+
+def get_intent_model() -> Optional[HashedIntentModel]:
+    """Model from INTENT_MODEL_PATH, loaded once; None when no model has been trained."""
+    global _INTENT_MODEL, _INTENT_MODEL_LOADED
+    if not _INTENT_MODEL_LOADED:
+        with _INTENT_MODEL_LOCK:
+            if not _INTENT_MODEL_LOADED:
+                path = os.getenv("INTENT_MODEL_PATH", "data/cache/intent_model.npz")
+                if os.path.exists(path):
+                    try:
+                        _INTENT_MODEL = HashedIntentModel.load(path)
+                        print(f"✅ Intent model loaded from {path}")
+                    except Exception as e:
+                        print(f"⚠️ Intent model load failed: {e}")
+                _INTENT_MODEL_LOADED = True
+    return _INTENT_MODEL
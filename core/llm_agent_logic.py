@@ -1,8 +1,13 @@
 import os
+import re
 import json
+import random
+import asyncio
+import hashlib
 import sys
 import time
-from typing import List, Dict, Any
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 # =============================================
 # CRITICAL FIX: Add parent directory to Python path
@@ -29,14 +34,25 @@ else:
 # --- LangChain RAG & Core Imports ---
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
 
 # --- LangChain Gemini Integration ---
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import SystemMessage, HumanMessage
 
+from core.embedding_batcher import get_batcher, batching_enabled
+from core.embedding_cache import get_query_cache, query_cache_enabled, normalize_query
+from core.faiss_retrieval import multi_query_search
+from core.faiss_store import LazyFaissStore, ShardRouter, TOPIC_SHARDS
+from core.llm_rate_limiter import estimate_tokens, get_rate_limiter, rate_limit_enabled
+from core.llm_memo import get_llm_memo, llm_memo_enabled, memo_key
+from core.intent_classifier import (
+    RULE_TOPIC_CONFIDENCE, get_intent_model, guess_topic, log_understanding, understanding_confidence,
+)
+
 # --- Configuration ---
-VECTOR_DB_PATH = "AI-Powered-Citizen-Service-Chatbot/faiss_index" 
+VECTOR_DB_PATH = os.getenv("FAISS_INDEX_PATH", "AI-Powered-Citizen-Service-Chatbot/faiss_index")
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2" 
 VECTOR_DB = None
 GEMINI_LLM = None
@@ -204,118 +220,260 @@ LLM_PROMPT_GUIDELINES = {
     )
 }
 
-def initialize_llm():
-    """Initialize Gemini with temperature 0.3 for more natural responses"""
+# Changes whenever a prompt is edited; cached answers from older prompts are not served
+PROMPT_VERSION = hashlib.sha1(json.dumps(LLM_PROMPT_GUIDELINES, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+# Preference order; the first model that answers the probe is used
+GEMINI_MODELS = [m.strip() for m in os.getenv(
+    "GEMINI_MODELS",
+    "models/gemini-2.5-flash,gemini-1.5-flash-latest,models/gemini-2.5-pro,gemini-1.0-pro,gemini-pro",
+).split(",") if m.strip()]
+# A successful probe is reused for LLM_PROBE_TTL seconds, a failed one for LLM_PROBE_RETRY, by
+# every worker sharing LLM_PROBE_CACHE, so restarts don't re-probe the API
+LLM_PROBE_TTL = float(os.getenv("LLM_PROBE_TTL", "900"))
+LLM_PROBE_RETRY = float(os.getenv("LLM_PROBE_RETRY", "60"))
+LLM_PROBE_CACHE = os.getenv("LLM_PROBE_CACHE", os.path.join(parent_dir, "data", "cache", "llm_probe.json"))
+
+_LLM_STATUS: Dict[str, Any] = {"state": "not_started", "model": None, "checked_at": None, "source": None, "error": None}
+_LLM_INIT_LOCK = threading.Lock()
+_LLM_THREAD: Optional[threading.Thread] = None
+_LLM_THREAD_LOCK = threading.Lock()
+
+def _make_llm(model_name: str, api_key: str):
+    # Temperature 0.3 for natural, helpful responses
+    return ChatGoogleGenerativeAI(
+        model=model_name, 
+        temperature=0.3,
+        google_api_key=api_key,
+        max_retries=2,
+        timeout=60,
+        max_output_tokens=1000,  # Allow more detailed responses
+        top_p=0.8,
+        top_k=40
+    )
+
+def _read_probe_cache(key_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(LLM_PROBE_CACHE, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get("key_id") != key_id or record.get("models") != GEMINI_MODELS:
+        return None
+    ttl = LLM_PROBE_TTL if record.get("model") else LLM_PROBE_RETRY
+    if time.time() - float(record.get("checked_at", 0)) > ttl:
+        return None
+    return record
+
+def _write_probe_cache(record: Dict[str, Any]) -> None:
+    try:
+        os.makedirs(os.path.dirname(LLM_PROBE_CACHE) or ".", exist_ok=True)
+        tmp = f"{LLM_PROBE_CACHE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp, LLM_PROBE_CACHE)
+    except OSError:
+        pass
+
+def _probe_models(api_key: str):
+    """(first model in GEMINI_MODELS that answers, None) or (None, last error)."""
+    error = "No Gemini models configured (GEMINI_MODELS)"
+    for model_name in GEMINI_MODELS:
+        try:
+            print(f"🔄 Trying model: {model_name}")
+            test_response = _make_llm(model_name, api_key).invoke([HumanMessage(content="Say OK if working")])
+            print(f"✅ Model {model_name} working: {test_response.content}")
+            return model_name, None
+        except Exception as model_error:
+            error = str(model_error)
+            print(f"❌ Model {model_name} failed: {error[:150]}...")
+    return None, error
+
+def initialize_llm(force: bool = False):
+    """Set GEMINI_LLM to the first working model in GEMINI_MODELS.
+
+    Reuses a probe result younger than its TTL (from any worker) unless `force`.
+    Blocking; the chat service runs it on a background thread (start_llm_initialization).
+    A failed refresh (429, timeout) keeps a model that is already in use and is not
+    published to LLM_PROBE_CACHE; only a worker that never had a model reports "unavailable".
+    """
     global GEMINI_LLM, LLM_INITIALIZED
     
     # Force reload environment variables
     load_dotenv(env_path, override=True)
     
-    try:
-        # Get API key
-        api_key = os.getenv("GEMINI_API_KEY")
-        
-        print(f"🔑 DEBUG: Looking for GEMINI_API_KEY...")
-        
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is not set or empty.")
-        
-        # Check for placeholder patterns
-        placeholder_indicators = ["your_", "paste_", "example", "replace", "xxxx", "actual_key"]
-        if any(indicator in api_key.lower() for indicator in placeholder_indicators):
-            raise ValueError("The GEMINI_API_KEY appears to be a placeholder value.")
-        
-        print(f"✅ Found API key (first 10 chars): {api_key[:10]}...")
-        
-        # Configure Gemini directly
+    with _LLM_INIT_LOCK:
+        if _LLM_STATUS["state"] != "ready":
+            _LLM_STATUS["state"] = "initializing"
+        source = None
         try:
-            print("🔄 Configuring Gemini with google.generativeai...")
+            # Get API key
+            api_key = os.getenv("GEMINI_API_KEY")
+            
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable is not set or empty.")
+            
+            # Check for placeholder patterns
+            placeholder_indicators = ["your_", "paste_", "example", "replace", "xxxx", "actual_key"]
+            if any(indicator in api_key.lower() for indicator in placeholder_indicators):
+                raise ValueError("The GEMINI_API_KEY appears to be a placeholder value.")
+            
             genai.configure(api_key=api_key)
+            key_id = hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:12]
+            record = None if force else _read_probe_cache(key_id)
+            source = "cache"
+            if record is None:
+                source = "probe"
+                model_name, error = _probe_models(api_key)
+                record = {"key_id": key_id, "models": GEMINI_MODELS, "model": model_name,
+                          "error": error, "checked_at": time.time()}
+                if model_name or not llm_ready():
+                    _write_probe_cache(record)
             
-            # Test direct configuration
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content("Say OK if working")
-            print(f"✅ Direct Gemini test: {response.text}")
-        except Exception as direct_error:
-            print(f"⚠️ Direct config failed: {direct_error}")
-        
-        # Available models - prioritize comprehensive models
-        available_models = [
-            "models/gemini-2.5-flash",     # Primary - comprehensive
-            "gemini-1.5-flash-latest",     # Alternative
-            "models/gemini-2.5-pro",       # More detailed responses
-            "gemini-1.0-pro",              # Fallback
-            "gemini-pro"                   # Most compatible
-        ]
-        
-        successful_model = None
-        
-        for model_name in available_models:
-            try:
-                print(f"🔄 Trying model: {model_name}")
-                
-                # Initialize with temperature 0.3 for more natural responses
-                GEMINI_LLM = ChatGoogleGenerativeAI(
-                    model=model_name, 
-                    temperature=0.3,  # Changed from 0.1 to 0.3
-                    google_api_key=api_key,
-                    max_retries=2,
-                    timeout=60,  # Increased timeout
-                    max_output_tokens=1000,  # Increased for more detailed responses
-                )
-                
-                # Quick test with simple message
-                test_response = GEMINI_LLM.invoke([HumanMessage(content="Say OK if working")])
-                print(f"✅ Model {model_name} working: {test_response.content}")
-                successful_model = model_name
-                break
-                
-            except Exception as model_error:
-                error_msg = str(model_error)
-                print(f"❌ Model {model_name} failed: {error_msg[:150]}...")
-                GEMINI_LLM = None
-                continue
-        
-        if successful_model:
-            LLM_INITIALIZED = True
-            print(f"🚀 Successfully initialized with model: {successful_model}")
+            if not record.get("model"):
+                raise Exception(f"All Gemini models failed: {(record.get('error') or '')[:150]}")
             
-            # Now configure with optimal settings for comprehensive responses
-            GEMINI_LLM = ChatGoogleGenerativeAI(
-                model=successful_model, 
-                temperature=0.3,  # Natural, helpful responses
-                google_api_key=api_key,
-                max_retries=2,
-                timeout=60,  # Increased timeout
-                max_output_tokens=1000,  # Allow more detailed responses
-                top_p=0.8,
-                top_k=40
-            )
+            if GEMINI_LLM is None or _LLM_STATUS["model"] != record["model"]:
+                GEMINI_LLM = _make_llm(record["model"], api_key)
+                print(f"🚀 Successfully initialized with model: {record['model']} ({source})")
+            LLM_INITIALIZED = True
+            _LLM_STATUS.update(state="ready", model=record["model"], checked_at=record["checked_at"],
+                               source=source, error=None)
             
-        else:
-            raise Exception("All Gemini models failed")
-        
-    except Exception as e:
-        print(f"❌ Gemini initialization error: {e}")
-        print("🔄 Falling back to enhanced keyword system...")
-        GEMINI_LLM = None
-        LLM_INITIALIZED = False
+        except Exception as e:
+            if llm_ready():
+                # The model answered until now; a transient failure is retried after LLM_PROBE_RETRY
+                print(f"⚠️ Gemini refresh failed, keeping {_LLM_STATUS['model']}: {e}")
+                _LLM_STATUS["error"] = str(e)[:300]
+                return
+            print(f"❌ Gemini initialization error: {e}")
+            print("🔄 Falling back to enhanced keyword system...")
+            LLM_INITIALIZED = False
+            GEMINI_LLM = None
+            _LLM_STATUS.update(state="unavailable", model=None, checked_at=time.time(),
+                               source=source, error=str(e)[:300])
+
+def _llm_refresh_loop() -> None:
+    while True:
+        initialize_llm()
+        interval = LLM_PROBE_TTL if llm_ready() and not _LLM_STATUS["error"] else LLM_PROBE_RETRY
+        # Jitter keeps workers started together from re-probing together
+        time.sleep(interval * random.uniform(1.0, 1.1))
+
+def start_llm_initialization() -> threading.Thread:
+    """Initialize Gemini off the startup path and keep the probe fresh; idempotent."""
+    global _LLM_THREAD
+    with _LLM_THREAD_LOCK:
+        if _LLM_THREAD is None or not _LLM_THREAD.is_alive():
+            _LLM_THREAD = threading.Thread(target=_llm_refresh_loop, name="llm-init", daemon=True)
+            _LLM_THREAD.start()
+    return _LLM_THREAD
+
+def llm_ready() -> bool:
+    return LLM_INITIALIZED and GEMINI_LLM is not None
+
+def llm_status() -> Dict[str, Any]:
+    """Cached initialization/probe state for /health and /debug/agents."""
+    status = dict(_LLM_STATUS)
+    status["ready"] = llm_ready()
+    status["age_seconds"] = round(time.time() - status["checked_at"], 1) if status["checked_at"] else None
+    status["preference"] = list(GEMINI_MODELS)
+    return status
+
+class BatchedQueryEmbeddings(Embeddings):
+    """LangChain embeddings backed by the shared micro-batcher, so concurrent
+    similarity searches share one encode call with /search traffic."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        self.model_name = model_name
+
+    def _batcher(self):
+        batcher = get_batcher(self.model_name)
+        if batcher is None:
+            raise RuntimeError(f"Embedding model '{self.model_name}' is not available")
+        return batcher
+
+    def embed_query(self, text: str) -> List[float]:
+        if query_cache_enabled():
+            return get_query_cache().get_or_compute(text, self.model_name, lambda t: self._batcher().encode(t)).tolist()
+        return self._batcher().encode(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vec.tolist() for vec in self._batcher().encode_many(texts)]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries in one batch; cached ones skip the forward pass."""
+        if not query_cache_enabled():
+            return self.embed_documents(texts)
+        cache = get_query_cache()
+        keys = [(self.model_name, normalize_query(t)) for t in texts]
+        vectors = [cache.get(key) for key in keys]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            encoded = self._batcher().encode_many([keys[i][1] for i in missing])
+            for i, vec in zip(missing, encoded):
+                cache.put(keys[i], vec)
+                vectors[i] = vec
+        return [vec.tolist() for vec in vectors]
+
+def _make_embeddings() -> Embeddings:
+    if batching_enabled():
+        return BatchedQueryEmbeddings(EMBEDDING_MODEL_NAME)
+    return SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
 
 def load_vector_store(db_path: str = VECTOR_DB_PATH) -> FAISS:
-    global VECTOR_DB
+    """Eager, fully in-memory load (whole docstore unpickled); the agents use VECTOR_DB instead."""
     if not os.path.exists(db_path):
         print(f"⚠️ FAISS index not found at {db_path}")
         return None 
         
-    embeddings = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    vector_store = FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization=True)
+    vector_store = FAISS.load_local(db_path, _make_embeddings(), allow_dangerous_deserialization=True)
     print("✅ FAISS index loaded successfully")
     return vector_store
 
-# --- Initialize Vector Store ---
-print("🔄 Initializing vector store...")
-VECTOR_DB = load_vector_store()
-print("🔄 Vector store initialization complete.")
+# --- Vector Store (opened lazily, memory-mapped; see core/faiss_store.py) ---
+VECTOR_DB = LazyFaissStore(VECTOR_DB_PATH, embeddings_factory=_make_embeddings)
+# Per-service shards built next to the global index; topic 'general' stays on VECTOR_DB
+VECTOR_SHARDS = ShardRouter(VECTOR_DB)
+SHARD_ROUTING = os.getenv("FAISS_SHARD_ROUTING", "true").lower() in ("1", "true", "yes")
+
+def embed_query_vector(query: str) -> List[float]:
+    """Query embedding with the agents' model (cached, so the retrieval that follows reuses it)."""
+    return VECTOR_DB.embeddings.embed_query(query)
+
+# Texts llm_generate returns instead of a model answer; never worth caching
+LLM_FAILURE_PREFIXES = (
+    "ERROR: Gemini LLM is not available",
+    "Service temporarily unavailable",
+    "I apologize, but I couldn't generate a response",
+)
+
+def is_llm_failure(text: str) -> bool:
+    return not text or text.startswith(LLM_FAILURE_PREFIXES)
+
+def _llm_reservation(prompt: str, system_instruction: str = None):
+    """(limiter or None, reserved tokens) for one Gemini call."""
+    limiter = get_rate_limiter() if rate_limit_enabled() else None
+    reserved = estimate_tokens(system_instruction, prompt) + int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "512"))
+    return limiter, reserved
+
+def _llm_result(response, limiter, reserved: int) -> str:
+    if limiter is not None:
+        usage = getattr(response, "usage_metadata", None) or {}
+        limiter.settle(reserved, usage.get("total_tokens"))
+    
+    # Check if response is empty
+    if not response or not response.content:
+        return "I apologize, but I couldn't generate a response. Please try again or rephrase your question."
+    
+    return response.content
+
+def _memo_key(prompt: str, system_instruction: str = None):
+    """Memo key over everything that shapes the completion; None when memoization is off."""
+    if not llm_memo_enabled():
+        return None
+    params = {name: getattr(GEMINI_LLM, name, None) for name in ("temperature", "max_output_tokens", "top_p", "top_k")}
+    return memo_key(getattr(GEMINI_LLM, "model", ""), system_instruction, prompt, params)
 
 def llm_generate(prompt: str, system_instruction: str = None) -> str:
     global GEMINI_LLM, LLM_INITIALIZED
@@ -323,21 +481,176 @@ def llm_generate(prompt: str, system_instruction: str = None) -> str:
     if not LLM_INITIALIZED or GEMINI_LLM is None:
         return "ERROR: Gemini LLM is not available. Using fallback mode."
 
+    # Retries and repeated prompts are answered from the memo without spending quota
+    key = _memo_key(prompt, system_instruction)
+    if key is not None:
+        cached = get_llm_memo().get(key)
+        if cached is not None:
+            return cached
+
     messages = [
         SystemMessage(content=system_instruction),
         HumanMessage(content=prompt)
     ]
         
     try:
-        # Add small delay to avoid rate limits
-        time.sleep(1)  # Increased delay
+        # Budget for RPM/TPM instead of a fixed delay: no wait unless the quota is exhausted
+        limiter, reserved = _llm_reservation(prompt, system_instruction)
+        if limiter is not None and not limiter.acquire(reserved):
+            print("⚠️ LLM rate limit budget exhausted, skipping call")
+            return "Service temporarily unavailable. Please try again later."
         response = GEMINI_LLM.invoke(messages)
+        text = _llm_result(response, limiter, reserved)
+        if key is not None and not is_llm_failure(text):
+            get_llm_memo().put(key, text)
+        return text
+        
+    except Exception as e:
+        print(f"❌ LLM API Call Error: {type(e).__name__}: {e}")
+        return f"Service temporarily unavailable. Please try again later."
+
+# Memo key -> future of the in-flight call, so concurrent duplicate submissions share one request
+_INFLIGHT_LLM_CALLS: Dict[str, "asyncio.Future"] = {}
+
+async def allm_generate(prompt: str, system_instruction: str = None) -> str:
+    """`llm_generate` for the event loop: the Gemini request and any rate-limit wait are awaited."""
+    if not LLM_INITIALIZED or GEMINI_LLM is None:
+        return "ERROR: Gemini LLM is not available. Using fallback mode."
+
+    key = _memo_key(prompt, system_instruction)
+    if key is None:
+        return await _allm_call(prompt, system_instruction)
+    # Memory tier inline, SQLite tier on a worker thread: the loop never waits on the file lock
+    cached = await get_llm_memo().aget(key)
+    if cached is not None:
+        return cached
+    pending = _INFLIGHT_LLM_CALLS.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _INFLIGHT_LLM_CALLS[key] = future
+    try:
+        text = await _allm_call(prompt, system_instruction)
+        future.set_result(text)
+        if not is_llm_failure(text):
+            await get_llm_memo().aput(key, text)
+        return text
+    finally:
+        _INFLIGHT_LLM_CALLS.pop(key, None)
+        if not future.done():
+            # The leader was cancelled; followers fall back like any failed call
+            future.set_result("Service temporarily unavailable. Please try again later.")
+
+class LLMStreamInterrupted(Exception):
+    """Gemini failed after part of the completion was already yielded."""
+
+async def allm_stream(prompt: str, system_instruction: str = None) -> AsyncIterator[str]:
+    """Yield the completion in chunks as Gemini produces them (one chunk on a memo hit).
+
+    A failure before the first chunk yields the usual error text as the only chunk; a
+    failure after it raises LLMStreamInterrupted, since the caller already has part of an answer.
+    """
+    if not LLM_INITIALIZED or GEMINI_LLM is None:
+        yield "ERROR: Gemini LLM is not available. Using fallback mode."
+        return
+
+    key = _memo_key(prompt, system_instruction)
+    cached = await get_llm_memo().aget(key) if key is not None else None
+    if cached is not None:
+        yield cached
+        return
+
+    messages = [
+        SystemMessage(content=system_instruction),
+        HumanMessage(content=prompt)
+    ]
         
-        # Check if response is empty
-        if not response or not response.content:
-            return "I apologize, but I couldn't generate a response. Please try again or rephrase your question."
+    limiter, reserved = _llm_reservation(prompt, system_instruction)
+    acquired, full, sent = False, None, False
+    try:
+        if limiter is not None and not await limiter.acquire_async(reserved):
+            print("⚠️ LLM rate limit budget exhausted, skipping call")
+            yield "Service temporarily unavailable. Please try again later."
+            return
+        acquired = True
+        async for chunk in GEMINI_LLM.astream(messages):
+            # Chunks add up to one message, usage metadata included
+            full = chunk if full is None else full + chunk
+            if chunk.content:
+                sent = True
+                yield chunk.content
+        acquired = False
+        text = _llm_result(full, limiter, reserved)
+        if not full or not full.content:
+            yield text
+        elif key is not None and not is_llm_failure(text):
+            await get_llm_memo().aput(key, text)
         
-        return response.content
+    except Exception as e:
+        print(f"❌ LLM API Call Error: {type(e).__name__}: {e}")
+        if acquired and limiter is not None:
+            # Charge what the partial response reported, if anything
+            usage = getattr(full, "usage_metadata", None) or {}
+            limiter.settle(reserved, usage.get("total_tokens"))
+        if sent:
+            raise LLMStreamInterrupted(f"{type(e).__name__}: {e}") from e
+        yield f"Service temporarily unavailable. Please try again later."
+
+def _answered_by_model(prompt: Optional[str], completion: str, answer: str) -> bool:
+    """True when `answer` is the model's own completion, not an early reply, error text or fallback."""
+    return prompt is not None and not is_llm_failure(completion) and answer == completion
+
+async def agenerate_answer(agent, *args) -> Tuple[str, bool]:
+    """Run an LLM-backed agent on the event loop -> (answer, answered by the model).
+
+    `args` are the agent's prepare() arguments; the query is always the last one.
+    """
+    prompt, early = agent.prepare(*args)
+    if prompt is None:
+        return early, False
+    completion = await allm_generate(prompt, LLM_PROMPT_GUIDELINES[agent.SYSTEM])
+    answer = agent.finish(completion, args[-1])
+    return answer, _answered_by_model(prompt, completion, answer)
+
+async def astream_answer(agent, *args) -> AsyncIterator[Tuple[str, Any]]:
+    """Run an LLM-backed agent with streaming: ('token', text) per chunk, then ('final', (answer, by model)).
+
+    `args` are the agent's prepare() arguments; the query is always the last one. The final
+    answer is what finish() makes of the whole completion and may replace the streamed text
+    (e.g. with the fallback when the model returned next to nothing). If Gemini fails midway,
+    ('error', message) follows the tokens and the final answer is the error text, not by the model.
+    """
+    prompt, early = agent.prepare(*args)
+    if prompt is None:
+        yield "final", (early, False)
+        return
+    parts = []
+    try:
+        async for text in allm_stream(prompt, LLM_PROMPT_GUIDELINES[agent.SYSTEM]):
+            parts.append(text)
+            yield "token", text
+        completion = "".join(parts)
+    except LLMStreamInterrupted as e:
+        # The streamed tokens are a truncated answer: the client discards them
+        yield "error", str(e)
+        completion = "Service temporarily unavailable. Please try again later."
+    answer = agent.finish(completion, args[-1])
+    yield "final", (answer, _answered_by_model(prompt, completion, answer))
+
+async def _allm_call(prompt: str, system_instruction: str = None) -> str:
+    messages = [
+        SystemMessage(content=system_instruction),
+        HumanMessage(content=prompt)
+    ]
+        
+    try:
+        limiter, reserved = _llm_reservation(prompt, system_instruction)
+        if limiter is not None and not await limiter.acquire_async(reserved):
+            print("⚠️ LLM rate limit budget exhausted, skipping call")
+            return "Service temporarily unavailable. Please try again later."
+        response = await GEMINI_LLM.ainvoke(messages)
+        return _llm_result(response, limiter, reserved)
         
     except Exception as e:
         print(f"❌ LLM API Call Error: {type(e).__name__}: {e}")
@@ -402,20 +715,87 @@ def enhanced_fallback_response(query: str, system_instruction: str = None) -> st
         return "I can help with various Aadhaar services including enrollment, mobile linking, data updates, form assistance, document requirements, and location services. Please ask about specific Aadhaar procedures or requirements you need assistance with."
 
 # --- Enhanced Agent Classes ---
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+LOCAL_UNDERSTANDING = os.getenv("LOCAL_UNDERSTANDING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Question words, fillers and service names: no retrieval signal as a focus area of their own
+_FOCUS_STOPWORDS = {
+    "about", "and", "are", "can", "card", "could", "does", "for", "from", "get", "how", "into",
+    "need", "number", "please", "should", "tell", "that", "the", "this", "what", "when", "where",
+    "which", "who", "why", "will", "with", "would", "you", "your", "aadhar", "aadhaar", "uidai",
+    "pan", "passport", "want",
+}
+
+def query_focus_areas(query: str, topic: str, limit: int = 4) -> List[str]:
+    """Focus areas for the local fast path: the query's own content words, scoped to the topic."""
+    service = TOPIC_SHARDS.get(topic, topic) if topic and topic != "general" else ""
+    areas = []
+    for word in re.findall(r"[a-z0-9]+|[\u0900-\u097f]+", query.lower()):
+        if word in _FOCUS_STOPWORDS or (word.isascii() and len(word) < 3):
+            continue
+        area = f"{service} {word}".strip()
+        if area not in areas:
+            areas.append(area)
+    return areas[:limit]
+
+def local_understanding(query: str):
+    """(understanding dict, confidence in [0, 1]) from the keyword rules and the hashed n-gram model.
+
+    Confidence is `understanding_confidence`: the weakest head, with only the topic head
+    backed up (or penalized) by the keyword rule. The model only predicts the four heads; focus areas come from the query and the final topic, not
+    from the canned Aadhaar fallback.
+    """
+    result = json.loads(enhanced_fallback_response(query, "query understanding"))
+    rule_topic = guess_topic(query)
+    if rule_topic != "general":
+        result["topic"] = rule_topic
+    model = get_intent_model()
+    if model is None:
+        result["focus_areas"] = query_focus_areas(query, result["topic"])
+        return result, RULE_TOPIC_CONFIDENCE if rule_topic != "general" else 0.0
+    predicted = model.predict(query)
+    for head, (label, _) in predicted.items():
+        result[head] = label
+    result["focus_areas"] = query_focus_areas(query, result["topic"])
+    return result, understanding_confidence(predicted, rule_topic)
+
+# LLM-backed agents split into prepare() -> prompt or early answer, and finish() -> final
+# answer, so the blocking process() and the event-loop aprocess() share all the logic.
 class QueryUnderstandingAgent:
+    SYSTEM = "QUERY_UNDERSTANDING"
+
     def process(self, query: str) -> Dict[str, Any]:
+        prompt, early = self.prepare(query)
+        if prompt is None:
+            return early
+        return self.finish(llm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    async def aprocess(self, query: str) -> Dict[str, Any]:
+        prompt, early = self.prepare(query)
+        if prompt is None:
+            return early
+        return self.finish(await allm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    # Every understanding carries "source": llm, local (confident fast path) or fallback (canned
+    # keyword rules after the LLM was unavailable or unparseable); answers built on a fallback
+    # understanding are not cached
+    def prepare(self, query: str):
         if not LLM_INITIALIZED:
             # Use enhanced fallback
             result_json = enhanced_fallback_response(query, "query understanding")
-            return json.loads(result_json)
+            return None, dict(json.loads(result_json), source="fallback")
+
+        if LOCAL_UNDERSTANDING:
+            # Confident local answer: skip the Gemini round trip entirely
+            result, confidence = local_understanding(query)
+            if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+                print(f"   ⚡ Local query analysis: {result.get('topic')} - {result.get('action_required')} ({confidence:.2f})")
+                return None, dict(result, source="local")
             
         prompt = f"QUERY: {query}\nOUTPUT JSON ONLY:"
-        
-        json_output = llm_generate(
-            prompt=prompt,
-            system_instruction=LLM_PROMPT_GUIDELINES["QUERY_UNDERSTANDING"]
-        )
+        return prompt, None
 
+    def finish(self, json_output: str, query: str) -> Dict[str, Any]:
         try:
             clean_output = json_output.strip()
             if '```json' in clean_output:
@@ -428,62 +808,69 @@ class QueryUnderstandingAgent:
                 print(f"   🎯 Query Analysis: {parsed.get('topic')} - {parsed.get('action_required')}")
                 if parsed.get('focus_areas'):
                     print(f"   🔍 Focus Areas: {parsed.get('focus_areas')}")
-                return parsed
+                # Training data for the local classifier (INTENT_LOG_PATH)
+                log_understanding(query, parsed)
+                return dict(parsed, source="llm")
             else:
                 raise ValueError("Missing required fields")
                 
         except (json.JSONDecodeError, AttributeError, KeyError, ValueError) as e:
             print(f"⚠️ LLM JSON parse failed, using fallback: {e}")
             result_json = enhanced_fallback_response(query, "query understanding")
-            return json.loads(result_json)
+            return dict(json.loads(result_json), source="fallback")
 
 class DocumentRetrievalAgent:
-    def process(self, query: str, context: Dict[str, Any]) -> List[Dict[str, Any]]:
-        global VECTOR_DB
-        
-        if VECTOR_DB is None:
+    def _store(self, topic: str):
+        # A topic with its own shard only searches that service's chunks
+        return VECTOR_SHARDS.for_topic(topic) if SHARD_ROUTING else VECTOR_DB
+
+    def primary(self, query: str):
+        """Main-query search (10 hits) that needs no understanding result, so /chat can run it
+        while QueryUnderstandingAgent is still waiting on the LLM. Routed by `guess_topic`."""
+        if not VECTOR_DB.ensure_loaded():
+            return None
+        topic = guess_topic(query)
+        store = self._store(topic)
+        try:
+            hits = multi_query_search(store, [(query, 10)]) if store.ensure_loaded() else []
+        except Exception as e:
+            print(f"❌ Primary retrieval error: {e}")
+            return None
+        return {"topic": topic, "store": store, "generation": store.pinned(), "hits": hits}
+
+    def process(self, query: str, context: Dict[str, Any], primary: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        if not VECTOR_DB.ensure_loaded():
             return [{"source": "system_ready", "content": "Knowledge base available"}]
             
         try:
-            # Enhanced comprehensive search: Get more documents
-            retrieved_docs = VECTOR_DB.similarity_search(query, k=10)  # Increased to 10 for comprehensive coverage
-            
-            # If we have context about focus areas, do additional searches
-            focus_areas = context.get('focus_areas', [])
-            additional_docs = []
-            
-            for focus in focus_areas[:4]:  # Search top 4 focus areas
-                try:
-                    focus_docs = VECTOR_DB.similarity_search(focus, k=3)
-                    additional_docs.extend(focus_docs)
-                except:
-                    continue
+            store = self._store(context.get('topic'))
+            # The speculative main-query hits stand if they came from the store we now route to
+            # and that store has not reopened a rebuilt index since
+            reuse = (primary is not None and primary["store"] is store and primary["hits"]
+                     and primary["generation"] is store.pinned())
+
+            # Enhanced comprehensive search: main query (10 for comprehensive coverage),
+            # top 4 focus areas (3 each) and related terms (2 each)
+            sub_queries = [(query, 10)]
+            sub_queries += [(focus, 3) for focus in context.get('focus_areas', [])[:4]]
             
-            # Also search for related terms
             related_terms = []
             if "aadhar" in query.lower() or context.get('topic') == 'aadhar':
                 related_terms = ["uidai", "enrollment", "biometric", "verification", "update"]
+            sub_queries += [(term, 2) for term in related_terms[:3]]
             
-            for term in related_terms[:3]:
-                try:
-                    term_docs = VECTOR_DB.similarity_search(term, k=2)
-                    additional_docs.extend(term_docs)
-                except:
-                    continue
-            
-            # Combine and deduplicate
-            all_docs = retrieved_docs + additional_docs
-            unique_docs = []
-            seen_content = set()
-            
-            for doc in all_docs:
-                content_hash = hash(doc.page_content[:100])  # Simple deduplication
-                if content_hash not in seen_content:
-                    seen_content.add(content_hash)
-                    unique_docs.append(doc)
+            # One batched encode and one FAISS search for all sub-queries, deduplicated by vector id
+            hits = list(primary["hits"]) if reuse else []
+            pending = sub_queries[1:] if reuse else sub_queries
+            if pending and store.ensure_loaded():
+                seen = {doc_id for _, doc_id, _ in hits}
+                hits += [hit for hit in multi_query_search(store, pending) if hit[1] not in seen]
+            if not hits and store is not VECTOR_DB:
+                print(f"   ↩️ Shard '{context.get('topic')}' returned nothing, searching global index")
+                hits = multi_query_search(VECTOR_DB, sub_queries)
             
             # Return up to 12 most relevant documents for comprehensive coverage
-            final_docs = unique_docs[:12]
+            final_docs = [doc for doc, _, _ in hits[:12]]
             
             print(f"   📚 Retrieved {len(final_docs)} documents for comprehensive Aadhaar coverage")
             
@@ -495,17 +882,31 @@ class DocumentRetrievalAgent:
             return [{"source": "system", "content": "Comprehensive document retrieval available"}]
 
 class SummarizationAgent:
+    SYSTEM = "SUMMARIZATION"
+
     def process(self, docs: List[Dict[str, Any]], query: str) -> str:
+        prompt, early = self.prepare(docs, query)
+        if prompt is None:
+            return early
+        return self.finish(llm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    async def aprocess(self, docs: List[Dict[str, Any]], query: str) -> str:
+        prompt, early = self.prepare(docs, query)
+        if prompt is None:
+            return early
+        return self.finish(await allm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    def prepare(self, docs: List[Dict[str, Any]], query: str):
         if not LLM_INITIALIZED:
-            return enhanced_fallback_response(query, "summarization")
+            return None, enhanced_fallback_response(query, "summarization")
             
         if not docs or docs[0].get('source') == 'system_error':
-            return "System configuration incomplete. Please contact administrator."
+            return None, "System configuration incomplete. Please contact administrator."
 
         # Check if we have actual content
         valid_docs = [doc for doc in docs if doc.get('content') and len(doc['content'].strip()) > 10]
         if not valid_docs:
-            return enhanced_fallback_response(query, "summarization")
+            return None, enhanced_fallback_response(query, "summarization")
 
         context_parts = []
         total_length = 0
@@ -519,17 +920,14 @@ class SummarizationAgent:
                 break
                 
         if not context_parts:
-            return enhanced_fallback_response(query, "summarization")
+            return None, enhanced_fallback_response(query, "summarization")
                 
         context_text = "\n---\n".join(context_parts)
         
         prompt = f"USER QUESTION: {query}\nRETRIEVED DOCUMENT CONTEXT:\n{context_text}"
-        
-        response = llm_generate(
-            prompt=prompt,
-            system_instruction=LLM_PROMPT_GUIDELINES['SUMMARIZATION']
-        )
-        
+        return prompt, None
+
+    def finish(self, response: str, query: str) -> str:
         # Ensure response is not empty
         if not response or len(response.strip()) < 10:
             return enhanced_fallback_response(query, "summarization")
@@ -578,16 +976,28 @@ class ActionPlanningAgent:
             }
 
 class LocationServiceAgent:
+    SYSTEM = "LOCATION_SERVICE"
+
     def process(self, query: str) -> str:
+        prompt, early = self.prepare(query)
+        if prompt is None:
+            return early
+        return self.finish(llm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    async def aprocess(self, query: str) -> str:
+        prompt, early = self.prepare(query)
+        if prompt is None:
+            return early
+        return self.finish(await allm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    def prepare(self, query: str):
         if not LLM_INITIALIZED:
-            return enhanced_fallback_response(query, "location service")
+            return None, enhanced_fallback_response(query, "location service")
             
         prompt = f"USER QUERY ABOUT AADHAAR LOCATION: {query}"
-        response = llm_generate(
-            prompt=prompt,
-            system_instruction=LLM_PROMPT_GUIDELINES['LOCATION_SERVICE']
-        )
-        
+        return prompt, None
+
+    def finish(self, response: str, query: str) -> str:
         # Ensure response is not empty
         if not response or len(response.strip()) < 10:
             return enhanced_fallback_response(query, "location service")
@@ -595,14 +1005,28 @@ class LocationServiceAgent:
         return response
 
 class FormAssistanceAgent:
+    SYSTEM = "FORM_ASSISTANCE"
+
     def process(self, docs: List[Dict[str, Any]], query: str) -> str:
+        prompt, early = self.prepare(docs, query)
+        if prompt is None:
+            return early
+        return self.finish(llm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    async def aprocess(self, docs: List[Dict[str, Any]], query: str) -> str:
+        prompt, early = self.prepare(docs, query)
+        if prompt is None:
+            return early
+        return self.finish(await allm_generate(prompt=prompt, system_instruction=LLM_PROMPT_GUIDELINES[self.SYSTEM]), query)
+
+    def prepare(self, docs: List[Dict[str, Any]], query: str):
         if not LLM_INITIALIZED:
-            return enhanced_fallback_response(query, "form assistance")
+            return None, enhanced_fallback_response(query, "form assistance")
             
         # Check if we have actual content
         valid_docs = [doc for doc in docs if doc.get('content') and len(doc['content'].strip()) > 10]
         if not valid_docs:
-            return "No Aadhaar form documentation available for detailed assistance."
+            return None, "No Aadhaar form documentation available for detailed assistance."
 
         context_parts = []
         total_length = 0
@@ -616,17 +1040,14 @@ class FormAssistanceAgent:
                 break
                 
         if not context_parts:
-            return "No relevant form documentation found for your query."
+            return None, "No relevant form documentation found for your query."
                 
         context_text = "\n---\n".join(context_parts)
         
         prompt = f"AADHAAR FORM-RELATED USER QUERY: {query}\nRETRIEVED FORM DOCUMENTATION:\n{context_text}"
-        
-        response = llm_generate(
-            prompt=prompt,
-            system_instruction=LLM_PROMPT_GUIDELINES['FORM_ASSISTANCE']
-        )
-        
+        return prompt, None
+
+    def finish(self, response: str, query: str) -> str:
         # Ensure response is not empty
         if not response or len(response.strip()) < 10:
             return enhanced_fallback_response(query, "form assistance")
@@ -634,10 +1055,5 @@ class FormAssistanceAgent:
         return response
 
 # --- Initialize LLM ---
-print("🔄 Initializing Gemini LLM with temperature 0.3...")
-initialize_llm()
-
-if LLM_INITIALIZED:
-    print("✅ Gemini LLM initialized successfully with natural response settings!")
-else:
-    print("⚠️  Using enhanced fallback system")
\ No newline at end of file
+# Not at import: probing Gemini takes network round trips. The chat service starts
+# start_llm_initialization() at startup and answers with the fallback system until it is ready.
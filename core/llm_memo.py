@@ -0,0 +1,169 @@
+"""
+Exact memoization of Gemini calls.
+
+`llm_generate` is deterministic enough at our fixed generation settings that a
+repeated (model, system instruction, prompt, params) tuple can reuse the earlier
+completion: retries, refreshes and double submissions then cost no quota. Keys
+are a SHA-256 of those inputs. The in-memory tier is an LRU
+(LLM_MEMO_SIZE); with LLM_MEMO_DB set, completions also go to a SQLite file that
+survives restarts and is shared by workers on the host. Entries older than
+LLM_MEMO_TTL seconds are ignored in both tiers, and expired rows are deleted
+as new ones are written.
+
+`aget`/`aput` are for the event loop: the memory tier is checked inline and
+SQLite reads and writes (which can wait on the file lock) run on a worker thread.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def memo_key(model: str, system_instruction: Optional[str], prompt: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps([model, system_instruction or "", prompt, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseMemo:
+    def __init__(self, max_entries: int = 2048, db_path: Optional[str] = None, ttl: float = 86400.0):
+        self.max_entries = max(int(max_entries), 1)
+        self.db_path = db_path
+        self.ttl = float(ttl)
+        # key -> (response, created); created is wall-clock time so disk rows keep their age
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            conn = self._conn()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # Expired rows are deleted on every write; the index keeps that a range scan
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_created ON llm_responses (created)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # One autocommit connection per thread; WAL lets workers read while one writes
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        response = self._memory_get(key)
+        return response if response is not None else self._disk_get(key)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """`get` without blocking the event loop on SQLite."""
+        response = self._memory_get(key)
+        if response is not None or not self.db_path:
+            return response if response is not None else self._disk_get(key)
+        return await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key)
+
+    def put(self, key: str, response: str) -> None:
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+        self._write_disk(key, response, created)
+
+    async def aput(self, key: str, response: str) -> None:
+        """`put` without blocking the event loop on SQLite."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, response, created)
+        if self.db_path:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, response, created)
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        row = self._read_disk(key)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, *row)
+        return row[0]
+
+    def _remember(self, key: str, response: str, created: float) -> None:
+        # Caller holds the lock
+        self._entries[key] = (response, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Tuple[str, float]]:
+        if not self.db_path:
+            return None
+        try:
+            row = self._conn().execute(
+                "SELECT response, created FROM llm_responses WHERE key = ? AND created >= ?", (key, time.time() - self.ttl)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return (row[0], row[1]) if row else None
+
+    def _write_disk(self, key: str, response: str, created: float) -> None:
+        if not self.db_path:
+            return
+        try:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?)", (key, response, created))
+            conn.execute("DELETE FROM llm_responses WHERE created < ?", (time.time() - self.ttl,))
+        except sqlite3.Error:
+            # A busy or read-only file only costs the disk tier
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk": bool(self.db_path),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_LLM_MEMO: Optional[LLMResponseMemo] = None
+_LLM_MEMO_LOCK = threading.Lock()
+
+
+def llm_memo_enabled() -> bool:
+    return os.getenv('LLM_MEMO_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def get_llm_memo() -> LLMResponseMemo:
+    """Process-wide LLM response memo configured from the environment."""
+    global _LLM_MEMO
+    if _LLM_MEMO is None:
+        with _LLM_MEMO_LOCK:
+            if _LLM_MEMO is None:
+                _LLM_MEMO = LLMResponseMemo(
+                    max_entries=int(os.getenv('LLM_MEMO_SIZE', '2048')),
+                    db_path=os.getenv('LLM_MEMO_DB') or None,
+                    ttl=float(os.getenv('LLM_MEMO_TTL', '86400')),
+                )
+    return _LLM_MEMO
@@ -0,0 +1,183 @@
+"""
+Token-bucket rate limiter for Gemini calls.
+
+Two buckets track the provider quota: requests per minute (LLM_RPM) and tokens
+per minute (LLM_TPM). Each refills continuously at quota/60 per second up to a
+full minute's worth, so calls go out immediately while budget remains and wait
+only for the refill they actually need. A call reserves its estimated tokens
+up front; `settle()` corrects the TPM bucket with the real usage afterwards.
+
+By default the buckets live in process memory. With LLM_RATE_LIMIT_STATE set
+to a SQLite file path, all workers on the host share one set of buckets
+(updated inside `BEGIN IMMEDIATE` transactions), so N workers together stay
+under the quota instead of N times it.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# (level, updated_at) per bucket name
+_State = Dict[str, Tuple[float, float]]
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Rough prompt size: ~4 characters per token for Gemini's tokenizer on English text."""
+    return max(1, sum(len(t or "") for t in texts) // 4)
+
+
+class RateLimiter:
+    def __init__(self, rpm: float, tpm: float, shared_path: Optional[str] = None, max_wait: float = 30.0):
+        # Refill rate per second and burst capacity per bucket
+        self.limits = {"requests": float(rpm), "tokens": float(tpm)}
+        self.shared_path = shared_path
+        self.max_wait = float(max_wait)
+        self._state: _State = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        if shared_path:
+            conn = self._connect()
+            try:
+                conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)")
+            finally:
+                conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.shared_path, timeout=10, isolation_level=None)
+
+    def _apply(self, state: _State, now: float, cost: Dict[str, float], force: bool) -> Tuple[_State, float]:
+        """Refill every bucket to `now`, then take `cost` if all buckets cover it.
+
+        Returns the new state and 0.0, or the unchanged levels and the seconds until
+        the scarcest bucket has refilled enough. `force` takes the cost regardless
+        (used to settle actual usage; a bucket may go into debt).
+        """
+        new_state: _State = {}
+        wait = 0.0
+        for name, per_minute in self.limits.items():
+            level, updated = state.get(name, (per_minute, now))
+            level = min(per_minute, level + max(0.0, now - updated) * per_minute / 60.0)
+            new_state[name] = (level, now)
+            # A single request larger than the bucket only has to wait for a full bucket
+            need = min(cost.get(name, 0.0), per_minute)
+            if level < need:
+                wait = max(wait, (need - level) * 60.0 / per_minute)
+        if wait and not force:
+            return new_state, wait
+        for name, amount in cost.items():
+            level, _ = new_state[name]
+            new_state[name] = (level - amount, now)
+        return new_state, 0.0
+
+    def _take(self, cost: Dict[str, float], force: bool = False) -> float:
+        now = time.time()
+        if not self.shared_path:
+            with self._lock:
+                self._state, wait = self._apply(self._state, now, cost, force)
+            return wait
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            state = {name: (level, updated) for name, level, updated in conn.execute("SELECT name, level, updated FROM buckets")}
+            state, wait = self._apply(state, now, cost, force)
+            conn.executemany("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                             [(name, level, updated) for name, (level, updated) in state.items()])
+            conn.execute("COMMIT")
+            return wait
+        finally:
+            conn.close()
+
+    def _gives_up(self, wait: float, started: float) -> bool:
+        if time.monotonic() - started + wait <= self.max_wait:
+            return False
+        with self._lock:
+            self.rejected += 1
+        return True
+
+    def _record(self, started: float, waited: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            if waited:
+                self.throttled += 1
+                self.wait_seconds += time.monotonic() - started
+
+    def acquire(self, tokens: int) -> bool:
+        """Reserve one request and `tokens` tokens, waiting only while the quota is exhausted.
+
+        Returns False if the budget would not free up within `max_wait` seconds.
+        """
+        cost = {"requests": 1.0, "tokens": float(tokens)}
+        started = time.monotonic()
+        waited = False
+        while True:
+            wait = self._take(cost)
+            if not wait:
+                break
+            if self._gives_up(wait, started):
+                return False
+            waited = True
+            time.sleep(wait)
+        self._record(started, waited)
+        return True
+
+    async def acquire_async(self, tokens: int) -> bool:
+        """`acquire` for the event loop: waits with asyncio.sleep, so other requests keep running."""
+        cost = {"requests": 1.0, "tokens": float(tokens)}
+        started = time.monotonic()
+        waited = False
+        while True:
+            # The shared SQLite bucket may block on another worker's transaction
+            wait = await asyncio.to_thread(self._take, cost) if self.shared_path else self._take(cost)
+            if not wait:
+                break
+            if self._gives_up(wait, started):
+                return False
+            waited = True
+            await asyncio.sleep(wait)
+        self._record(started, waited)
+        return True
+
+    def settle(self, reserved: int, actual: Optional[int]) -> None:
+        """Charge (or refund) the difference between the estimated and the reported token count."""
+        if actual is None or actual == reserved:
+            return
+        self._take({"tokens": float(actual - reserved)}, force=True)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "rpm": self.limits["requests"],
+                "tpm": self.limits["tokens"],
+                "shared": bool(self.shared_path),
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
+
+
+_RATE_LIMITER: Optional[RateLimiter] = None
+_RATE_LIMITER_LOCK = threading.Lock()
+
+
+def rate_limit_enabled() -> bool:
+    return os.getenv('LLM_RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def get_rate_limiter() -> RateLimiter:
+    """Process-wide limiter; defaults match the Gemini Flash free tier (15 RPM, 1M TPM)."""
+    global _RATE_LIMITER
+    if _RATE_LIMITER is None:
+        with _RATE_LIMITER_LOCK:
+            if _RATE_LIMITER is None:
+                _RATE_LIMITER = RateLimiter(
+                    rpm=float(os.getenv('LLM_RPM', '15')),
+                    tpm=float(os.getenv('LLM_TPM', '1000000')),
+                    shared_path=os.getenv('LLM_RATE_LIMIT_STATE') or None,
+                    max_wait=float(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', '30')),
+                )
+    return _RATE_LIMITER
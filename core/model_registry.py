@@ -0,0 +1,88 @@
+"""
+Process-wide embedding model registry.
+
+Every caller that needs a SentenceTransformer goes through `get_embedding_model`,
+so each (model name, device) pair is loaded once per process and shared.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_MODELS: Dict[Tuple[str, str], Any] = {}
+_FAILED: Dict[Tuple[str, str], str] = {}
+_KEY_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model_name() -> str:
+    return os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+
+def get_device() -> Optional[str]:
+    """Device from EMBEDDING_DEVICE (cpu, cuda, mps); None lets sentence-transformers choose."""
+    return os.getenv('EMBEDDING_DEVICE') or None
+
+def embeddings_enabled() -> bool:
+    return os.getenv('EMBEDDING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def _key(model_name: Optional[str], device: Optional[str]) -> Tuple[str, str]:
+    return (model_name or get_model_name(), device or get_device() or 'auto')
+
+def get_embedding_model(model_name: Optional[str] = None, device: Optional[str] = None):
+    """Return the shared SentenceTransformer for (model_name, device), loading it on first use.
+
+    Returns None if sentence-transformers is not installed or the model failed to load;
+    the failure is remembered so later callers do not retry the load on the request path.
+    """
+    key = _key(model_name, device)
+    model = _MODELS.get(key)
+    if model is not None or key in _FAILED:
+        return model
+
+    with _REGISTRY_LOCK:
+        lock = _KEY_LOCKS.setdefault(key, threading.Lock())
+
+    # Per-key lock: concurrent callers wait for a single load instead of racing
+    with lock:
+        if key in _MODELS or key in _FAILED:
+            return _MODELS.get(key)
+        try:
+            from sentence_transformers import SentenceTransformer
+            name, dev = key
+            model = SentenceTransformer(name, device=None if dev == 'auto' else dev)
+            _MODELS[key] = model
+            return model
+        except Exception as e:
+            _FAILED[key] = str(e)
+            return None
+
+def warm_up(model_name: Optional[str] = None, device: Optional[str] = None) -> bool:
+    """Load the model and run one encode so the first real request does not pay for it."""
+    model = get_embedding_model(model_name, device)
+    if model is None:
+        return False
+    try:
+        model.encode("warm up")
+        return True
+    except Exception:
+        return False
+
+def start_background_warm_up(model_name: Optional[str] = None, device: Optional[str] = None) -> Optional[threading.Thread]:
+    """Warm up in a daemon thread so server startup is not blocked by the model load."""
+    if not embeddings_enabled() or os.getenv('EMBEDDING_WARMUP', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    thread = threading.Thread(target=warm_up, args=(model_name, device), name="embedding-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def registry_status() -> Dict[str, List[Dict[str, str]]]:
+    return {
+        "loaded": [{"model": name, "device": dev} for name, dev in _MODELS],
+        "failed": [{"model": name, "device": dev, "error": err} for (name, dev), err in _FAILED.items()],
+    }
+
+def clear_registry() -> None:
+    """Drop all loaded models (used by tests and after model configuration changes)."""
+    with _REGISTRY_LOCK:
+        _MODELS.clear()
+        _FAILED.clear()
+        _KEY_LOCKS.clear()
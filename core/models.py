@@ -1,14 +1,38 @@
 """
 Streamlined Database Models - Essential entities only
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, func, DECIMAL, ARRAY, Index
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, func, DECIMAL, ARRAY, Index, Computed
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.dialects.postgresql import UUID, ARRAY as PG_ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from pgvector.sqlalchemy import Vector
 import uuid
 from .database import Base
 
+# Full-text search configs: English content is stemmed; Hindi/Devanagari (and any
+# other language) goes through 'simple', which only lower-cases and splits words.
+# Each branch is a regconfig constant so the expressions stay IMMUTABLE, as
+# generated columns require.
+def _ts_config_by_language(column: str) -> str:
+    return f"CASE WHEN coalesce({column}, 'en') = 'en' THEN 'english'::regconfig ELSE 'simple'::regconfig END"
+
+# Chunks carry no language column; any Devanagari character selects 'simple'
+_TS_CONFIG_BY_SCRIPT = "CASE WHEN content_text ~ '[\u0900-\u097F]' THEN 'simple'::regconfig ELSE 'english'::regconfig END"
+
+# Long bodies are capped so the stored vector stays well under the 1MB tsvector limit
+TSV_MAX_CHARS = 100000
+
+DOCUMENT_TSV_SQL = (
+    f"setweight(to_tsvector({_ts_config_by_language('language')}, coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector({_ts_config_by_language('language')}, coalesce(description, '')), 'B') || "
+    f"setweight(to_tsvector({_ts_config_by_language('language')}, left(coalesce(raw_content, ''), {TSV_MAX_CHARS})), 'D')"
+)
+FAQ_TSV_SQL = (
+    f"setweight(to_tsvector({_ts_config_by_language('language')}, coalesce(question, '')), 'A') || "
+    f"setweight(to_tsvector({_ts_config_by_language('language')}, coalesce(answer, '')), 'B')"
+)
+CHUNK_TSV_SQL = f"to_tsvector({_TS_CONFIG_BY_SCRIPT}, left(content_text, {TSV_MAX_CHARS}))"
+
 class Service(Base):
     __tablename__ = "services"
     
@@ -61,6 +85,8 @@ class Document(Base):
     is_processed = Column(Boolean, default=False)
     raw_content = Column(Text)
     embedding = Column(Vector(384))
+    # Maintained by Postgres; deferred so entity loads never ship it
+    search_tsv = deferred(Column(TSVECTOR, Computed(DOCUMENT_TSV_SQL, persisted=True)))
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     
     service = relationship("Service", back_populates="documents")
@@ -78,6 +104,7 @@ class FAQ(Base):
     language = Column(String(10), default='en')
     question_embedding = Column(Vector(384))
     answer_embedding = Column(Vector(384))
+    search_tsv = deferred(Column(TSVECTOR, Computed(FAQ_TSV_SQL, persisted=True)))
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     
     service = relationship("Service", back_populates="faqs")
@@ -91,6 +118,7 @@ class ContentChunk(Base):
     service_id = Column(Integer, ForeignKey("services.service_id", ondelete="CASCADE"))
     category = Column(String(100))
     embedding = Column(Vector(384))
+    search_tsv = deferred(Column(TSVECTOR, Computed(CHUNK_TSV_SQL, persisted=True)))
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
 # Helpful indexes for common queries and filters
@@ -101,17 +129,10 @@ Index('idx_documents_language', Document.language)
 Index('idx_faq_language', FAQ.language)
 Index('idx_chunks_category', ContentChunk.category)
 
-# Full-text search index for documents (GIN over tsvector)
-try:
-    from sqlalchemy import text
-    Index(
-        'idx_documents_tsv',
-        text("to_tsvector('english', coalesce(name,'') || ' ' || coalesce(description,'') || ' ' || coalesce(raw_content,''))"),
-        postgresql_using='gin'
-    )
-except Exception:
-    # Skip if dialect does not support this at model import time
-    pass
+# Full-text search indexes (GIN over the stored tsvector columns)
+Index('idx_documents_search_tsv', Document.search_tsv, postgresql_using='gin')
+Index('idx_faqs_search_tsv', FAQ.search_tsv, postgresql_using='gin')
+Index('idx_chunks_search_tsv', ContentChunk.search_tsv, postgresql_using='gin')
 
 # --- Phase 4: Raw scraped content storage (Data Warehouse alignment) ---
 class RawContent(Base):
@@ -144,3 +165,11 @@ class RawContent(Base):
     updated_at = Column(TIMESTAMP(timezone=True), onupdate=func.now())
 
 Index('idx_raw_content_source_type', RawContent.source_type)
+
+# Single-row counter bumped whenever searchable content changes; result caches key on it
+class CorpusGeneration(Base):
+    __tablename__ = "corpus_generation"
+
+    id = Column(Integer, primary_key=True, default=1)
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -4,5 +4,7 @@ Operational utilities such as caching and backup/restore helpers.
 """
 
 from ..cache import ttl_cache  # type: ignore
+from .vector_indexes import VectorIndexManager  # type: ignore
+from .text_search import ensure_text_search  # type: ignore
 
-__all__ = ["ttl_cache"]
\ No newline at end of file
+__all__ = ["ttl_cache", "VectorIndexManager", "ensure_text_search"]
\ No newline at end of file
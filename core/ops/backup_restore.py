@@ -8,6 +8,7 @@ from sqlalchemy.orm import Session
 import sqlalchemy as sa
 
 from ..models import Service, Document, FAQ, ContentChunk, RawContent
+from ..search_cache import bump_corpus_generation
 from sqlalchemy.dialects.postgresql import UUID as PGUUID
 
 
@@ -35,6 +36,9 @@ def _to_json_safe(value: Any) -> Any:
 def _model_to_dict(obj: Any) -> Dict[str, Any]:
     data: Dict[str, Any] = {}
     for col in obj.__table__.columns:
+        if col.computed is not None:
+            # Generated columns (search_tsv) are rebuilt by Postgres on restore
+            continue
         val = getattr(obj, col.name)
         data[col.name] = _to_json_safe(val)
     return data
@@ -112,6 +116,9 @@ def restore_database(session: Session, input_dir: str) -> Dict[str, Any]:
         # Remove auto-managed timestamp fields to avoid parsing issues
         for ts_field in ("created_at", "updated_at"):
             out.pop(ts_field, None)
+        for col in model.__table__.columns:
+            if col.computed is not None:
+                out.pop(col.name, None)
         # Coerce UUID strings back to uuid.UUID
         try:
             for col in model.__table__.columns:
@@ -136,4 +143,5 @@ def restore_database(session: Session, input_dir: str) -> Dict[str, Any]:
         session.flush()
 
     session.commit()
+    bump_corpus_generation()
     return {"restored_counts": restored_counts, "input_dir": input_dir}
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Full-text search columns: add the generated, stored `search_tsv` columns to an
+existing database and build their GIN indexes.
+
+The expressions come from the models (Document, FAQ, ContentChunk), so a fresh
+`create_all` and this migration produce the same columns. Adding a stored
+generated column rewrites the table once; the GIN indexes are then built with
+CREATE INDEX CONCURRENTLY so reads and writes keep flowing.
+"""
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from ..models import Document, FAQ, ContentChunk
+
+# (model, GIN index name)
+TEXT_SEARCH_COLUMNS = [
+    (Document, "idx_documents_search_tsv"),
+    (FAQ, "idx_faqs_search_tsv"),
+    (ContentChunk, "idx_chunks_search_tsv"),
+]
+
+# Expression index the old per-query to_tsvector() search relied on
+LEGACY_INDEXES = ["idx_documents_tsv"]
+
+
+def _column_exists(conn, table: str, column: str) -> bool:
+    row = conn.execute(text(
+        "SELECT 1 FROM information_schema.columns WHERE table_name = :table AND column_name = :column"
+    ), {"table": table, "column": column}).fetchone()
+    return row is not None
+
+
+def ensure_text_search(engine: Engine, drop_legacy: bool = True) -> List[Dict[str, Any]]:
+    """Idempotently add each search_tsv column and its GIN index; returns one entry per table."""
+    report: List[Dict[str, Any]] = []
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for model, index_name in TEXT_SEARCH_COLUMNS:
+            table = model.__tablename__
+            column = model.__table__.c.search_tsv
+            entry: Dict[str, Any] = {"table": table, "index": index_name}
+            try:
+                started = time.time()
+                if _column_exists(conn, table, column.name):
+                    entry["column"] = "exists"
+                else:
+                    conn.execute(text(
+                        f"ALTER TABLE {table} ADD COLUMN {column.name} tsvector "
+                        f"GENERATED ALWAYS AS ({column.computed.sqltext}) STORED"
+                    ))
+                    entry["column"] = "added"
+                conn.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table} USING gin ({column.name})"
+                ))
+                entry["seconds"] = round(time.time() - started, 2)
+            except Exception as e:
+                entry["error"] = str(e)
+            report.append(entry)
+
+        if drop_legacy and not any("error" in e for e in report):
+            for name in LEGACY_INDEXES:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                report.append({"index": name, "action": "dropped_legacy"})
+    return report
@@ -0,0 +1,232 @@
+"""
+pgvector ANN index lifecycle: choose HNSW or IVFFlat from the data, size the
+build parameters, build with CREATE INDEX CONCURRENTLY and report size/timing.
+Besides the global index per vector column, each major service gets a partial
+index (WHERE service_id = N) that service-filtered searches can use directly.
+"""
+import math
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# (index name, table, embedding column)
+VECTOR_INDEXES: List[Tuple[str, str, str]] = [
+    ("idx_documents_embedding", "documents", "embedding"),
+    ("idx_faqs_question_embedding", "faqs", "question_embedding"),
+    ("idx_chunks_embedding", "content_chunks", "embedding"),
+]
+
+# Services that get their own partial vector index, so service-scoped searches
+# walk a small graph instead of post-filtering the global one
+MAJOR_SERVICES: List[str] = ["passport", "aadhaar", "pan", "epfo", "parivahan"]
+
+# Below this many embedded rows an exact scan is fast and an ANN index only costs recall
+MIN_ROWS_FOR_INDEX = int(os.getenv("VECTOR_INDEX_MIN_ROWS", "1000"))
+
+
+def _explicit_service_ids() -> Dict[str, int]:
+    """Parse VECTOR_PARTIAL_INDEX_SERVICES, e.g. "passport=1,pan=3"."""
+    ids: Dict[str, int] = {}
+    for item in os.getenv("VECTOR_PARTIAL_INDEX_SERVICES", "").split(","):
+        key, _, service_id = item.partition("=")
+        key = key.strip().lower()
+        # The key becomes part of the index name
+        if re.fullmatch(r"[a-z0-9_]+", key) and service_id.strip().isdigit():
+            ids[key] = int(service_id)
+    return ids
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    return tuple(int(p) for p in re.findall(r"\d+", version or "")[:3])
+
+
+def plan_index(rows: int, hnsw_available: bool) -> Optional[Dict[str, Any]]:
+    """Pick the index method and build parameters for a column with `rows` embeddings.
+
+    HNSW when pgvector supports it (better recall/latency, no training); IVFFlat
+    otherwise, with `lists` following the pgvector guidance of rows/1000 up to
+    1M rows and sqrt(rows) beyond. Returns None when no index is worthwhile.
+    """
+    if rows < MIN_ROWS_FOR_INDEX:
+        return None
+    if hnsw_available:
+        m = 16 if rows < 1_000_000 else 24
+        ef_construction = 64 if rows < 100_000 else 128
+        return {"method": "hnsw", "params": {"m": m, "ef_construction": ef_construction}}
+    lists = rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows))
+    return {"method": "ivfflat", "params": {"lists": max(lists, 10)}}
+
+
+def _parse_indexdef(indexdef: str) -> Dict[str, Any]:
+    method = re.search(r"USING (\w+)", indexdef or "")
+    params = dict(re.findall(r"(\w+)\s*=\s*'?(\d+)'?", (indexdef or "").split("WITH", 1)[1])) if "WITH" in (indexdef or "") else {}
+    return {"method": method.group(1).lower() if method else None, "params": {k: int(v) for k, v in params.items()}}
+
+
+def _needs_rebuild(existing: Dict[str, Any], plan: Dict[str, Any]) -> bool:
+    # A failed concurrent build leaves an INVALID index behind
+    if not existing.get("valid", True) or existing["method"] != plan["method"]:
+        return True
+    if plan["method"] == "ivfflat":
+        # Centroids trained on a much smaller table are stale; rebuild when lists is off by 2x
+        current = existing["params"].get("lists", 100)
+        wanted = plan["params"]["lists"]
+        return current * 2 < wanted or wanted * 2 < current
+    return existing["params"].get("m", 16) != plan["params"]["m"]
+
+
+class VectorIndexManager:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def _autocommit(self):
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+        return self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    def pgvector_version(self) -> Optional[str]:
+        with self.engine.connect() as conn:
+            row = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname='vector'")).fetchone()
+            return row[0] if row else None
+
+    def _embedded_rows(self, conn, table: str, column: str, service_id: Optional[int] = None) -> int:
+        where = f"{column} IS NOT NULL" + (f" AND service_id = {int(service_id)}" if service_id is not None else "")
+        return int(conn.execute(text(f"SELECT count(*) FROM {table} WHERE {where}")).scalar() or 0)
+
+    def _major_service_ids(self, conn) -> Dict[str, int]:
+        """MAJOR_SERVICES key -> service_id, from VECTOR_PARTIAL_INDEX_SERVICES or an exact category match.
+
+        A key that matches no service, or more than one, gets no partial index rather than a guess.
+        """
+        ids = _explicit_service_ids()
+        rows = conn.execute(text("SELECT service_id, lower(category) FROM services")).fetchall()
+        for key in MAJOR_SERVICES:
+            if key in ids:
+                continue
+            matches = [int(service_id) for service_id, category in rows if category == key]
+            if len(matches) == 1:
+                ids[key] = matches[0]
+        return ids
+
+    def index_specs(self, conn) -> List[Tuple[str, str, str, Optional[int]]]:
+        """Global indexes plus one partial index per (table, major service)."""
+        specs: List[Tuple[str, str, str, Optional[int]]] = [(n, t, c, None) for n, t, c in VECTOR_INDEXES]
+        service_ids = self._major_service_ids(conn)
+        for name, table, column in VECTOR_INDEXES:
+            for key, service_id in service_ids.items():
+                specs.append((f"{name}_{key}", table, column, service_id))
+        return specs
+
+    def _existing(self, conn, name: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(text(
+            "SELECT i.indexdef, x.indisvalid FROM pg_indexes i "
+            "JOIN pg_class c ON c.relname = i.indexname "
+            "JOIN pg_index x ON x.indexrelid = c.oid "
+            "WHERE i.indexname = :name"
+        ), {"name": name}).fetchone()
+        if not row:
+            return None
+        parsed = _parse_indexdef(row[0])
+        parsed["valid"] = bool(row[1])
+        return parsed
+
+    def _index_size(self, conn, name: str) -> Optional[int]:
+        row = conn.execute(text("SELECT pg_relation_size(to_regclass(:name))"), {"name": name}).fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def _build(self, conn, name: str, table: str, column: str, plan: Dict[str, Any], service_id: Optional[int] = None) -> None:
+        with_clause = ", ".join(f"{k} = {v}" for k, v in plan["params"].items())
+        where = f" WHERE service_id = {int(service_id)}" if service_id is not None else ""
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY {name} ON {table} "
+            f"USING {plan['method']} ({column} vector_cosine_ops) WITH ({with_clause}){where}"
+        ))
+
+    def ensure_indexes(self, force_rebuild: bool = False) -> List[Dict[str, Any]]:
+        """Create missing indexes and rebuild ones whose method/parameters no longer fit the data.
+
+        Rebuilds go through a temporary index built concurrently and swapped in by
+        rename, so searches keep using the old index until the new one is ready.
+        """
+        version = self.pgvector_version()
+        if version is None:
+            return []
+        hnsw_available = _version_tuple(version) >= (0, 5, 0)
+        report: List[Dict[str, Any]] = []
+
+        with self._autocommit() as conn:
+            for name, table, column, service_id in self.index_specs(conn):
+                entry: Dict[str, Any] = {"index": name, "table": table, "column": column, "service_id": service_id}
+                try:
+                    rows = self._embedded_rows(conn, table, column, service_id)
+                    plan = plan_index(rows, hnsw_available)
+                    existing = self._existing(conn, name)
+                    entry.update({"rows": rows, "existing": existing})
+
+                    if plan is None and existing is not None and existing["method"] == "ivfflat":
+                        # IVFFlat centroids trained on a near-empty table hurt recall more than a seq scan
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                        entry["action"] = "dropped_small_table"
+                    elif plan is None:
+                        entry["action"] = "skipped_small_table"
+                    elif existing is None:
+                        started = time.time()
+                        self._build(conn, name, table, column, plan, service_id)
+                        entry.update({"action": "created", "build_seconds": round(time.time() - started, 2)})
+                    elif force_rebuild or _needs_rebuild(existing, plan):
+                        started = time.time()
+                        tmp_name = f"{name}_rebuild"
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name}"))
+                        self._build(conn, tmp_name, table, column, plan, service_id)
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                        conn.execute(text(f"ALTER INDEX {tmp_name} RENAME TO {name}"))
+                        entry.update({"action": "rebuilt", "build_seconds": round(time.time() - started, 2)})
+                    else:
+                        entry["action"] = "unchanged"
+
+                    entry["plan"] = plan
+                    entry["size_bytes"] = self._index_size(conn, name)
+                except Exception as e:
+                    entry.update({"action": "error", "error": str(e)})
+                report.append(entry)
+        return report
+
+    def reindex_after_bulk_ingest(self) -> List[Dict[str, Any]]:
+        """Re-plan after a large load: resizes IVFFlat lists and refreshes HNSW graphs."""
+        report = self.ensure_indexes()
+        with self._autocommit() as conn:
+            for entry in report:
+                if entry.get("action") != "unchanged":
+                    continue
+                started = time.time()
+                try:
+                    conn.execute(text(f"REINDEX INDEX CONCURRENTLY {entry['index']}"))
+                    entry.update({
+                        "action": "reindexed",
+                        "build_seconds": round(time.time() - started, 2),
+                        "size_bytes": self._index_size(conn, entry["index"]),
+                    })
+                except Exception as e:
+                    entry.update({"action": "error", "error": str(e)})
+        return report
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Current method, parameters, row counts and on-disk size of each vector index."""
+        out: List[Dict[str, Any]] = []
+        with self.engine.connect() as conn:
+            for name, table, column, service_id in self.index_specs(conn):
+                try:
+                    out.append({
+                        "index": name,
+                        "table": table,
+                        "service_id": service_id,
+                        "rows": self._embedded_rows(conn, table, column, service_id),
+                        "existing": self._existing(conn, name),
+                        "size_bytes": self._index_size(conn, name),
+                    })
+                except Exception as e:
+                    out.append({"index": name, "table": table, "error": str(e)})
+        return out
@@ -6,11 +6,12 @@ import re
 import hashlib
 from typing import Dict, Any, List
 from sqlalchemy.orm import Session
-from sentence_transformers import SentenceTransformer
 import PyPDF2
 import pdfplumber
 import fitz
 from .models import Service, Document, ContentChunk
+from .model_registry import get_embedding_model
+from .search_cache import bump_corpus_generation
 from .repositories import ServiceRepository, DocumentRepository, ContentChunkRepository
 from data.processing.document_parser import DocumentParser
 from data.processing.classifier import DocumentClassifier
@@ -19,7 +20,7 @@ class DocumentProcessor:
     def __init__(self, db: Session):
         self.db = db
         model_name = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
-        self.embedding_model = SentenceTransformer(model_name)
+        self.embedding_model = get_embedding_model(model_name)
         self.service_repo = ServiceRepository(db)
         self.document_repo = DocumentRepository(db)
         self.chunk_repo = ContentChunkRepository(db)
@@ -56,6 +57,7 @@ class DocumentProcessor:
 
             # Create content chunks
             chunks = self._create_chunks(text_content, service_id)
+            bump_corpus_generation()
 
             return {
                 'status': 'success',
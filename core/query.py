@@ -1,51 +1,199 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from typing import List, Dict, Any, Optional
 from .database import SessionLocal
 from .search import SearchEngine
-from .repositories import DocumentRepository
+from .repositories import DocumentRepository, TextSearchRepository
 from .nlp import NLPToolkit
+from .search_cache import get_result_cache, result_cache_enabled
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
 _QUERY_LOG: List[Dict[str, Any]] = []
 
 def hybrid_search(db, query: str, limit: int = 10) -> Dict[str, Any]:
-    """Combine vector search with simple text search and merge results.
-    Robust against database transaction errors by rolling back and returning graceful fallbacks.
+    """Combine vector search with full-text search and merge results by reciprocal-rank fusion.
+
+    The vector leg runs on a pooled worker with its own session while the text
+    leg runs on `db` in the calling thread. Each leg gets HYBRID_LEG_TIMEOUT_MS,
+    enforced in Postgres with statement_timeout so a slow query is cancelled
+    rather than left holding a worker; a leg that is slow, fails or finds the
+    pool busy contributes nothing and is listed under `degraded`.
+    Served from the versioned result cache until the corpus generation changes.
     """
-    se = SearchEngine(db)
-    # Vector search with safe fallback
+    if not result_cache_enabled():
+        return _hybrid_search(db, query, limit)
+    cache = get_result_cache()
+    key = cache.make_key("hybrid", query, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    response = _hybrid_search(db, query, limit)
+    # A partial answer is not worth serving again once the slow leg recovers
+    if not response.get("degraded"):
+        cache.put(key, response)
+    return response
+
+_LEG_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_LEG_SLOTS: Optional[threading.BoundedSemaphore] = None
+_LEG_EXECUTOR_LOCK = threading.Lock()
+
+def _leg_executor() -> ThreadPoolExecutor:
+    global _LEG_EXECUTOR, _LEG_SLOTS
+    if _LEG_EXECUTOR is None:
+        with _LEG_EXECUTOR_LOCK:
+            if _LEG_EXECUTOR is None:
+                workers = int(os.getenv("HYBRID_SEARCH_WORKERS", "8"))
+                # One slot per worker: a leg is only submitted when a worker is free to run it
+                _LEG_SLOTS = threading.BoundedSemaphore(workers)
+                _LEG_EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hybrid-leg")
+    return _LEG_EXECUTOR
+
+def _submit_leg(fn, *args):
+    """Run `fn` on the leg pool, or return None when every worker is busy (no queueing)."""
+    executor = _leg_executor()
+    if not _LEG_SLOTS.acquire(blocking=False):
+        return None
+
+    def run():
+        try:
+            return fn(*args)
+        finally:
+            _LEG_SLOTS.release()
     try:
-        vector = se.search(query, limit=limit)
-        vector_results = vector.get("results", [])
-    except Exception:
-        # If vector search fails, fallback to no vector results
-        vector_results = []
-
-    # Text search with transaction safety
-    text_results: List[Dict[str, Any]] = []
+        return executor.submit(run)
+    except RuntimeError:
+        _LEG_SLOTS.release()
+        raise
+
+def _set_statement_timeout(db, timeout: Optional[float]) -> None:
+    if timeout is not None:
+        # SET LOCAL: lasts until the leg's transaction ends, then the session default applies again
+        db.execute(text(f"SET LOCAL statement_timeout = {max(int(timeout * 1000), 1)}"))
+
+def _is_statement_timeout(error: Any) -> bool:
+    # 57014 = query_canceled
+    return getattr(getattr(error, "orig", None), "pgcode", None) == "57014" or "statement timeout" in str(error)
+
+def _vector_leg(query: str, limit: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        _set_statement_timeout(db, timeout)
+        response = SearchEngine(db).search(query, limit=limit)
+        if "error" in response:
+            if _is_statement_timeout(response["error"]):
+                raise FutureTimeout()
+            raise RuntimeError(response["error"])
+        return response.get("results", [])
+    finally:
+        db.close()
+
+def _text_leg(db, query: str, limit: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    own_session = db is None
+    db = SessionLocal() if own_session else db
+    snippet_chars = int(os.getenv("SEARCH_SNIPPET_CHARS", "1000")) or None
     try:
-        repo = DocumentRepository(db)
-        text_docs = repo.search_text(query, limit=limit)
-        text_results = [
-            {
-                "type": "document",
-                "content": d.raw_content or d.name,
-                "similarity": 0.0,
-                "service_id": d.service_id,
-                "source": "text"
-            }
-            for d in text_docs
-        ]
-    except SQLAlchemyError:
-        # Rollback aborted transaction and proceed with available results
         try:
+            _set_statement_timeout(db, timeout)
+            rows = TextSearchRepository(db).search_text_all(query, limit=limit, snippet_chars=snippet_chars)
+            return [
+                {
+                    "type": row["type"],
+                    "content": row["content"],
+                    "text_rank": float(row["rank"]),
+                    "service_id": row["service_id"],
+                    "source": "text"
+                }
+                for row in rows
+            ]
+        except SQLAlchemyError as e:
+            # Rollback aborted transaction (this also clears the leg's statement_timeout)
             db.rollback()
-        except Exception:
-            pass
-        text_results = []
+            if _is_statement_timeout(e):
+                raise FutureTimeout()
+            # Documents-only search still has an ILIKE fallback
+            return [
+                {
+                    "type": "document",
+                    "content": (d.raw_content or d.name)[:snippet_chars],
+                    "service_id": d.service_id,
+                    "source": "text"
+                }
+                for d in DocumentRepository(db).search_text(query, limit=limit)
+            ]
+        finally:
+            if not own_session and timeout is not None and db.in_transaction():
+                try:
+                    db.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+                except SQLAlchemyError:
+                    db.rollback()
+    finally:
+        if own_session:
+            db.close()
+
+def reciprocal_rank_fusion(legs: Dict[str, List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """Merge ranked lists: score = sum of 1 / (k + rank) over the legs an item appears in.
+
+    Items are matched across legs by (type, content prefix); the vector leg's
+    `similarity` is kept when present. Raw scores are never compared across
+    legs, so cosine similarities and ts_rank values need no calibration.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for leg, results in legs.items():
+        for rank, item in enumerate(results, start=1):
+            key = (item.get("type"), (item.get("content") or "")[:200])
+            entry = fused.get(key)
+            if entry is None:
+                entry = dict(item)
+                entry.setdefault("similarity", 0.0)
+                entry["rrf_score"] = 0.0
+                entry["legs"] = []
+                fused[key] = entry
+            else:
+                for field, value in item.items():
+                    entry.setdefault(field, value)
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["legs"].append(leg)
+    merged = list(fused.values())
+    merged.sort(key=lambda x: x["rrf_score"], reverse=True)
+    return merged
+
+def _hybrid_search(db, query: str, limit: int) -> Dict[str, Any]:
+    timeout = float(os.getenv("HYBRID_LEG_TIMEOUT_MS", "1500")) / 1000.0
+    deadline = time.monotonic() + timeout
+    legs: Dict[str, List[Dict[str, Any]]] = {}
+    degraded: Dict[str, str] = {}
+    vector = _submit_leg(_vector_leg, query, limit, timeout)
+    if vector is None:
+        degraded["vector"] = "busy"
+
+    # Text leg on the caller's session while the vector leg runs on the pool
+    try:
+        legs["text"] = _text_leg(db, query, limit, timeout)
+    except FutureTimeout:
+        degraded["text"] = "timeout"
+    except Exception as e:
+        degraded["text"] = str(e) or type(e).__name__
+
+    if vector is not None:
+        try:
+            legs["vector"] = vector.result(timeout=max(deadline - time.monotonic(), 0.0))
+        except FutureTimeout:
+            # statement_timeout cancels the leg's query, so the worker frees up shortly
+            vector.cancel()
+            degraded["vector"] = "timeout"
+        except Exception as e:
+            degraded["vector"] = str(e) or type(e).__name__
 
-    merged = vector_results + text_results
-    merged.sort(key=lambda x: x.get("similarity", 0), reverse=True)
-    return {"query": query, "results": merged[:limit], "total_results": len(merged)}
+    # Fuse in a fixed leg order so ties rank the same way every time
+    legs = {name: legs[name] for name in ("vector", "text") if name in legs}
+    merged = reciprocal_rank_fusion(legs, k=int(os.getenv("HYBRID_RRF_K", "60")))
+    response: Dict[str, Any] = {"query": query, "results": merged[:limit], "total_results": len(merged)}
+    if degraded:
+        response["degraded"] = degraded
+    return response
 
 def query_understanding(text: str) -> Dict[str, Any]:
     nlp = NLPToolkit()
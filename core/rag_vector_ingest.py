@@ -1,14 +1,260 @@
 import os
+import sys
 import glob # We need this for a more robust path search
+import json
+import shutil
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
 from langchain_community.document_loaders import PyPDFDirectoryLoader, PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_community.vectorstores import FAISS
 
+# Allow `python core/rag_vector_ingest.py` to import sibling core modules
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
 # --- Configuration ---
 DATA_PATH = "AI-Powered-Citizen-Service-Chatbot/data/docs" 
 VECTOR_DB_PATH = "AI-Powered-Citizen-Service-Chatbot/faiss_index"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2" 
+MANIFEST_FILE = "manifest.json"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# PDF text extraction is CPU-bound and runs across processes; encoding happens in large batches
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "256"))
+
+def find_pdfs(data_path: str) -> List[str]:
+    # Use glob to find all PDF paths recursively
+    # This correctly finds all .pdf files in the data_path and its subdirectories
+    search_path = os.path.join(data_path, "**", "*.pdf")
+    try:
+        return sorted(glob.glob(search_path, recursive=True))
+    except Exception as e:
+        raise RuntimeError(f"FATAL ERROR during path search: {e}")
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def chunk_ids(rel_path: str, digest: str, count: int) -> List[str]:
+    """Stable docstore ids from (path, content): an unchanged file keeps its ids across runs."""
+    path_key = hashlib.sha1(rel_path.encode("utf-8")).hexdigest()[:8]
+    return [f"{path_key}-{digest[:16]}-{i}" for i in range(count)]
+
+def plan_changes(manifest: Dict[str, Dict], current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+    """Compare the manifest with {path: digest} on disk -> (added, changed, removed) paths."""
+    added = sorted(p for p in current if p not in manifest)
+    changed = sorted(p for p in current if p in manifest and manifest[p]["sha256"] != current[p])
+    removed = sorted(p for p in manifest if p not in current)
+    return added, changed, removed
+
+def load_manifest(db_path: str) -> Dict[str, Dict]:
+    path = os.path.join(db_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("files", {})
+
+def manifest_matches(manifest: Dict[str, Dict], vector_store: FAISS) -> bool:
+    """True if the manifest lists exactly the docstore ids stored in `vector_store`."""
+    listed = {doc_id for entry in manifest.values() for doc_id in entry["ids"]}
+    return listed == set(vector_store.index_to_docstore_id.values())
+
+def _load_and_split(doc_path: str, digest: Optional[str] = None) -> Tuple[str, str, List, int]:
+    """Worker: load and split one PDF -> (path, sha256, chunks, page count); hashes it unless `digest` is given."""
+    file_name = os.path.basename(doc_path)
+    digest = digest or file_digest(doc_path)
+    try:
+        # Use the PyPDFLoader for a single file (more direct and less prone to errors)
+        docs = PyPDFLoader(doc_path).load()
+    except Exception as e:
+        # Catch exceptions from failed PDF parsing (e.g., HTML files, corrupted data)
+        print(f"❌ ERROR: Failed to load {file_name}. Skipping this file. Error details: {e}")
+        return doc_path, digest, [], 0
+    if not docs:
+        print(f"⚠️ Skipped {file_name}: File was found but yielded no content (likely empty or protected).")
+        return doc_path, digest, [], 0
+    print(f"✅ Successfully loaded: {file_name}")
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return doc_path, digest, text_splitter.split_documents(docs), len(docs)
+
+def _load_files(pdf_paths: List[str], workers: int,
+                digests: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, str, List, int]]:
+    """Yield per-file results in input order while the pool keeps extracting ahead.
+
+    `digests` ({path: sha256}) are hashes the caller already computed; those files are not read twice.
+    """
+    known = [(digests or {}).get(path) for path in pdf_paths]
+    if workers <= 1 or len(pdf_paths) <= 1:
+        for path, digest in zip(pdf_paths, known):
+            yield _load_and_split(path, digest)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths))) as pool:
+        yield from pool.map(_load_and_split, pdf_paths, known)
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.time()
+        self.files = 0
+        self.pages = 0
+        self.chunks = 0
+        self.embed_seconds = 0.0
+
+    def report(self) -> str:
+        elapsed = max(time.time() - self.started, 1e-9)
+        return (f"📊 {self.files} files, {self.pages} pages, {self.chunks} chunks in {elapsed:.1f}s "
+                f"({self.pages / elapsed:.1f} pages/s, {self.chunks / elapsed:.1f} chunks/s; "
+                f"embedding {self.embed_seconds:.1f}s)")
+
+def _embed_batch(vector_store: Optional[FAISS], embeddings, chunks: List, ids: List[str]) -> FAISS:
+    """Encode one large batch and append it to the store (creating the store on the first batch)."""
+    texts = [c.page_content for c in chunks]
+    vectors = embeddings.embed_documents(texts)
+    pairs = list(zip(texts, vectors))
+    metadatas = [c.metadata for c in chunks]
+    if vector_store is None:
+        return FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas, ids=ids)
+    vector_store.add_embeddings(pairs, metadatas=metadatas, ids=ids)
+    return vector_store
+
+def ingest_files(pdf_paths: List[str], data_path: str, vector_store: Optional[FAISS], embeddings,
+                 manifest: Dict[str, Dict], workers: int = INGEST_WORKERS,
+                 batch_size: int = INGEST_EMBED_BATCH,
+                 digests: Optional[Dict[str, str]] = None) -> Tuple[Optional[FAISS], IngestStats]:
+    """Extract `pdf_paths` across a process pool and stream their chunks into `batch_size` encode batches.
+
+    Records each file in `manifest` (unreadable ones with no ids); returns the (possibly new) store and throughput stats.
+    """
+    stats = IngestStats()
+    pending_chunks: List = []
+    pending_ids: List[str] = []
+    for doc_path, digest, file_chunks, pages in _load_files(pdf_paths, workers, digests):
+        rel = os.path.relpath(doc_path, data_path)
+        if not file_chunks:
+            # Remembered with its hash so later runs skip it until the file changes
+            manifest[rel] = {"sha256": digest, "ids": [], "skipped": True}
+            continue
+        file_ids = chunk_ids(rel, digest, len(file_chunks))
+        manifest[rel] = {"sha256": digest, "ids": file_ids}
+        stats.files += 1
+        stats.pages += pages
+        stats.chunks += len(file_chunks)
+        pending_chunks.extend(file_chunks)
+        pending_ids.extend(file_ids)
+        while len(pending_chunks) >= batch_size:
+            started = time.time()
+            vector_store = _embed_batch(vector_store, embeddings, pending_chunks[:batch_size], pending_ids[:batch_size])
+            stats.embed_seconds += time.time() - started
+            del pending_chunks[:batch_size], pending_ids[:batch_size]
+    if pending_chunks:
+        started = time.time()
+        vector_store = _embed_batch(vector_store, embeddings, pending_chunks, pending_ids)
+        stats.embed_seconds += time.time() - started
+    return vector_store, stats
+
+def _embeddings():
+    # One encode call per INGEST_EMBED_BATCH chunks instead of the 32-item default
+    return SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME, encode_kwargs={"batch_size": INGEST_EMBED_BATCH})
+
+def shard_of(rel_path: str) -> Optional[str]:
+    """Service shard of a PDF: its top-level directory under DATA_PATH (e.g. 'passport')."""
+    parts = rel_path.replace("\\", "/").split("/")
+    return parts[0].lower() if len(parts) > 1 else None
+
+def build_shards(vector_store: FAISS, manifest: Dict[str, Dict], out_dir: str, generation: int) -> List[str]:
+    """Write one flat shard per service from the global store's vectors; nothing is re-embedded."""
+    import faiss
+    from core.faiss_ann import build_ann_index, flat_vectors
+    from core.faiss_store import CompactDocstore, DOCSTORE_FILE, SHARDS_DIR
+    vectors = flat_vectors(vector_store.index)
+    position = {doc_id: pos for pos, doc_id in vector_store.index_to_docstore_id.items()}
+    groups: Dict[str, List[str]] = {}
+    for rel, entry in manifest.items():
+        shard = shard_of(rel)
+        if shard:
+            groups.setdefault(shard, []).extend(i for i in entry["ids"] if i in position)
+    for shard, ids in groups.items():
+        if not ids:
+            continue
+        shard_dir = os.path.join(out_dir, SHARDS_DIR, shard)
+        os.makedirs(shard_dir, exist_ok=True)
+        index = build_ann_index(vectors[[position[i] for i in ids]], "flat")
+        faiss.write_index(index, os.path.join(shard_dir, "index.faiss"))
+        CompactDocstore.build(
+            os.path.join(shard_dir, DOCSTORE_FILE),
+            {i: vector_store.docstore.search(i) for i in ids},
+            dict(enumerate(ids)),
+            generation,
+        )
+        with open(os.path.join(shard_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"generation": generation}, f)
+    return sorted(shard for shard, ids in groups.items() if ids)
+
+def save_atomically(vector_store: FAISS, db_path: str, manifest: Dict[str, Dict]) -> None:
+    """Write index, docstore and manifest to a staging directory, then move each file into place.
+
+    Readers never see a half-written file. Docstores and manifests carry the same
+    build generation; the docstore is swapped before the index and manifest.json
+    last, so a reader that opens the files mid-swap sees mismatched generations
+    and keeps its previous index, and an interrupted save leaves the old manifest
+    that `update_vector_store` then finds does not match index.pkl.
+    """
+    import faiss
+    from core.faiss_ann import ANN_INDEX_FILE, build_from_env, flat_vectors
+    from core.faiss_store import DOCSTORE_FILE, SHARDS_DIR, compact_docstore
+    generation = time.time_ns()
+    staging = f"{db_path.rstrip(os.sep)}.staging-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    try:
+        vector_store.save_local(staging)
+        compact_docstore(staging, generation)
+        shards = build_shards(vector_store, manifest, staging, generation)
+        # Trained IVF/PQ copy for serving (FAISS_INDEX_TYPE); the flat index stays the source of truth
+        ann_index = build_from_env(flat_vectors(vector_store.index))
+        if ann_index is not None:
+            faiss.write_index(ann_index, os.path.join(staging, ANN_INDEX_FILE))
+        with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump({"embedding_model": EMBEDDING_MODEL_NAME, "generation": generation, "files": manifest}, f, indent=2)
+
+        def swap(src_dir: str, dst_dir: str, names: List[str]) -> None:
+            os.makedirs(dst_dir, exist_ok=True)
+            for name in names:
+                os.replace(os.path.join(src_dir, name), os.path.join(dst_dir, name))
+
+        swap(staging, db_path, ["index.pkl", DOCSTORE_FILE])
+        if ann_index is not None:
+            swap(staging, db_path, [ANN_INDEX_FILE])
+        elif os.path.exists(os.path.join(db_path, ANN_INDEX_FILE)):
+            # Switched back to flat: a stale compressed copy must not be served
+            os.remove(os.path.join(db_path, ANN_INDEX_FILE))
+        swap(staging, db_path, ["index.faiss", MANIFEST_FILE])
+        shards_root = os.path.join(db_path, SHARDS_DIR)
+        for shard in shards:
+            swap(os.path.join(staging, SHARDS_DIR, shard), os.path.join(shards_root, shard),
+                 [DOCSTORE_FILE, "index.faiss", MANIFEST_FILE])
+        if os.path.isdir(shards_root):
+            for stale in set(os.listdir(shards_root)) - set(shards):
+                # Service directory no longer has any PDFs
+                shutil.rmtree(os.path.join(shards_root, stale), ignore_errors=True)
+    finally:
+        # Also on failure: a half-built staging copy is never reused
+        shutil.rmtree(staging, ignore_errors=True)
+
+def check_index_config() -> None:
+    """Reject a bad FAISS_INDEX_TYPE before any PDF is embedded."""
+    from core.faiss_ann import index_type_from_env
+    try:
+        index_type_from_env()
+    except ValueError as e:
+        raise RuntimeError(str(e))
 
 def create_vector_store(data_path: str, db_path: str):
     """
@@ -16,69 +262,80 @@ def create_vector_store(data_path: str, db_path: str):
     Includes robust error handling to skip corrupted or non-PDF files.
     """
     print("Starting document loading and indexing...")
-    
-    # 1. Use glob to find all PDF paths recursively
-    # This correctly finds all .pdf files in the data_path and its subdirectories
-    search_path = os.path.join(data_path, "**", "*.pdf")
-    try:
-        pdf_paths = glob.glob(search_path, recursive=True)
-    except Exception as e:
-        raise RuntimeError(f"FATAL ERROR during path search: {e}")
+    check_index_config()
+
+    # 1. Find all PDF paths recursively
+    pdf_paths = find_pdfs(data_path)
 
     if not pdf_paths:
         raise RuntimeError(f"FATAL ERROR: No PDF documents found in '{data_path}'. Index creation failed.")
 
-    documents = []
-    print(f"Found {len(pdf_paths)} potential PDF files. Attempting to load individually...")
-    
-    # 2. Iterate through files and load individually (with error handling)
-    for doc_path in pdf_paths:
-        file_name = os.path.basename(doc_path)
-        
-        try:
-            # Use the PyPDFLoader for a single file (more direct and less prone to errors)
-            loader = PyPDFLoader(doc_path)
-            docs = loader.load()
-            
-            if docs:
-                documents.extend(docs)
-                print(f"✅ Successfully loaded: {file_name}")
-            else:
-                print(f"⚠️ Skipped {file_name}: File was found but yielded no content (likely empty or protected).")
-                
-        except Exception as e:
-            # Catch exceptions from failed PDF parsing (e.g., HTML files, corrupted data)
-            print(f"❌ ERROR: Failed to load {file_name}. Skipping this file. Error details: {e}")
-
-
-    # 3. Final check before proceeding
-    if not documents:
+    print(f"Found {len(pdf_paths)} potential PDF files. Loading across {INGEST_WORKERS} processes...")
+
+    # 2. Load and split in parallel (with per-file error handling), embedding in large batches as chunks arrive
+    manifest: Dict[str, Dict] = {}
+    vector_store, stats = ingest_files(pdf_paths, data_path, None, _embeddings(), manifest)
+
+    # 3. Final check before saving
+    if vector_store is None:
         raise RuntimeError(f"FATAL ERROR: No valid documents could be loaded from {data_path}. Index creation failed.")
 
-    print(f"\nTotal valid documents loaded: {len(documents)}")
-    
-    # 4. Splitting and Embedding
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = text_splitter.split_documents(documents)
-    print(f"Split documents into {len(chunks)} chunks.")
-
-    # Create Embeddings
-    embeddings = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
-    
-    # Create the FAISS index and save it locally
-    vector_store = FAISS.from_documents(chunks, embeddings)
-    vector_store.save_local(db_path)
+    print(stats.report())
+    save_atomically(vector_store, db_path, manifest)
     print(f"FAISS index created and saved successfully at {db_path}.")
 
+def update_vector_store(data_path: str, db_path: str):
+    """
+    Incremental ingest: embeds only new or changed PDFs and removes vectors of
+    deleted ones, using the per-file content hashes recorded in manifest.json.
+    """
+    check_index_config()
+    manifest = load_manifest(db_path)
+    if not manifest:
+        # Index built before manifests existed: its vector ids are unknown
+        print(f"No manifest in '{db_path}'; building the index from scratch.")
+        return create_vector_store(data_path, db_path)
+
+    pdf_paths = {os.path.relpath(p, data_path): p for p in find_pdfs(data_path)}
+    current = {rel: file_digest(p) for rel, p in pdf_paths.items()}
+    added, changed, removed = plan_changes(manifest, current)
+    print(f"Incremental ingest: {len(added)} new, {len(changed)} changed, {len(removed)} removed, "
+          f"{len(current) - len(added) - len(changed)} unchanged.")
+    if not (added or changed or removed):
+        print("Index is up to date.")
+        return
+
+    embeddings = _embeddings()
+    vector_store = FAISS.load_local(db_path, embeddings, allow_dangerous_deserialization=True)
+    if not manifest_matches(manifest, vector_store):
+        # A save interrupted between swaps left index.pkl and manifest.json from different builds
+        print(f"⚠️ manifest.json in '{db_path}' does not match the stored index; rebuilding from scratch.")
+        return create_vector_store(data_path, db_path)
+
+    stale_ids = [i for rel in changed + removed for i in manifest[rel]["ids"]]
+    if stale_ids:
+        vector_store.delete(stale_ids)
+    for rel in changed + removed:
+        manifest.pop(rel)
+
+    # Hashes from the change plan go to the workers so no file is read twice
+    todo = added + changed
+    vector_store, stats = ingest_files([pdf_paths[rel] for rel in todo], data_path, vector_store, embeddings, manifest,
+                                       digests={pdf_paths[rel]: current[rel] for rel in todo})
+    print(stats.report())
+
+    save_atomically(vector_store, db_path, manifest)
+    print(f"FAISS index updated at {db_path} ({vector_store.index.ntotal} vectors).")
+
 if __name__ == "__main__":
     # --- EXECUTION ---
     print(f"--- RAG INGESTION SCRIPT STARTING ---")
-    
-    # Check for existing index to prevent re-creation
-    if os.path.exists(VECTOR_DB_PATH):
-        print(f"Index found at '{VECTOR_DB_PATH}'. Delete the folder to rebuild the database.")
-    else:
-        try:
+
+    try:
+        if "--rebuild" in sys.argv or not os.path.exists(VECTOR_DB_PATH):
             create_vector_store(DATA_PATH, VECTOR_DB_PATH)
-        except RuntimeError as e:
-            print(f"FATAL ERROR: {e}")
\ No newline at end of file
+        else:
+            # Existing index: add/remove only what changed under DATA_PATH
+            update_vector_store(DATA_PATH, VECTOR_DB_PATH)
+    except RuntimeError as e:
+        print(f"FATAL ERROR: {e}")
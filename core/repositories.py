@@ -2,11 +2,31 @@
 Streamlined Repository Pattern - Essential operations only
 """
 from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, desc, text
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import and_, or_, func, desc, text, select, literal, union_all
 from pgvector.sqlalchemy import Vector
 from .models import Service, Procedure, Document, FAQ, ContentChunk, RawContent
 
+# Column projections for listing endpoints: skip raw_content and embedding columns
+SERVICE_LIST_COLUMNS = (
+    Service.service_id, Service.name, Service.category, Service.description,
+    Service.ministry, Service.is_active, Service.languages_supported,
+)
+DOCUMENT_LIST_COLUMNS = (
+    Document.doc_id, Document.service_id, Document.name, Document.description, Document.document_type,
+    Document.is_mandatory, Document.copies_required, Document.validity_period, Document.is_processed,
+)
+FAQ_LIST_COLUMNS = (
+    FAQ.faq_id, FAQ.service_id, FAQ.question, FAQ.answer, FAQ.short_answer, FAQ.category,
+)
+
+def _project(query, columns):
+    return query.options(load_only(*columns)) if columns else query
+
+def _ts_query(query: str):
+    """English (stemmed) OR simple tsquery, matching both configs used by the stored search_tsv columns."""
+    return func.plainto_tsquery('english', query).op('||')(func.plainto_tsquery('simple', query))
+
 class BaseRepository:
     def __init__(self, db: Session, model_class):
         self.db = db
@@ -22,8 +42,8 @@ class BaseRepository:
     def get_by_id(self, id: int):
         return self.db.query(self.model_class).filter(self.model_class.id == id).first()
     
-    def get_all(self, skip: int = 0, limit: int = 100):
-        return self.db.query(self.model_class).offset(skip).limit(limit).all()
+    def get_all(self, skip: int = 0, limit: int = 100, columns=None):
+        return _project(self.db.query(self.model_class), columns).offset(skip).limit(limit).all()
     
     def count(self):
         return self.db.query(self.model_class).count()
@@ -32,11 +52,11 @@ class ServiceRepository(BaseRepository):
     def __init__(self, db: Session):
         super().__init__(db, Service)
     
-    def get_by_category(self, category: str) -> List[Service]:
-        return self.db.query(Service).filter(Service.category == category).all()
+    def get_by_category(self, category: str, columns=None) -> List[Service]:
+        return _project(self.db.query(Service), columns).filter(Service.category == category).all()
     
-    def get_active_services(self) -> List[Service]:
-        return self.db.query(Service).filter(Service.is_active == True).all()
+    def get_active_services(self, columns=None) -> List[Service]:
+        return _project(self.db.query(Service), columns).filter(Service.is_active == True).all()
     
     def search_services(self, query: str) -> List[Service]:
         search_term = f"%{query}%"
@@ -54,37 +74,42 @@ class DocumentRepository(BaseRepository):
     def __init__(self, db: Session):
         super().__init__(db, Document)
     
-    def get_by_service(self, service_id: int) -> List[Document]:
-        return self.db.query(Document).filter(Document.service_id == service_id).all()
+    def get_by_service(self, service_id: int, columns=None) -> List[Document]:
+        return _project(self.db.query(Document), columns).filter(Document.service_id == service_id).all()
     
-    def get_mandatory_documents(self, service_id: int) -> List[Document]:
-        return self.db.query(Document).filter(
+    def get_mandatory_documents(self, service_id: int, columns=None) -> List[Document]:
+        return _project(self.db.query(Document), columns).filter(
             and_(
                 Document.service_id == service_id,
                 Document.is_mandatory == True
             )
         ).all()
     
-    def search_semantic(self, query_embedding: List[float], limit: int = 10) -> List[Document]:
-        return self.db.query(Document).filter(
-            Document.embedding.isnot(None)
-        ).order_by(
+    def search_semantic(self, query_embedding: List[float], limit: int = 10, service_id: Optional[int] = None,
+                        language: Optional[str] = None) -> List[Document]:
+        q = self.db.query(Document).filter(Document.embedding.isnot(None))
+        if service_id:
+            q = q.filter(Document.service_id == service_id)
+        if language:
+            q = q.filter(Document.language == language)
+        return q.order_by(
             Document.embedding.cosine_distance(query_embedding)
         ).limit(limit).all()
 
     def search_text(self, query: str, limit: int = 10) -> List[Document]:
-        """Prefer Postgres full-text search; fallback to ILIKE."""
+        """Prefer Postgres full-text search over the stored search_tsv column; fallback to ILIKE."""
         try:
-            # Use tsvector search for better performance where available
-            ts_query = func.plainto_tsquery('english', query)
-            vector = func.to_tsvector('english', func.coalesce(Document.name, '') + ' ' + func.coalesce(Document.description, '') + ' ' + func.coalesce(Document.raw_content, ''))
-            return (
-                self.db.query(Document)
-                .filter(vector.op('@@')(ts_query))
-                .order_by(desc(func.ts_rank_cd(vector, ts_query)))
-                .limit(limit)
-                .all()
-            )
+            # GIN-indexed stored column: no per-row to_tsvector at query time
+            ts_query = _ts_query(query)
+            # Savepoint so a missing column (migration not applied) does not abort the session
+            with self.db.begin_nested():
+                return (
+                    self.db.query(Document)
+                    .filter(Document.search_tsv.op('@@')(ts_query))
+                    .order_by(desc(func.ts_rank_cd(Document.search_tsv, ts_query)))
+                    .limit(limit)
+                    .all()
+                )
         except Exception:
             term = f"%{query}%"
             return self.db.query(Document).filter(
@@ -99,13 +124,19 @@ class FAQRepository(BaseRepository):
     def __init__(self, db: Session):
         super().__init__(db, FAQ)
     
-    def get_by_service(self, service_id: int) -> List[FAQ]:
-        return self.db.query(FAQ).filter(FAQ.service_id == service_id).all()
+    def get_by_service(self, service_id: int, columns=None) -> List[FAQ]:
+        return _project(self.db.query(FAQ), columns).filter(FAQ.service_id == service_id).all()
     
-    def search_semantic(self, query_embedding: List[float], limit: int = 10) -> List[FAQ]:
-        return self.db.query(FAQ).filter(
-            FAQ.question_embedding.isnot(None)
-        ).order_by(
+    def search_semantic(self, query_embedding: List[float], limit: int = 10, service_id: Optional[int] = None,
+                        language: Optional[str] = None, category: Optional[str] = None) -> List[FAQ]:
+        q = self.db.query(FAQ).filter(FAQ.question_embedding.isnot(None))
+        if service_id:
+            q = q.filter(FAQ.service_id == service_id)
+        if language:
+            q = q.filter(FAQ.language == language)
+        if category:
+            q = q.filter(FAQ.category == category)
+        return q.order_by(
             FAQ.question_embedding.cosine_distance(query_embedding)
         ).limit(limit).all()
 
@@ -113,10 +144,14 @@ class ContentChunkRepository(BaseRepository):
     def __init__(self, db: Session):
         super().__init__(db, ContentChunk)
     
-    def search_semantic(self, query_embedding: List[float], limit: int = 10) -> List[ContentChunk]:
-        return self.db.query(ContentChunk).filter(
-            ContentChunk.embedding.isnot(None)
-        ).order_by(
+    def search_semantic(self, query_embedding: List[float], limit: int = 10, service_id: Optional[int] = None,
+                        category: Optional[str] = None) -> List[ContentChunk]:
+        q = self.db.query(ContentChunk).filter(ContentChunk.embedding.isnot(None))
+        if service_id:
+            q = q.filter(ContentChunk.service_id == service_id)
+        if category:
+            q = q.filter(ContentChunk.category == category)
+        return q.order_by(
             ContentChunk.embedding.cosine_distance(query_embedding)
         ).limit(limit).all()
 
@@ -131,3 +166,129 @@ class RawContentRepository(BaseRepository):
             .limit(limit)
             .all()
         )
+
+
+class VectorSearchRepository:
+    """Cross-table semantic search returning candidates from a single SQL round trip."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def search_semantic_all(self, query_embedding: List[float], limit: int = 10, service_id: Optional[int] = None,
+                            language: Optional[str] = None, category: Optional[str] = None,
+                            snippet_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+        """UNION ALL of the per-table top-`limit` candidates, ordered by pgvector cosine distance.
+
+        Each row carries the distance computed by the database so callers do not
+        need to pull the stored embeddings back into Python for rescoring. Filters
+        are applied inside each branch, before the top-`limit` cut, so they can use
+        the per-service partial vector indexes. A table that lacks a filtered
+        column (chunks have no language, documents no category) is left out when
+        that filter is set. `snippet_chars` truncates content in the database so
+        multi-KB documents are not shipped whole to the API.
+        """
+        def _snippet(expr):
+            return func.left(expr, snippet_chars) if snippet_chars else expr
+
+        doc_distance = Document.embedding.cosine_distance(query_embedding)
+        docs = (
+            select(
+                literal('document').label('type'),
+                _snippet(func.coalesce(func.nullif(Document.raw_content, ''), Document.name)).label('content'),
+                Document.service_id.label('service_id'),
+                doc_distance.label('distance'),
+            )
+            .where(Document.embedding.isnot(None))
+        )
+        if service_id:
+            docs = docs.where(Document.service_id == service_id)
+        if language:
+            docs = docs.where(Document.language == language)
+        docs = docs.order_by(doc_distance).limit(limit).subquery()
+
+        faq_distance = FAQ.question_embedding.cosine_distance(query_embedding)
+        faqs = (
+            select(
+                literal('faq').label('type'),
+                _snippet(literal('Q: ') + FAQ.question + literal('\nA: ') + FAQ.answer).label('content'),
+                FAQ.service_id.label('service_id'),
+                faq_distance.label('distance'),
+            )
+            .where(FAQ.question_embedding.isnot(None))
+        )
+        if service_id:
+            faqs = faqs.where(FAQ.service_id == service_id)
+        if language:
+            faqs = faqs.where(FAQ.language == language)
+        if category:
+            faqs = faqs.where(FAQ.category == category)
+        faqs = faqs.order_by(faq_distance).limit(limit).subquery()
+
+        chunk_distance = ContentChunk.embedding.cosine_distance(query_embedding)
+        chunks = (
+            select(
+                literal('content_chunk').label('type'),
+                _snippet(ContentChunk.content_text).label('content'),
+                ContentChunk.service_id.label('service_id'),
+                chunk_distance.label('distance'),
+            )
+            .where(ContentChunk.embedding.isnot(None))
+        )
+        if service_id:
+            chunks = chunks.where(ContentChunk.service_id == service_id)
+        if category:
+            chunks = chunks.where(ContentChunk.category == category)
+        chunks = chunks.order_by(chunk_distance).limit(limit).subquery()
+
+        branches = [select(faqs)]
+        if not category:
+            branches.insert(0, select(docs))
+        if not language:
+            branches.append(select(chunks))
+        combined = union_all(*branches).subquery()
+        stmt = select(combined).order_by(combined.c.distance)
+        return [dict(row) for row in self.db.execute(stmt).mappings().all()]
+
+
+class TextSearchRepository:
+    """Cross-table full-text search over the stored, GIN-indexed search_tsv columns."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def search_text_all(self, query: str, limit: int = 10, service_id: Optional[int] = None,
+                        snippet_chars: Optional[int] = None) -> List[Dict[str, Any]]:
+        """UNION ALL of the per-table top-`limit` matches, ordered by `ts_rank_cd`.
+
+        The query is matched as both an English (stemmed) and a `simple` tsquery,
+        so English content and Hindi/Devanagari content are found by the same call.
+        """
+        ts_query = _ts_query(query)
+
+        def _snippet(expr):
+            return func.left(expr, snippet_chars) if snippet_chars else expr
+
+        def _branch(kind, content, tsv, service_col):
+            rank = func.ts_rank_cd(tsv, ts_query)
+            stmt = (
+                select(
+                    literal(kind).label('type'),
+                    _snippet(content).label('content'),
+                    service_col.label('service_id'),
+                    rank.label('rank'),
+                )
+                .where(tsv.op('@@')(ts_query))
+            )
+            if service_id:
+                stmt = stmt.where(service_col == service_id)
+            return select(stmt.order_by(desc(rank)).limit(limit).subquery())
+
+        combined = union_all(
+            _branch('document', func.coalesce(func.nullif(Document.raw_content, ''), Document.name),
+                    Document.search_tsv, Document.service_id),
+            _branch('faq', literal('Q: ') + FAQ.question + literal('\nA: ') + FAQ.answer,
+                    FAQ.search_tsv, FAQ.service_id),
+            _branch('content_chunk', ContentChunk.content_text, ContentChunk.search_tsv, ContentChunk.service_id),
+        ).subquery()
+        stmt = select(combined).order_by(desc(combined.c.rank)).limit(limit)
+        return [dict(row) for row in self.db.execute(stmt).mappings().all()]
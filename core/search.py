@@ -5,66 +5,70 @@ import numpy as np
 from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 import os
-from .repositories import ServiceRepository, DocumentRepository, FAQRepository, ContentChunkRepository
+from .model_registry import get_embedding_model
+from .embedding_batcher import get_batcher, batching_enabled
+from .embedding_cache import get_query_cache, query_cache_enabled
+from .vector_index import get_vector_index
+from .search_cache import get_result_cache, result_cache_enabled
+from .repositories import ServiceRepository, DocumentRepository, FAQRepository, ContentChunkRepository, VectorSearchRepository
 
 class SearchEngine:
     def __init__(self, db: Session):
         self.db = db
         self.model_name = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
         self.embeddings_enabled = os.getenv('EMBEDDING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        # 'union' fetches all content types in one SQL round trip; 'per_table' is the legacy path
+        self.retrieval_mode = os.getenv('SEARCH_RETRIEVAL_MODE', 'union').lower()
+        # 'numpy' scores against the in-process index; falls back to pgvector until it is built
+        self.index_backend = os.getenv('SEARCH_INDEX_BACKEND', 'pgvector').lower()
+        # Content is cut to this many characters in SQL; 0 returns full text
+        self.snippet_chars = int(os.getenv('SEARCH_SNIPPET_CHARS', '1000'))
         self.embedding_model = None
         self.service_repo = ServiceRepository(db)
         self.document_repo = DocumentRepository(db)
         self.faq_repo = FAQRepository(db)
         self.chunk_repo = ContentChunkRepository(db)
+        self.vector_repo = VectorSearchRepository(db)
     
-    def search(self, query: str, service_id: Optional[int] = None, limit: int = 10) -> Dict[str, Any]:
-        """Perform hybrid search across all content types"""
+    def search(self, query: str, service_id: Optional[int] = None, limit: int = 10,
+               language: Optional[str] = None, category: Optional[str] = None) -> Dict[str, Any]:
+        """Perform hybrid search across all content types.
+
+        `service_id`, `language` and `category` are applied inside the vector
+        queries, so a scoped search returns the top matches within that scope.
+        Results are served from the versioned result cache until the corpus changes.
+        """
+        if not result_cache_enabled():
+            return self._search(query, service_id, limit, language, category)
+        cache = get_result_cache()
+        key = cache.make_key('search', query, limit, service_id=service_id, language=language, category=category)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        response = self._search(query, service_id, limit, language, category)
+        if 'error' not in response:
+            cache.put(key, response)
+        return response
+
+    def _search(self, query: str, service_id: Optional[int], limit: int,
+                language: Optional[str], category: Optional[str]) -> Dict[str, Any]:
         try:
             # Generate query embedding if enabled
             query_embedding = self._generate_embedding(query) if self.embeddings_enabled else []
             
-            # Search different content types
-            results = []
-            
-            # Search documents
-            docs = self.document_repo.search_semantic(query_embedding, limit) if self.embeddings_enabled else []
-            for doc in docs:
-                if not service_id or doc.service_id == service_id:
-                    results.append({
-                        'type': 'document',
-                        'content': doc.raw_content or doc.name,
-                        'similarity': self._calculate_similarity(query_embedding, doc.embedding),
-                        'service_id': doc.service_id,
-                        'source': 'document'
-                    })
-            
-            # Search FAQs
-            faqs = self.faq_repo.search_semantic(query_embedding, limit) if self.embeddings_enabled else []
-            for faq in faqs:
-                if not service_id or faq.service_id == service_id:
-                    results.append({
-                        'type': 'faq',
-                        'content': f"Q: {faq.question}\nA: {faq.answer}",
-                        'similarity': self._calculate_similarity(query_embedding, faq.question_embedding),
-                        'service_id': faq.service_id,
-                        'source': 'faq'
-                    })
-            
-            # Search content chunks
-            chunks = self.chunk_repo.search_semantic(query_embedding, limit) if self.embeddings_enabled else []
-            for chunk in chunks:
-                if not service_id or chunk.service_id == service_id:
-                    results.append({
-                        'type': 'content_chunk',
-                        'content': chunk.content_text,
-                        'similarity': self._calculate_similarity(query_embedding, chunk.embedding),
-                        'service_id': chunk.service_id,
-                        'source': 'content_chunk'
-                    })
+            # The in-memory index only carries service_id; other filters go to the database
+            if self.index_backend == 'numpy' and not (language or category) and get_vector_index().size:
+                results = self._search_in_memory(query_embedding, service_id, limit)
+            elif self.retrieval_mode == 'per_table':
+                results = self._search_per_table(query_embedding, service_id, limit, language, category)
+            else:
+                results = self._search_union(query_embedding, service_id, limit, language, category)
             
             # Sort by similarity
             results.sort(key=lambda x: x.get('similarity', 0), reverse=True)
+            # Same response shape whichever backend ran; the union path already cut content in SQL
+            for result in results:
+                result['content'] = self._snippet(result.get('content'))
             
             return {
                 'query': query,
@@ -80,28 +84,104 @@ class SearchEngine:
                 'error': str(e)
             }
 
+    def _search_in_memory(self, query_embedding: List[float], service_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """Score against the in-process NumPy index; no database round trip."""
+        if not self.embeddings_enabled or not query_embedding:
+            return []
+        return get_vector_index().search(query_embedding, limit, service_id=service_id)
+
+    def _search_union(self, query_embedding: List[float], service_id: Optional[int], limit: int,
+                      language: Optional[str] = None, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Fetch documents, FAQs and chunks in one statement; similarity comes from pgvector."""
+        if not self.embeddings_enabled or not query_embedding:
+            return []
+        rows = self.vector_repo.search_semantic_all(
+            query_embedding, limit, service_id=service_id, language=language, category=category,
+            snippet_chars=self.snippet_chars or None
+        )
+        return [{
+            'type': row['type'],
+            'content': row['content'],
+            'similarity': 1.0 - float(row['distance']),
+            'service_id': row['service_id'],
+            'source': row['type']
+        } for row in rows]
+
+    def _search_per_table(self, query_embedding: List[float], service_id: Optional[int], limit: int,
+                          language: Optional[str] = None, category: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Legacy path: one query per table and cosine similarity recomputed in Python."""
+        results = []
+        if not self.embeddings_enabled:
+            return results
+        
+        # Search documents
+        docs = self.document_repo.search_semantic(query_embedding, limit, service_id=service_id, language=language) if not category else []
+        for doc in docs:
+            results.append({
+                'type': 'document',
+                'content': doc.raw_content or doc.name,
+                'similarity': self._calculate_similarity(query_embedding, doc.embedding),
+                'service_id': doc.service_id,
+                'source': 'document'
+            })
+        
+        # Search FAQs
+        faqs = self.faq_repo.search_semantic(query_embedding, limit, service_id=service_id, language=language, category=category)
+        for faq in faqs:
+            results.append({
+                'type': 'faq',
+                'content': f"Q: {faq.question}\nA: {faq.answer}",
+                'similarity': self._calculate_similarity(query_embedding, faq.question_embedding),
+                'service_id': faq.service_id,
+                'source': 'faq'
+            })
+        
+        # Search content chunks
+        chunks = self.chunk_repo.search_semantic(query_embedding, limit, service_id=service_id, category=category) if not language else []
+        for chunk in chunks:
+            results.append({
+                'type': 'content_chunk',
+                'content': chunk.content_text,
+                'similarity': self._calculate_similarity(query_embedding, chunk.embedding),
+                'service_id': chunk.service_id,
+                'source': 'content_chunk'
+            })
+        
+        return results
+
+    def _snippet(self, content: Optional[str]) -> Optional[str]:
+        return content[:self.snippet_chars] if content and self.snippet_chars else content
+
     def get_model_name(self) -> str:
         """Return the currently configured embedding model name."""
         return self.model_name
     
     def _ensure_model(self):
         if self.embedding_model is None and self.embeddings_enabled:
-            try:
-                from sentence_transformers import SentenceTransformer
-                self.embedding_model = SentenceTransformer(self.model_name)
-            except Exception:
-                self.embedding_model = None
+            # Shared per-process instance; SearchEngine is built per request
+            self.embedding_model = get_embedding_model(self.model_name)
 
     def _generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for text if enabled; otherwise return empty list."""
         try:
-            self._ensure_model()
-            if self.embedding_model is None:
-                return []
-            embedding = self.embedding_model.encode(text)
-            return embedding.tolist()
+            if query_cache_enabled():
+                # Repeated queries skip the forward pass entirely
+                return get_query_cache().get_or_compute(text, self.model_name, self._encode).tolist()
+            return self._encode(text).tolist()
         except Exception:
             return []
+
+    def _encode(self, text: str):
+        if batching_enabled():
+            # Concurrent requests share one batched forward pass
+            batcher = get_batcher(self.model_name)
+            if batcher is None:
+                raise RuntimeError(f"Embedding model '{self.model_name}' is not available")
+            return batcher.encode(text)
+        self._ensure_model()
+        if self.embedding_model is None:
+            raise RuntimeError(f"Embedding model '{self.model_name}' is not available")
+        return self.embedding_model.encode(text)
     
     def _calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """Calculate cosine similarity between embeddings"""
@@ -0,0 +1,132 @@
+"""
+Versioned result cache for SearchEngine.search and hybrid_search.
+
+Entries are keyed by (kind, normalized query, filters, limit, corpus generation).
+Writers call `bump_corpus_generation()` after committing content; the bump is
+visible at once in the same process and, through the `corpus_generation` table,
+to other workers within SEARCH_CACHE_GENERATION_TTL seconds. Once the generation
+moves, every older entry is unreachable and the cache is cleared.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import text
+
+from .embedding_cache import normalize_query
+
+_GEN_LOCK = threading.Lock()
+_local_generation = 0
+_shared_generation: Tuple[int, float] = (0, 0.0)  # (value, fetched_at)
+
+
+def _engine():
+    from .database import engine
+    return engine
+
+def bump_corpus_generation() -> int:
+    """Mark the searchable corpus as changed. Call after the write is committed."""
+    global _local_generation
+    with _GEN_LOCK:
+        _local_generation += 1
+    try:
+        with _engine().begin() as conn:
+            conn.execute(text(
+                "INSERT INTO corpus_generation (id, generation) VALUES (1, 1) "
+                "ON CONFLICT (id) DO UPDATE SET generation = corpus_generation.generation + 1, updated_at = now()"
+            ))
+    except Exception:
+        # Table missing or DB unavailable: in-process invalidation still applies
+        pass
+    return _local_generation
+
+def current_generation() -> Tuple[int, int]:
+    """(in-process counter, shared counter); the shared one is re-read at most once per TTL."""
+    global _shared_generation
+    ttl = float(os.getenv('SEARCH_CACHE_GENERATION_TTL', '1'))
+    value, fetched_at = _shared_generation
+    if time.monotonic() - fetched_at >= ttl:
+        try:
+            with _engine().connect() as conn:
+                row = conn.execute(text("SELECT generation FROM corpus_generation WHERE id = 1")).fetchone()
+            value = int(row[0]) if row else 0
+        except Exception:
+            pass
+        _shared_generation = (value, time.monotonic())
+    return (_local_generation, value)
+
+
+class SearchResultCache:
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(int(max_entries), 1)
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._generation: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def make_key(self, kind: str, query: str, limit: int, **filters: Any) -> Hashable:
+        return (kind, normalize_query(query), limit, tuple(sorted(filters.items())), current_generation())
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            generation = key[-1]
+            if generation != self._generation:
+                # Corpus changed: nothing cached under the old generation can be served again
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Dict[str, Any]) -> None:
+        with self._lock:
+            if key[-1] != self._generation:
+                return
+            self._entries[key] = copy.deepcopy(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "generation": list(self._generation) if self._generation else None,
+            }
+
+
+_RESULT_CACHE: Optional[SearchResultCache] = None
+_RESULT_CACHE_LOCK = threading.Lock()
+
+
+def result_cache_enabled() -> bool:
+    return os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+def get_result_cache() -> SearchResultCache:
+    global _RESULT_CACHE
+    if _RESULT_CACHE is None:
+        with _RESULT_CACHE_LOCK:
+            if _RESULT_CACHE is None:
+                _RESULT_CACHE = SearchResultCache(int(os.getenv('SEARCH_CACHE_SIZE', '1024')))
+    return _RESULT_CACHE
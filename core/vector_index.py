@@ -0,0 +1,319 @@
+"""
+In-process NumPy vector index for SearchEngine.
+
+All document, FAQ and content-chunk embeddings live in one contiguous float32
+matrix (L2-normalized, saved as `vectors.npy` and opened memory-mapped) with a
+parallel id map in `entries.json`. A query is scored with a single matrix-vector
+product plus `argpartition`, so search does not touch Postgres on the hot path.
+`refresh()` syncs the index with the database incrementally: each row's md5 of
+its embedding and content is compared in SQL, so only rows that are new or
+changed (re-embedded, edited) are fetched, and rows that disappeared are dropped.
+
+Each save writes a new snapshot directory and then swaps the `CURRENT` pointer
+with `os.replace`, so readers always open a matching vectors/entries pair. In a
+multi-worker server one worker (holding an flock on `.writer.lock`) refreshes
+from the database; the others re-open the snapshot it publishes.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Text, cast, func
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker refreshes and publishes its own snapshot
+    fcntl = None
+
+from .models import Document, FAQ, ContentChunk
+
+# (type, model, primary key, embedding column)
+_SOURCES = [
+    ('document', Document, Document.doc_id, Document.embedding),
+    ('faq', FAQ, FAQ.faq_id, FAQ.question_embedding),
+    ('content_chunk', ContentChunk, ContentChunk.chunk_id, ContentChunk.embedding),
+]
+
+
+def _row_content(kind: str, row: Any) -> str:
+    if kind == 'document':
+        return row.raw_content or row.name
+    if kind == 'faq':
+        return f"Q: {row.question}\nA: {row.answer}"
+    return row.content_text
+
+def _content_columns(kind: str) -> List[Any]:
+    if kind == 'document':
+        return [Document.raw_content, Document.name]
+    if kind == 'faq':
+        return [FAQ.question, FAQ.answer]
+    return [ContentChunk.content_text]
+
+def _row_digest(kind: str, emb_col: Any):
+    """md5 of a row's embedding and content, computed in the database."""
+    return func.md5(func.concat(cast(emb_col, Text), *_content_columns(kind)))
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class NumpyVectorIndex:
+    def __init__(self, index_dir: str, snippet_chars: int = 0):
+        self.index_dir = Path(index_dir)
+        # Stored content is cut to this many characters, like the SQL search paths; 0 keeps full text
+        self.snippet_chars = int(snippet_chars)
+        # Swapped as one tuple so readers never see a matrix and id map out of step
+        self._state: Tuple[np.ndarray, List[Dict[str, Any]]] = (np.zeros((0, 0), dtype=np.float32), [])
+        self._refresh_lock = threading.Lock()
+        self.snapshot: Optional[str] = None
+        self.last_refresh: Optional[float] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._state[1])
+
+    def _current_snapshot(self) -> Optional[str]:
+        try:
+            return (self.index_dir / 'CURRENT').read_text(encoding='utf-8').strip() or None
+        except OSError:
+            return None
+
+    def load(self) -> bool:
+        """Open the published snapshot; vectors are memory-mapped, not read into RAM."""
+        name = self._current_snapshot()
+        if name is None:
+            return False
+        try:
+            matrix = np.load(self.index_dir / name / 'vectors.npy', mmap_mode='r')
+            with open(self.index_dir / name / 'entries.json', 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            # A snapshot cut to a different snippet length is rebuilt by the next refresh
+            if saved.get('snippet_chars') != self.snippet_chars or len(saved['entries']) != matrix.shape[0]:
+                return False
+            self._state = (matrix, saved['entries'])
+            self.snapshot = name
+            return True
+        except Exception:
+            return False
+
+    def reload_if_changed(self) -> bool:
+        """Re-open the snapshot when another process has published a newer one."""
+        name = self._current_snapshot()
+        return name is not None and name != self.snapshot and self.load()
+
+    def reset(self) -> None:
+        """Forget all entries; the next refresh rebuilds from the database."""
+        self._state = (np.zeros((0, 0), dtype=np.float32), [])
+
+    def save(self) -> None:
+        """Publish vectors and id map as a new snapshot, then re-open the vectors memory-mapped."""
+        matrix, entries = self._state
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        name = f'snapshot-{time.time_ns()}-{os.getpid()}'
+        tmp_dir = self.index_dir / f'.{name}.tmp'
+        tmp_dir.mkdir()
+        np.save(tmp_dir / 'vectors.npy', np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(tmp_dir / 'entries.json', 'w', encoding='utf-8') as f:
+            json.dump({'snippet_chars': self.snippet_chars, 'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_dir, self.index_dir / name)
+        tmp_current = self.index_dir / f'CURRENT.{os.getpid()}.tmp'
+        tmp_current.write_text(name, encoding='utf-8')
+        os.replace(tmp_current, self.index_dir / 'CURRENT')
+        self.load()
+        self._prune(keep=name)
+
+    def _prune(self, keep: str) -> None:
+        # Drop older snapshots; workers still mapping one keep their pages until they re-open
+        for path in self.index_dir.glob('snapshot-*'):
+            if path.name != keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _truncate(self, content: Optional[str]) -> Optional[str]:
+        return content[:self.snippet_chars] if content and self.snippet_chars else content
+
+    def refresh(self, db: Session, persist: bool = True) -> Dict[str, int]:
+        """Bring the index in line with the database, fetching only rows that are new or changed."""
+        with self._refresh_lock:
+            matrix, entries = self._state
+            known = {(e['type'], e['id']): i for i, e in enumerate(entries)}
+            keep_rows: List[int] = []
+            new_vectors: List[np.ndarray] = []
+            new_entries: List[Dict[str, Any]] = []
+            updated = 0
+
+            for kind, model, pk, emb_col in _SOURCES:
+                # (id, digest) scan: the database hashes each row, only 32 characters come back
+                live = dict(db.query(pk, _row_digest(kind, emb_col)).filter(emb_col.isnot(None)).all())
+                stale = []
+                for rid, digest in live.items():
+                    i = known.get((kind, rid))
+                    if i is not None and entries[i].get('digest') == digest:
+                        keep_rows.append(i)
+                    else:
+                        stale.append(rid)
+                        updated += i is not None
+                stale.sort()
+                for start in range(0, len(stale), 500):
+                    batch_ids = stale[start:start + 500]
+                    rows = (
+                        db.query(pk.label('id'), model.service_id, emb_col.label('embedding'),
+                                 _row_digest(kind, emb_col).label('digest'), *_content_columns(kind))
+                        .filter(pk.in_(batch_ids))
+                        .all()
+                    )
+                    for row in rows:
+                        new_vectors.append(np.asarray(row.embedding, dtype=np.float32))
+                        new_entries.append({
+                            'type': kind,
+                            'id': row.id,
+                            'service_id': row.service_id,
+                            'content': self._truncate(_row_content(kind, row)),
+                            'digest': row.digest,
+                        })
+
+            removed = len(entries) - len(keep_rows) - updated
+            if not new_entries and len(keep_rows) == len(entries):
+                self.last_refresh = time.time()
+                return {'added': 0, 'updated': 0, 'removed': 0, 'size': len(entries)}
+
+            keep_rows.sort()
+            parts = []
+            if keep_rows:
+                parts.append(np.asarray(matrix[keep_rows], dtype=np.float32))
+            if new_vectors:
+                parts.append(_normalize_rows(np.vstack(new_vectors)))
+            merged = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+            merged_entries = [entries[i] for i in keep_rows] + new_entries
+
+            self._state = (merged, merged_entries)
+            self.last_refresh = time.time()
+            if persist:
+                self.save()
+            return {'added': len(new_entries) - updated, 'updated': updated, 'removed': removed,
+                    'size': len(merged_entries)}
+
+    def search(self, query_embedding: List[float], limit: int = 10, service_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top-`limit` entries by cosine similarity, optionally restricted to one service."""
+        matrix, entries = self._state
+        if not entries or not query_embedding:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != matrix.shape[1]:
+            return []
+        scores = matrix @ (query / norm)
+
+        if service_id:
+            candidates = np.fromiter((e['service_id'] == service_id for e in entries), dtype=bool, count=len(entries))
+            candidate_idx = np.flatnonzero(candidates)
+            if candidate_idx.size == 0:
+                return []
+            scores = scores[candidate_idx]
+        else:
+            candidate_idx = None
+
+        k = min(limit, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for pos in top:
+            entry = entries[int(candidate_idx[pos]) if candidate_idx is not None else int(pos)]
+            results.append({
+                'type': entry['type'],
+                'content': entry['content'],
+                'similarity': float(scores[pos]),
+                'service_id': entry['service_id'],
+                'source': entry['type'],
+            })
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        matrix, entries = self._state
+        return {
+            'size': len(entries),
+            'dim': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            'index_dir': str(self.index_dir),
+            'snapshot': self.snapshot,
+            'writer': _WRITER_LOCK is not None,
+            'last_refresh': self.last_refresh,
+        }
+
+
+_INDEX: Optional[NumpyVectorIndex] = None
+_INDEX_LOCK = threading.Lock()
+_REFRESHER: Optional[threading.Thread] = None
+_WRITER_LOCK = None
+
+
+def get_vector_index() -> NumpyVectorIndex:
+    """Process-wide index, opened from VECTOR_INDEX_DIR on first use."""
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                index = NumpyVectorIndex(
+                    os.getenv('VECTOR_INDEX_DIR', 'data/cache/vector_index'),
+                    snippet_chars=int(os.getenv('SEARCH_SNIPPET_CHARS', '1000')),
+                )
+                index.load()
+                _INDEX = index
+    return _INDEX
+
+def refresh_vector_index() -> Dict[str, int]:
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        return get_vector_index().refresh(db)
+    finally:
+        db.close()
+
+def _become_writer(index_dir: Path) -> bool:
+    """Take the per-directory writer lock (held for the life of the process) if no other worker has it."""
+    global _WRITER_LOCK
+    if _WRITER_LOCK is not None or fcntl is None:
+        return True
+    index_dir.mkdir(parents=True, exist_ok=True)
+    handle = open(index_dir / '.writer.lock', 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _WRITER_LOCK = handle
+    return True
+
+def start_background_refresh(interval_seconds: Optional[float] = None) -> Optional[threading.Thread]:
+    """Keep the in-memory index in sync off the request path."""
+    global _REFRESHER
+    interval = interval_seconds if interval_seconds is not None else float(os.getenv('VECTOR_INDEX_REFRESH_SECONDS', '300'))
+    if _REFRESHER is not None and _REFRESHER.is_alive():
+        return _REFRESHER
+
+    def _loop():
+        while True:
+            try:
+                index = get_vector_index()
+                # One worker queries the database and publishes; the rest pick up its snapshots
+                if _become_writer(index.index_dir):
+                    # Start from anything `make build_vector_index` published meanwhile
+                    index.reload_if_changed()
+                    refresh_vector_index()
+                else:
+                    index.reload_if_changed()
+            except Exception as e:
+                print(f"⚠️ Vector index refresh failed: {e}")
+            if interval <= 0:
+                return
+            time.sleep(interval)
+
+    _REFRESHER = threading.Thread(target=_loop, name="vector-index-refresh", daemon=True)
+    _REFRESHER.start()
+    return _REFRESHER
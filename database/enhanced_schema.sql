@@ -368,6 +368,13 @@ CREATE TABLE IF NOT EXISTS system_health (
     checked_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Corpus Generation (bumped on ingest; versions the search result cache)
+CREATE TABLE IF NOT EXISTS corpus_generation (
+    id INTEGER PRIMARY KEY DEFAULT 1,
+    generation INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- =====================================================
 -- INDEXES FOR PERFORMANCE
 -- =====================================================
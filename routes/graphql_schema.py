@@ -5,9 +5,9 @@ Otherwise, provides helpers that indicate GraphQL is not configured.
 """
 
 from typing import Any, List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
 from core.database import SessionLocal
-from core.models import Service, Procedure
+from core.models import Service, Procedure, Document, FAQ
 
 try:
     import strawberry
@@ -42,7 +42,13 @@ try:
             if missing:
                 db = get_session()
                 try:
-                    rows = db.query(Document).filter(Document.service_id.in_(missing)).all()
+                    # Only the fields DocumentType exposes; raw_content/embedding stay in the DB
+                    rows = (
+                        db.query(Document)
+                        .options(load_only(Document.doc_id, Document.service_id, Document.name, Document.document_type))
+                        .filter(Document.service_id.in_(missing))
+                        .all()
+                    )
                     by_service = {}
                     for r in rows:
                         by_service.setdefault(r.service_id, []).append(r)
@@ -61,7 +67,12 @@ try:
             if missing:
                 db = get_session()
                 try:
-                    rows = db.query(FAQ).filter(FAQ.service_id.in_(missing)).all() if 'FAQ' in globals() else []
+                    rows = (
+                        db.query(FAQ)
+                        .options(load_only(FAQ.faq_id, FAQ.service_id, FAQ.question, FAQ.answer))
+                        .filter(FAQ.service_id.in_(missing))
+                        .all()
+                    )
                     by_service = {}
                     for r in rows:
                         by_service.setdefault(r.service_id, []).append(r)
@@ -136,7 +147,13 @@ try:
         def services(self, info, limit: int = 50, offset: int = 0) -> List[ServiceType]:
             db = get_session()
             try:
-                rows = db.query(Service).offset(offset).limit(limit).all()
+                rows = (
+                    db.query(Service)
+                    .options(load_only(Service.service_id, Service.name, Service.category, Service.ministry))
+                    .offset(offset)
+                    .limit(limit)
+                    .all()
+                )
                 return [ServiceType(service_id=r.service_id, name=r.name, category=r.category, ministry=r.ministry) for r in rows]
             finally:
                 db.close()
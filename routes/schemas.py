@@ -11,6 +11,8 @@ class EndpointResponse(BaseModel):
 class SearchQuery(BaseModel):
     q: str
     service_id: Optional[int] = None
+    language: Optional[str] = None
+    category: Optional[str] = None
     limit: int = 10
 
 
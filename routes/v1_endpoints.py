@@ -14,7 +14,9 @@ from core.repositories import (
     ServiceRepository,
     DocumentRepository,
     FAQRepository,
+    SERVICE_LIST_COLUMNS,
 )
+from core.models import Document
 from core.cache import ttl_cache
 from core.ops.backup_restore import backup_database, restore_database
 from core.recommendations import RecommendationEngine
@@ -96,9 +98,9 @@ def pan_linking() -> EndpointResponse:
 
 # Week 13: Search & discovery APIs
 @router.get("/search")
-def universal_search(q: str = Query(..., description="Query string"), service_id: int | None = None, limit: int = 10, db: Session = Depends(get_db)) -> Dict[str, Any]:
+def universal_search(q: str = Query(..., description="Query string"), service_id: int | None = None, limit: int = 10, language: str | None = None, category: str | None = None, db: Session = Depends(get_db)) -> Dict[str, Any]:
     engine = SearchEngine(db)
-    return engine.search(q, service_id=service_id, limit=limit)
+    return engine.search(q, service_id=service_id, limit=limit, language=language, category=category)
 
 
 @router.get("/discovery/services")
@@ -129,8 +131,8 @@ def recommendation_system(q: str = Query(""), db: Session = Depends(get_db)) ->
     svc_repo = ServiceRepository(db)
     doc_repo = DocumentRepository(db)
     data: List[Dict[str, Any]] = []
-    for svc in svc_repo.get_all(0, 50):
-        count = len(doc_repo.get_by_service(getattr(svc, "id", 0)))
+    for svc in svc_repo.get_all(0, 50, columns=SERVICE_LIST_COLUMNS):
+        count = len(doc_repo.get_by_service(getattr(svc, "id", 0), columns=(Document.doc_id,)))
         data.append({"service_id": getattr(svc, "id", 0), "name": getattr(svc, "name", ""), "document_count": count})
     data.sort(key=lambda x: x["document_count"], reverse=True)
     return {"recommendations": data[:10]}
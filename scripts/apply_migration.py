@@ -1,5 +1,6 @@
 """
-Idempotent migration: add `category` column to `content_chunks` if missing.
+Idempotent migration: add `category` column to `content_chunks` and the
+`corpus_generation` table (search result cache versioning) if missing.
 
 Usage:
   python3 scripts/apply_migration.py
@@ -25,8 +26,16 @@ def main():
             conn.execute(text("ALTER TABLE IF EXISTS content_chunks ADD COLUMN IF NOT EXISTS category VARCHAR(100);"))
             # Optional helpful index
             conn.execute(text("CREATE INDEX IF NOT EXISTS idx_chunks_category ON content_chunks(category);"))
+            # Shared counter the search result caches key on (see core/search_cache.py)
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS corpus_generation ("
+                "id INTEGER PRIMARY KEY DEFAULT 1, "
+                "generation INTEGER NOT NULL DEFAULT 0, "
+                "updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP);"
+            ))
+            conn.execute(text("INSERT INTO corpus_generation (id, generation) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;"))
             conn.commit()
-            print("✅ Migration applied: content_chunks.category added (if missing)")
+            print("✅ Migration applied: content_chunks.category and corpus_generation added (if missing)")
         except Exception as e:
             print("❌ Migration failed:", e)
             conn.rollback()
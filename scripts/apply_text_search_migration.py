@@ -0,0 +1,42 @@
+"""
+Idempotent migration: add stored `search_tsv` columns (documents, faqs, content_chunks)
+and their GIN indexes, then drop the old documents expression index.
+
+Usage:
+  python scripts/apply_text_search_migration.py
+  python scripts/apply_text_search_migration.py --keep-legacy   # keep idx_documents_tsv
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from core.database import engine
+from core.ops.text_search import ensure_text_search
+from core.search_cache import bump_corpus_generation
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keep-legacy", action="store_true", help="Do not drop the old expression index")
+    args = ap.parse_args()
+
+    try:
+        report = ensure_text_search(engine, drop_legacy=not args.keep_legacy)
+    except Exception as e:
+        print(f"❌ Text search migration failed: {e}")
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+    if any("error" in entry for entry in report):
+        print("❌ Text search migration incomplete")
+        sys.exit(1)
+    # Cached hybrid results were computed without the new lexical leg
+    bump_corpus_generation()
+    print("✅ Text search columns and indexes in place")
+
+
+if __name__ == "__main__":
+    main()
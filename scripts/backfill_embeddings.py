@@ -8,23 +8,19 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-import os
 from typing import List
 from sqlalchemy import inspect
 from sqlalchemy.orm import load_only
-from core.database import SessionLocal
+from core.database import SessionLocal, engine
+from core.ops.vector_indexes import VectorIndexManager
+from core.search_cache import bump_corpus_generation
 from core.models import Document, FAQ, ContentChunk
+from core.model_registry import get_embedding_model, get_model_name, embeddings_enabled
 
 def load_model():
-    enabled = os.getenv('EMBEDDING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
-    if not enabled:
-        return None
-    try:
-        from sentence_transformers import SentenceTransformer
-        model_name = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
-        return SentenceTransformer(model_name)
-    except Exception:
+    if not embeddings_enabled():
         return None
+    return get_embedding_model(get_model_name())
 
 def encode(model, text: str) -> List[float]:
     try:
@@ -83,6 +79,11 @@ def main():
 
         db.commit()
         print(f"✅ Backfill complete: {updated}")
+        if any(updated.values()):
+            bump_corpus_generation()
+            # Re-plan ANN indexes now that row counts changed
+            for entry in VectorIndexManager(engine).ensure_indexes():
+                print(f"   {entry['index']}: {entry.get('action')} (rows={entry.get('rows')}, size={entry.get('size_bytes')})")
     except Exception as e:
         db.rollback()
         print(f"❌ Backfill failed: {e}")
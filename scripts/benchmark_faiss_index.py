@@ -0,0 +1,66 @@
+"""
+Benchmark FAISS index types on our own chunk embeddings: recall@k against exact
+search, single-query p50/p99 latency and index size, to pick FAISS_INDEX_TYPE,
+FAISS_NLIST, FAISS_NPROBE and FAISS_PQ_M with data.
+
+Usage:
+  python scripts/benchmark_faiss_index.py
+  python scripts/benchmark_faiss_index.py --k 10 --nlist 32 64 --nprobe 4 8 16 --pq-m 24 48 96
+  python scripts/benchmark_faiss_index.py --json
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from core.faiss_ann import benchmark, default_nlist, flat_vectors
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=os.getenv("FAISS_INDEX_PATH", "faiss_index"))
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200, help="Stored chunks sampled as queries")
+    ap.add_argument("--nlist", type=int, nargs="*", help="Inverted lists (default: derived from corpus size)")
+    ap.add_argument("--nprobe", type=int, nargs="*", default=[1, 4, 8, 16])
+    ap.add_argument("--pq-m", type=int, nargs="*", default=[24, 48, 96], help="PQ sub-quantizers (code bytes at 8 bits)")
+    ap.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = ap.parse_args()
+
+    import faiss
+    try:
+        vectors = flat_vectors(faiss.read_index(os.path.join(args.index_dir, "index.faiss")))
+    except Exception as e:
+        print(f"❌ Could not read flat index from {args.index_dir}: {e}")
+        sys.exit(1)
+
+    nlists = args.nlist or [default_nlist(len(vectors))]
+    configs = [{"kind": "flat"}]
+    for nlist in nlists:
+        for nprobe in args.nprobe:
+            configs.append({"kind": "ivf_flat", "nlist": nlist, "nprobe": nprobe})
+            for pq_m in args.pq_m:
+                configs.append({"kind": "ivf_pq", "nlist": nlist, "nprobe": nprobe, "pq_m": pq_m})
+
+    print(f"🔍 Benchmarking {len(configs)} configs on {len(vectors)} vectors (k={args.k}, {args.queries} queries)...")
+    results = benchmark(vectors, configs, k=args.k, n_queries=args.queries)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    recall_key = f"recall@{args.k}"
+    print(f"\n{'type':<9} {'nlist':>5} {'nprobe':>6} {'pq_m':>5} {recall_key:>10} {'p50 ms':>8} {'p99 ms':>8} {'size KB':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['kind']:<9} {r.get('nlist', '-'):>5} {r.get('nprobe', '-'):>6} {r.get('pq_m', '-'):>5}  ❌ {r['error']}")
+            continue
+        print(f"{r['kind']:<9} {r.get('nlist', '-'):>5} {r.get('nprobe', '-'):>6} {r.get('pq_m', '-'):>5} "
+              f"{r[recall_key]:>10.4f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['index_bytes'] / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Build or incrementally refresh the in-process NumPy vector index used by
+SearchEngine when SEARCH_INDEX_BACKEND=numpy.
+
+Usage:
+  python scripts/build_vector_index.py            # add new and changed rows, drop deleted ones
+  python scripts/build_vector_index.py --rebuild  # start from an empty index
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from core.database import SessionLocal
+from core.vector_index import get_vector_index
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rebuild", action="store_true", help="Discard the saved index and rebuild from scratch")
+    args = ap.parse_args()
+
+    index = get_vector_index()
+    if args.rebuild:
+        index.reset()
+    db = SessionLocal()
+    started = time.time()
+    try:
+        summary = index.refresh(db)
+        print(f"✅ Vector index refreshed in {time.time() - started:.1f}s: {summary}")
+        print(f"   Stored at {index.index_dir}")
+    except Exception as e:
+        print(f"❌ Vector index refresh failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
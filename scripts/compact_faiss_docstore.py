@@ -0,0 +1,32 @@
+"""
+Convert the FAISS index's pickled docstore (index.pkl) into the compact SQLite
+docstore the chat agents read on demand. Run after rebuilding the index so no
+worker has to unpickle the docstore itself.
+
+Usage:
+  python scripts/compact_faiss_docstore.py [index_dir]
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from core.faiss_store import compact_docstore
+
+
+def main():
+    index_dir = sys.argv[1] if len(sys.argv) > 1 else os.getenv("FAISS_INDEX_PATH", "faiss_index")
+    started = time.time()
+    try:
+        docstore = compact_docstore(index_dir)
+    except Exception as e:
+        print(f"❌ Docstore compaction failed: {e}")
+        sys.exit(1)
+    print(f"✅ Compacted {len(docstore)} documents into {docstore.path} in {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
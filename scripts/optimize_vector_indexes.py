@@ -0,0 +1,42 @@
+"""
+Plan, build and report pgvector ANN indexes (HNSW or IVFFlat, sized from row counts).
+
+Usage:
+  python scripts/optimize_vector_indexes.py             # create missing / re-plan stale indexes
+  python scripts/optimize_vector_indexes.py --reindex   # after a bulk ingest
+  python scripts/optimize_vector_indexes.py --report    # sizes and parameters only
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from core.database import engine
+from core.ops.vector_indexes import VectorIndexManager
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reindex", action="store_true", help="Rebuild indexes after a bulk ingest")
+    ap.add_argument("--report", action="store_true", help="Only report current index state")
+    args = ap.parse_args()
+
+    manager = VectorIndexManager(engine)
+    try:
+        if args.report:
+            result = manager.report()
+        elif args.reindex:
+            result = manager.reindex_after_bulk_ingest()
+        else:
+            result = manager.ensure_indexes()
+    except Exception as e:
+        print(f"❌ Vector index maintenance failed: {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ import csv
 from core.database import SessionLocal
 from core.models import RawContent, Document, ContentChunk, Service
 from core.nlp import NLPToolkit
+from core.search_cache import bump_corpus_generation
 from data.processing.document_parser import DocumentParser
 
 
@@ -145,6 +146,9 @@ def process_pending(db: Session, resume: bool = True, failures_csv: str = "artif
 
     failures_f.close()
 
+    if summary["processed"]:
+        # Invalidate cached search results in every API worker
+        bump_corpus_generation()
     return summary
 
 
@@ -0,0 +1,76 @@
+"""
+Train the local query-understanding model from LLM-labelled queries.
+
+Collect examples by running the chat service with INTENT_LOG_PATH set (each
+parsed QueryUnderstandingAgent answer is appended as a JSON line), then:
+
+  python scripts/train_intent_classifier.py --log data/cache/intent_log.jsonl
+  python scripts/train_intent_classifier.py --log intent_log.jsonl --out data/cache/intent_model.npz --threshold 0.8
+
+A held-out split reports per-field accuracy and, at the confidence threshold,
+how many queries would skip the LLM and how often those local answers agree
+with it. The model is then refit on all examples and written to --out
+(INTENT_MODEL_PATH for the chat service).
+"""
+import argparse
+import os
+import random
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from core.intent_classifier import HEADS, HashedIntentModel, guess_topic, read_intent_log, understanding_confidence
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=os.getenv("INTENT_LOG_PATH", "data/cache/intent_log.jsonl"))
+    ap.add_argument("--out", default=os.getenv("INTENT_MODEL_PATH", "data/cache/intent_model.npz"))
+    ap.add_argument("--dim", type=int, default=1 << 16, help="Hashed feature space size")
+    ap.add_argument("--epochs", type=int, default=15)
+    ap.add_argument("--threshold", type=float, default=float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8")))
+    ap.add_argument("--holdout", type=float, default=0.2)
+    args = ap.parse_args()
+
+    try:
+        samples = read_intent_log(args.log)
+    except OSError as e:
+        print(f"❌ Could not read {args.log}: {e}")
+        sys.exit(1)
+    if len(samples) < 20:
+        print(f"❌ Only {len(samples)} logged queries in {args.log}; collect more before training")
+        sys.exit(1)
+
+    random.Random(0).shuffle(samples)
+    cut = max(1, int(len(samples) * args.holdout))
+    held_out, train = samples[:cut], samples[cut:]
+    model = HashedIntentModel.train(train, dim=args.dim, epochs=args.epochs)
+
+    correct = {head: 0 for head in model.labels}
+    confident = confident_correct = 0
+    for query, labels in held_out:
+        predicted = model.predict(query)
+        hits = [predicted[h][0] == str(labels.get(h)) for h in predicted]
+        for head, ok in zip(predicted, hits):
+            correct[head] += ok
+        # Same confidence the chat service gates on, keyword-rule topic included
+        if understanding_confidence(predicted, guess_topic(query)) >= args.threshold:
+            confident += 1
+            confident_correct += all(hits)
+    print(f"📊 {len(train)} training / {len(held_out)} held-out queries")
+    for head in HEADS:
+        if head in correct:
+            print(f"   {head:<16} accuracy {correct[head] / len(held_out):.3f} ({len(model.labels[head])} labels)")
+    print(f"   confidence >= {args.threshold}: {confident / len(held_out):.1%} of queries skip the LLM, "
+          f"{(confident_correct / confident if confident else 0):.1%} of those match it on every field")
+
+    final = HashedIntentModel.train(samples, dim=args.dim, epochs=args.epochs)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    final.save(args.out)
+    print(f"✅ Model written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
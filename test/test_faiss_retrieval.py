@@ -0,0 +1,415 @@
+"""
+FAISS retrieval tests - batched multi-query search, the lazily opened store and IVF/PQ indexes, service shards,
+the incremental builder
+"""
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+
+class _Doc:
+    def __init__(self, page_content, source):
+        self.page_content = page_content
+        self.metadata = {"source": source}
+
+
+class _Docstore:
+    def __init__(self, docs):
+        self._dict = docs
+
+    def search(self, doc_id):
+        return self._dict.get(doc_id, f"ID {doc_id} not found.")
+
+
+class _KeywordEmbeddings:
+    """Deterministic 3-d vectors: one axis per keyword."""
+    calls = 0
+
+    def embed_documents(self, texts):
+        _KeywordEmbeddings.calls += 1
+        return [[float("passport" in t), float("aadhaar" in t), float("pan" in t)] for t in texts]
+
+
+def _build_store():
+    import faiss
+    import numpy as np
+
+    class _Store:
+        pass
+
+    vectors = np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0, 0.9, 0.1], [0, 0, 1]], dtype=np.float32)
+    store = _Store()
+    store.index = faiss.IndexFlatL2(3)
+    store.index.add(vectors)
+    store.index_to_docstore_id = {i: f"doc-{i}" for i in range(len(vectors))}
+    store.docstore = _Docstore({f"doc-{i}": _Doc(f"chunk {i}", "kb") for i in range(len(vectors))})
+    store.embeddings = _KeywordEmbeddings()
+    return store
+
+
+def test_multi_query_search_batches_and_dedupes():
+    try:
+        from core.faiss_retrieval import multi_query_search
+        store = _build_store()
+        _KeywordEmbeddings.calls = 0
+        hits = multi_query_search(store, [("passport renewal", 2), ("aadhaar update", 2), ("passport fees", 1), ("", 3)])
+        ids = [doc_id for _, doc_id, _ in hits]
+        # One encode call for all sub-queries; doc-0 found twice but returned once
+        assert _KeywordEmbeddings.calls == 1
+        assert ids == ["doc-0", "doc-1", "doc-2", "doc-3"]
+        assert hits[0][0].page_content == "chunk 0"
+        print(f"✅ Multi-query search returned {ids}")
+        return True
+    except Exception as e:
+        print(f"❌ Multi-query search failed: {e}")
+        return False
+
+
+def test_lazy_store_opens_on_demand():
+    try:
+        import pickle
+        import tempfile
+        import time
+        import faiss
+        from core.faiss_store import LazyFaissStore, DOCSTORE_FILE
+
+        source = _build_store()
+        with tempfile.TemporaryDirectory() as tmp:
+            faiss.write_index(source.index, f"{tmp}/index.faiss")
+            with open(f"{tmp}/index.pkl", "wb") as f:
+                pickle.dump((source.docstore, source.index_to_docstore_id), f)
+
+            started = time.time()
+            store = LazyFaissStore(tmp, embeddings_factory=_KeywordEmbeddings)
+            # Nothing is read until first use
+            assert store.status()["state"] == "not_loaded" and time.time() - started < 0.1
+            docs = store.similarity_search("aadhaar", k=2)
+            assert store.ready and store.status()["vectors"] == 5
+            assert [d.page_content for d in docs] == ["chunk 2", "chunk 3"]
+            assert Path(tmp, DOCSTORE_FILE).exists()
+
+            # A second worker opens the compact docstore without unpickling index.pkl
+            Path(tmp, "index.pkl").unlink()
+            other = LazyFaissStore(tmp, embeddings_factory=_KeywordEmbeddings)
+            other.start_background_load().join(5)
+            assert other.ready and other.docstore.search("doc-4").page_content == "chunk 4"
+
+            missing = LazyFaissStore(f"{tmp}/nope", embeddings_factory=_KeywordEmbeddings)
+            assert not missing.ensure_loaded() and missing.state == "missing"
+        print(f"✅ Lazy FAISS store: {store.status()}")
+        return True
+    except Exception as e:
+        print(f"❌ Lazy FAISS store failed: {e}")
+        return False
+
+
+def test_lazy_store_reloads_rebuilt_index():
+    try:
+        import os
+        import tempfile
+        import threading
+        import faiss
+        from core.faiss_store import CompactDocstore, LazyFaissStore, DOCSTORE_FILE
+
+        def publish(tmp, texts, version):
+            # Builder-style swap: new docstore, then new index, each with os.replace
+            store = _build_store()
+            docs = {f"doc-{i}": _Doc(text, "kb") for i, text in enumerate(texts)}
+            CompactDocstore.build(f"{tmp}/{DOCSTORE_FILE}", docs, store.index_to_docstore_id)
+            faiss.write_index(store.index, f"{tmp}/index.tmp")
+            os.replace(f"{tmp}/index.tmp", f"{tmp}/index.faiss")
+            os.utime(f"{tmp}/index.faiss", ns=(version, version))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            publish(tmp, [f"chunk {i}" for i in range(5)], 10**18)
+            store = LazyFaissStore(tmp, embeddings_factory=_KeywordEmbeddings, reload_check_seconds=0)
+            assert [d.page_content for d in store.similarity_search("aadhaar", k=1)] == ["chunk 2"]
+            old = store.pinned()
+
+            publish(tmp, [f"rebuilt {i}" for i in range(5)], 2 * 10**18)
+            # The open generation keeps its own docstore, also from a thread that never used it
+            seen = []
+            reader = threading.Thread(target=lambda: seen.append(old.docstore.search("doc-2").page_content))
+            reader.start()
+            reader.join()
+            assert seen == ["chunk 2"]
+            # The next request opens the rebuilt index and docstore together
+            assert [d.page_content for d in store.similarity_search("aadhaar", k=1)] == ["rebuilt 2"]
+            assert store.pinned() is not old and store.status()["version"] == 2 * 10**18
+
+            # A broken rebuild is tried once; the previous generation keeps serving
+            attempts = []
+            load = store._load
+            store._load = lambda: (attempts.append(1), load())
+            with open(f"{tmp}/index.faiss", "wb") as f:
+                f.write(b"not an index")
+            for _ in range(3):
+                assert store.ensure_loaded()
+            assert len(attempts) == 1 and store.error and store.docstore.search("doc-2").page_content == "rebuilt 2"
+
+            failed = LazyFaissStore(tmp, embeddings_factory=_KeywordEmbeddings, reload_check_seconds=0)
+            assert not failed.ensure_loaded() and failed.state == "error"
+            failed._load = lambda: attempts.append(1)
+            assert not failed.ensure_loaded() and len(attempts) == 1
+        print("✅ Lazy FAISS store reopens rebuilt indexes as one generation")
+        return True
+    except Exception as e:
+        print(f"❌ Lazy FAISS store reload failed: {e}")
+        return False
+
+
+def test_ann_index_benchmark():
+    try:
+        import numpy as np
+        from core.faiss_ann import benchmark, build_ann_index, index_kind
+
+        vectors = np.random.default_rng(0).random((600, 32), dtype=np.float32)
+        ivf = build_ann_index(vectors, "ivf_flat", nlist=8, nprobe=8)
+        assert index_kind(ivf) == "ivf_flat" and ivf.ntotal == 600
+        results = benchmark(vectors, [
+            {"kind": "ivf_flat", "nlist": 8, "nprobe": 8},
+            {"kind": "ivf_pq", "nlist": 8, "nprobe": 8, "pq_m": 8},
+            {"kind": "ivf_pq", "nlist": 8, "pq_m": 7},
+        ], k=5, n_queries=50)
+        # Probing every list is exact; PQ trades recall for a much smaller index
+        assert results[0]["recall@5"] == 1.0
+        assert 0 < results[1]["recall@5"] <= 1.0 and results[1]["index_bytes"] < results[0]["index_bytes"]
+        assert "p99_ms" in results[1] and "error" in results[2]
+        print(f"✅ ANN benchmark: {[(r['kind'], r.get('recall@5')) for r in results]}")
+        return True
+    except Exception as e:
+        print(f"❌ ANN benchmark failed: {e}")
+        return False
+
+
+def test_ann_config_falls_back_and_staging_is_cleaned():
+    try:
+        import os
+        import tempfile
+        import numpy as np
+        from core.faiss_ann import build_from_env
+        from core import rag_vector_ingest as ingest
+
+        small = np.random.default_rng(0).random((40, 32), dtype=np.float32)
+        os.environ.update({"FAISS_INDEX_TYPE": "ivf_pq", "FAISS_PQ_M": "8"})
+        try:
+            # 40 vectors cannot train 256 PQ centroids: the flat index is served instead
+            assert build_from_env(small) is None
+            os.environ["FAISS_INDEX_TYPE"] = "hnsw"
+            try:
+                ingest.check_index_config()
+                raise AssertionError("unknown index type accepted")
+            except RuntimeError as e:
+                assert "hnsw" in str(e)
+        finally:
+            for name in ("FAISS_INDEX_TYPE", "FAISS_PQ_M"):
+                os.environ.pop(name, None)
+
+        def fail(*args):
+            raise RuntimeError("disk full")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ingest.FAISS.from_embeddings([("passport renewal", [1.0, 0.0, 0.0])], _KeywordEmbeddings())
+            original = ingest.build_shards
+            ingest.build_shards = fail
+            try:
+                ingest.save_atomically(store, f"{tmp}/faiss_index", {})
+                raise AssertionError("save did not fail")
+            except RuntimeError as e:
+                assert str(e) == "disk full"
+            finally:
+                ingest.build_shards = original
+            # Nothing published and no staging copy left behind
+            assert os.listdir(tmp) == []
+        print("✅ ANN config falls back to flat; failed saves leave no staging directory")
+        return True
+    except Exception as e:
+        print(f"❌ ANN fallback / staging cleanup failed: {e}")
+        return False
+
+
+def test_shard_router_picks_topic_shard():
+    try:
+        import pickle
+        import tempfile
+        import faiss
+        from core.faiss_ann import build_ann_index
+        from core.faiss_store import CompactDocstore, LazyFaissStore, ShardRouter, DOCSTORE_FILE, SHARDS_DIR
+
+        source = _build_store()
+        with tempfile.TemporaryDirectory() as tmp:
+            faiss.write_index(source.index, f"{tmp}/index.faiss")
+            with open(f"{tmp}/index.pkl", "wb") as f:
+                pickle.dump((source.docstore, source.index_to_docstore_id), f)
+            # Aadhaar shard holds only vectors 2 and 3
+            shard_dir = Path(tmp, SHARDS_DIR, "aadhaar")
+            shard_dir.mkdir(parents=True)
+            faiss.write_index(build_ann_index(source.index.reconstruct_n(2, 2), "flat"), str(shard_dir / "index.faiss"))
+            CompactDocstore.build(str(shard_dir / DOCSTORE_FILE),
+                                  {i: source.docstore.search(i) for i in ("doc-2", "doc-3")}, {0: "doc-2", 1: "doc-3"})
+
+            router = ShardRouter(LazyFaissStore(tmp, embeddings_factory=_KeywordEmbeddings))
+            shard = router.for_topic("aadhar")
+            assert shard is not router.global_store and router.for_topic("AADHAAR") is shard
+            assert router.for_topic("general") is router.global_store
+            assert router.for_topic("pan") is router.global_store  # no shard built
+            assert router.for_topic("../aadhaar") is router.global_store
+            docs = shard.similarity_search("aadhaar", k=5)
+            assert [d.page_content for d in docs] == ["chunk 2", "chunk 3"]
+            assert shard.embeddings is router.global_store.embeddings
+            assert router.status()["aadhaar"]["vectors"] == 2
+        print("✅ Shard router: aadhar -> shards/aadhaar, general -> global")
+        return True
+    except Exception as e:
+        print(f"❌ Shard router failed: {e}")
+        return False
+
+
+def _fake_pdf_loader(calls):
+    """In-process stand-in for the PDF pool: each "PDF" is a text file, "broken" ones yield nothing."""
+    from langchain_core.documents import Document
+    from core.rag_vector_ingest import file_digest
+
+    def load_files(paths, workers, digests=None):
+        for path in paths:
+            calls.append((Path(path).name, path in (digests or {})) if digests else Path(path).name)
+            text = Path(path).read_text()
+            chunks = [] if "broken" in text else [Document(page_content=text, metadata={"source": path})]
+            yield path, (digests or {}).get(path) or file_digest(path), chunks, len(chunks)
+    return load_files
+
+
+def test_builder_pool_loading_and_batched_embedding():
+    try:
+        import tempfile
+        from langchain_core.documents import Document
+        from core import rag_vector_ingest as ingest
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for name in ("a.pdf", "b.pdf", "c.pdf"):
+                Path(tmp, name).write_text("not a pdf")
+                paths.append(f"{tmp}/{name}")
+            # Two worker processes, results in input order; known hashes are passed through, not recomputed
+            results = list(ingest._load_files(paths, workers=2, digests={paths[0]: "known-a", paths[2]: "known-c"}))
+            assert [(Path(p).name, d, chunks) for p, d, chunks, _ in results] == [
+                ("a.pdf", "known-a", []), ("b.pdf", ingest.file_digest(paths[1]), []), ("c.pdf", "known-c", [])]
+
+        class _Counting(_KeywordEmbeddings):
+            batches = []
+
+            def embed_documents(self, texts):
+                self.batches.append(len(texts))
+                return super().embed_documents(texts)
+
+        def load_files(paths, workers, digests=None):
+            for i, path in enumerate(paths):
+                chunks = [Document(page_content=f"{path} passport part {j}", metadata={}) for j in range(i % 3 + 1)]
+                yield path, f"sha-{i}", chunks, 1
+
+        original = ingest._load_files
+        ingest._load_files = load_files
+        try:
+            manifest = {}
+            store, stats = ingest.ingest_files([f"/docs/{i}.pdf" for i in range(4)], "/docs", None, _Counting(),
+                                               manifest, workers=1, batch_size=3)
+        finally:
+            ingest._load_files = original
+        # 1 + 2 + 3 + 1 chunks stream into full batches of 3, regardless of file boundaries
+        assert _Counting.batches == [3, 3, 1] and stats.chunks == 7 and store.index.ntotal == 7
+        assert ingest.manifest_matches(manifest, store) and manifest["2.pdf"]["sha256"] == "sha-2"
+        print(f"✅ Builder pool loading and batched embedding: {stats.report()}")
+        return True
+    except Exception as e:
+        print(f"❌ Builder pool loading failed: {e}")
+        return False
+
+
+def test_builder_swaps_generations_and_skips_failed_files():
+    try:
+        import json
+        import tempfile
+        from core import rag_vector_ingest as ingest
+        from core.faiss_store import CompactDocstore, LazyFaissStore, DOCSTORE_FILE, SHARDS_DIR
+
+        calls = []
+        originals = (ingest._load_files, ingest._embeddings)
+        ingest._load_files, ingest._embeddings = _fake_pdf_loader(calls), _KeywordEmbeddings
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                data, db = Path(tmp, "docs"), f"{tmp}/faiss_index"
+                for rel, text in (("passport/renew.pdf", "passport renewal"), ("aadhaar/update.pdf", "aadhaar update"),
+                                  ("scan.pdf", "broken scan")):
+                    Path(data, rel).parent.mkdir(parents=True, exist_ok=True)
+                    Path(data, rel).write_text(text)
+                ingest.create_vector_store(str(data), db)
+                manifest = json.loads(Path(db, "manifest.json").read_text())
+                generation = manifest["generation"]
+                assert manifest["files"]["scan.pdf"]["ids"] == [] and manifest["files"]["scan.pdf"]["skipped"]
+                assert json.loads(Path(db, SHARDS_DIR, "aadhaar", "manifest.json").read_text()) == {"generation": generation}
+                assert not any(p.name.startswith("faiss_index.staging") for p in Path(tmp).iterdir())
+
+                store = LazyFaissStore(db, embeddings_factory=_KeywordEmbeddings, reload_check_seconds=0)
+                assert [d.page_content for d in store.similarity_search("aadhaar", k=1)] == ["aadhaar update"]
+                assert store.docstore.generation == generation
+
+                # The unreadable file is not retried while it is unchanged
+                calls.clear()
+                ingest.update_vector_store(str(data), db)
+                assert calls == []
+
+                # Docstore swapped in, manifest not yet: a reader refuses the pair
+                CompactDocstore.build(f"{db}/{DOCSTORE_FILE}", {}, {}, generation + 1)
+                mid_swap = LazyFaissStore(db, embeddings_factory=_KeywordEmbeddings)
+                assert not mid_swap.ensure_loaded() and "generation" in mid_swap.error
+
+                # A save interrupted before manifest.json no longer matches index.pkl: full rebuild
+                Path(data, "aadhaar/update.pdf").write_text("aadhaar address update")
+                manifest["files"]["passport/renew.pdf"]["ids"].append("lost-id")
+                Path(db, "manifest.json").write_text(json.dumps(manifest))
+                ingest.update_vector_store(str(data), db)
+                assert sorted(calls) == ["renew.pdf", "scan.pdf", "update.pdf"]
+                assert [d.page_content for d in store.similarity_search("aadhaar", k=1)] == ["aadhaar address update"]
+                assert store.docstore.generation > generation and store.error is None
+
+                # Incremental updates hand the change plan's hashes to the loader instead of rehashing
+                calls.clear()
+                Path(data, "passport/renew.pdf").write_text("passport renewal fees")
+                ingest.update_vector_store(str(data), db)
+                assert calls == [("renew.pdf", True)]
+        finally:
+            ingest._load_files, ingest._embeddings = originals
+        print("✅ FAISS builder publishes whole generations and skips unreadable files")
+        return True
+    except Exception as e:
+        print(f"❌ FAISS builder failed: {e}")
+        return False
+
+
+def main():
+    print("🧪 Testing FAISS retrieval...")
+    tests = [
+        ("Multi-query Search", test_multi_query_search_batches_and_dedupes),
+        ("Lazy FAISS Store", test_lazy_store_opens_on_demand),
+        ("Lazy FAISS Store Reload", test_lazy_store_reloads_rebuilt_index),
+        ("ANN Index Benchmark", test_ann_index_benchmark),
+        ("ANN Fallback And Staging Cleanup", test_ann_config_falls_back_and_staging_is_cleaned),
+        ("Shard Router", test_shard_router_picks_topic_shard),
+        ("FAISS Builder Batching", test_builder_pool_loading_and_batched_embedding),
+        ("FAISS Builder", test_builder_swaps_generations_and_skips_failed_files),
+    ]
+    passed = 0
+    for name, fn in tests:
+        print(f"\n🔍 Running {name}...")
+        if fn():
+            passed += 1
+        else:
+            print(f"❌ {name} failed")
+    print(f"\n📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,328 @@
+"""
+LLM runtime tests - rate limiting and async waits for the chat agents' Gemini calls, answer caching and memoization, local intent model
+and its confidence,
+Gemini probe refresh
+"""
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+
+def test_rate_limiter_waits_only_under_pressure():
+    try:
+        from core.llm_rate_limiter import RateLimiter
+        # A burst up to the per-minute quota goes out without waiting
+        limiter = RateLimiter(rpm=3, tpm=1_000_000)
+        started = time.monotonic()
+        assert all(limiter.acquire(100) for _ in range(3))
+        assert time.monotonic() - started < 0.05 and limiter.stats()["throttled"] == 0
+
+        # Token budget: 6000 TPM = 100 tokens/s; the reservation is settled with real usage
+        tokens = RateLimiter(rpm=1000, tpm=6000, max_wait=0.5)
+        assert tokens.acquire(5000)
+        tokens.settle(5000, 6000)  # used the whole bucket
+        started = time.monotonic()
+        assert tokens.acquire(20)  # waits ~0.2s for the refill
+        assert 0.1 < time.monotonic() - started < 0.5 and tokens.stats()["throttled"] == 1
+        assert not tokens.acquire(6000)  # would need a full minute
+        assert tokens.stats()["rejected"] == 1
+        print(f"✅ Rate limiter: {tokens.stats()}")
+        return True
+    except Exception as e:
+        print(f"❌ Rate limiter failed: {e}")
+        return False
+
+
+def test_rate_limiter_shared_across_workers():
+    try:
+        import tempfile
+        from core.llm_rate_limiter import RateLimiter
+        with tempfile.TemporaryDirectory() as tmp:
+            state = f"{tmp}/llm_rate.sqlite"
+            first = RateLimiter(rpm=2, tpm=1_000_000, shared_path=state, max_wait=0.1)
+            second = RateLimiter(rpm=2, tpm=1_000_000, shared_path=state, max_wait=0.1)
+            # Two workers draw from one 2-request bucket
+            assert first.acquire(10) and second.acquire(10)
+            assert not first.acquire(10) and not second.acquire(10)
+        print("✅ Shared rate limiter enforces one quota across workers")
+        return True
+    except Exception as e:
+        print(f"❌ Shared rate limiter failed: {e}")
+        return False
+
+
+def test_async_rate_limit_wait_does_not_block_loop():
+    try:
+        import asyncio
+        from core.llm_rate_limiter import RateLimiter
+
+        async def scenario():
+            limiter = RateLimiter(rpm=1000, tpm=6000)  # 100 tokens/s
+            assert limiter.acquire(6000)  # bucket now empty
+            ticks = 0
+
+            async def heartbeat():
+                nonlocal ticks
+                for _ in range(5):
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            acquired, _ = await asyncio.gather(limiter.acquire_async(10), heartbeat())
+            return acquired, ticks, limiter.stats()
+
+        acquired, ticks, stats = asyncio.run(scenario())
+        # The loop kept running while the call waited ~0.1s for budget
+        assert acquired and ticks == 5 and stats["throttled"] == 1
+        print(f"✅ Async rate limit wait: {stats['wait_seconds']}s, loop stayed responsive")
+        return True
+    except Exception as e:
+        print(f"❌ Async rate limit wait failed: {e}")
+        return False
+
+
+def test_semantic_answer_cache():
+    try:
+        from core.answer_cache import SemanticAnswerCache, context_fingerprint
+        cache = SemanticAnswerCache(max_entries=2, ttl=60, threshold=0.9)
+        fp = context_fingerprint(["doc-2", "doc-1", "doc-7"])
+        assert fp == context_fingerprint(["doc-1", "doc-7", "doc-2"])
+        cache.put([1.0, 0.0, 0.1], fp, "p1", {"response": "Link via UIDAI portal", "context": {}}, index_version=1)
+
+        # Paraphrase (cos ~0.99) with the same retrieved chunks is a hit
+        assert cache.has_similar([0.95, 0.05, 0.1], "p1", index_version=1)
+        hit = cache.get([0.95, 0.05, 0.1], fp, "p1", index_version=1)
+        assert hit["response"] == "Link via UIDAI portal" and hit["similarity"] > 0.9
+        # Different chunks, a different prompt version or a dissimilar query miss
+        assert cache.get([0.95, 0.05, 0.1], context_fingerprint(["doc-9"]), "p1", index_version=1) is None
+        assert cache.get([1.0, 0.0, 0.1], fp, "p2", index_version=1) is None
+        assert not cache.has_similar([0.0, 1.0, 0.0], "p1", index_version=1)
+
+        # LRU: two newer entries evict the oldest
+        cache.put([0.0, 1.0, 0.0], fp, "p1", {"response": "b", "context": {}}, index_version=1)
+        cache.put([0.0, 0.0, 1.0], fp, "p1", {"response": "c", "context": {}}, index_version=1)
+        assert cache.get([1.0, 0.0, 0.1], fp, "p1", index_version=1) is None
+        # Rebuilt FAISS index drops everything
+        assert cache.get([0.0, 1.0, 0.0], fp, "p1", index_version=2) is None
+        assert cache.stats()["entries"] == 0 and cache.stats()["invalidations"] == 1
+
+        expiring = SemanticAnswerCache(ttl=0.05, threshold=0.9)
+        expiring.put([1.0, 0.0], fp, "p1", {"response": "a", "context": {}})
+        time.sleep(0.1)
+        assert expiring.get([1.0, 0.0], fp, "p1") is None
+        print(f"✅ Semantic answer cache: {cache.stats()}")
+        return True
+    except Exception as e:
+        print(f"❌ Semantic answer cache failed: {e}")
+        return False
+
+
+def test_llm_memo_tiers():
+    try:
+        import tempfile
+        from core.llm_memo import LLMResponseMemo, memo_key
+        params = {"temperature": 0.3, "max_output_tokens": 1000}
+        key = memo_key("models/gemini-2.5-flash", "SYSTEM", "QUERY: aadhaar", params)
+        assert key == memo_key("models/gemini-2.5-flash", "SYSTEM", "QUERY: aadhaar", dict(reversed(list(params.items()))))
+        assert key != memo_key("models/gemini-2.5-flash", "SYSTEM", "QUERY: aadhaar", {**params, "temperature": 0.7})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            memo = LLMResponseMemo(max_entries=1, db_path=f"{tmp}/llm_memo.sqlite")
+            assert memo.get(key) is None
+            memo.put(key, "answer")
+            assert memo.get(key) == "answer"
+            memo.put("other", "x")  # evicts `key` from memory; disk still has it
+            assert memo.get(key) == "answer" and memo.stats()["disk_hits"] == 1
+
+            # Another worker (or a restart) reads the same file
+            restarted = LLMResponseMemo(db_path=f"{tmp}/llm_memo.sqlite")
+            assert restarted.get(key) == "answer"
+            expired = LLMResponseMemo(db_path=f"{tmp}/llm_memo.sqlite", ttl=0)
+            time.sleep(0.01)
+            assert expired.get(key) is None
+            stats = memo.stats()
+
+            # The TTL applies to memory too, and writes delete expired rows
+            short = LLMResponseMemo(db_path=f"{tmp}/short.sqlite", ttl=0.05)
+            short.put(key, "answer")
+            time.sleep(0.1)
+            assert short.get(key) is None
+            short.put("fresh", "y")
+            assert short._conn().execute("SELECT key FROM llm_responses").fetchall() == [("fresh",)]
+
+            # aget/aput keep SQLite off the event loop thread
+            import asyncio
+            import threading
+            threads = []
+            read_disk = memo._read_disk
+            memo._read_disk = lambda k: (threads.append(threading.current_thread()), read_disk(k))[1]
+
+            async def on_loop():
+                memo._entries.clear()
+                assert await memo.aget(key) == "answer" and await memo.aget(key) == "answer"
+                await memo.aput("async", "z")
+            asyncio.run(on_loop())
+            assert len(threads) == 1 and threads[0] is not threading.main_thread()
+            assert restarted.get("async") == "z"
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == round(2 / 3, 4)
+        print(f"✅ LLM memo: {stats}")
+        return True
+    except Exception as e:
+        print(f"❌ LLM memo failed: {e}")
+        return False
+
+
+def test_hashed_intent_model():
+    try:
+        import tempfile
+        from core.intent_classifier import HashedIntentModel, hashed_features, log_understanding, read_intent_log
+        idx, val = hashed_features("Link Aadhaar with mobile", 1 << 12)
+        assert len(idx) == len(set(idx)) and abs(float((val ** 2).sum()) - 1.0) < 1e-5
+
+        templates = {
+            ("aadhar", "respond"): ["how to link aadhaar with mobile", "aadhaar update address", "uidai biometric update"],
+            ("pan", "form_assistance"): ["fill pan application form", "pan card form fields", "how to fill form 49a for pan"],
+            ("passport", "location_service"): ["nearest passport office", "where is passport seva kendra", "passport center near me"],
+        }
+        samples = [(q, {"topic": topic, "action_required": action, "intent": "information_request"})
+                   for (topic, action), queries in templates.items() for q in queries]
+        model = HashedIntentModel.train(samples, dim=1 << 12, epochs=20)
+        predicted = model.predict("aadhar mobile link")  # misspelt, unseen word order
+        assert predicted["topic"][0] == "aadhar" and predicted["topic"][1] > 0.5
+        assert model.predict("passport office where")["action_required"][0] == "location_service"
+        assert set(model.labels) == {"topic", "action_required", "intent"}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model.save(f"{tmp}/model.npz")
+            loaded = HashedIntentModel.load(f"{tmp}/model.npz")
+            assert loaded.predict("pan form")["topic"] == model.predict("pan form")["topic"]
+
+            import os
+            os.environ["INTENT_LOG_PATH"] = f"{tmp}/log.jsonl"
+            try:
+                log_understanding("pan card status", {"topic": "pan", "intent": "information_request"})
+            finally:
+                del os.environ["INTENT_LOG_PATH"]
+            assert read_intent_log(f"{tmp}/log.jsonl")[0] == ("pan card status", {
+                "intent": "information_request", "topic": "pan", "action_required": None, "complexity": None})
+        print(f"✅ Hashed intent model: {predicted}")
+        return True
+    except Exception as e:
+        print(f"❌ Hashed intent model failed: {e}")
+        return False
+
+
+def test_understanding_confidence_adjusts_only_the_topic():
+    from core.intent_classifier import RULE_TOPIC_CONFIDENCE, understanding_confidence
+    predicted = {"intent": ("information_request", 0.3), "topic": ("passport", 0.9),
+                 "action_required": ("respond", 0.95), "complexity": ("simple", 0.9)}
+    # The rule agrees on the topic, but a near-uniform intent head still keeps the query on the LLM
+    assert understanding_confidence(predicted, "passport") == 0.3
+    assert understanding_confidence(predicted, "general") == 0.3
+
+    predicted["intent"] = ("information_request", 0.95)
+    predicted["topic"] = ("passport", 0.4)
+    boosted = 1.0 - 0.6 * (1.0 - RULE_TOPIC_CONFIDENCE)
+    assert abs(understanding_confidence(predicted, "passport") - boosted) < 1e-9
+    # Disagreement halves the topic head only
+    assert abs(understanding_confidence(predicted, "pan") - 0.2) < 1e-9
+    assert understanding_confidence({}, "passport") == 0.0
+    print(f"✅ Understanding confidence: rule-backed topic {boosted:.3f}")
+
+
+def test_llm_refresh_failure_keeps_working_model():
+    try:
+        import json
+        import os
+        import tempfile
+        import core.llm_agent_logic as agents
+
+        probes = []
+        names = ("_probe_models", "_make_llm", "load_dotenv", "LLM_PROBE_CACHE", "GEMINI_LLM", "LLM_INITIALIZED")
+        saved = {name: getattr(agents, name) for name in names}
+        saved_status, saved_key = dict(agents._LLM_STATUS), os.environ.get("GEMINI_API_KEY")
+        with tempfile.TemporaryDirectory() as tmp:
+            agents._probe_models = lambda api_key: probes.pop(0)
+            agents._make_llm = lambda model_name, api_key: object()
+            agents.load_dotenv = lambda *args, **kwargs: None
+            agents.LLM_PROBE_CACHE = f"{tmp}/llm_probe.json"
+            agents.GEMINI_LLM, agents.LLM_INITIALIZED = None, False
+            agents._LLM_STATUS.update(state="not_started", model=None, checked_at=None, source=None, error=None)
+            os.environ["GEMINI_API_KEY"] = "AIzaTestKey0123456789"
+            try:
+                probes.append(("gemini-test", None))
+                agents.initialize_llm(force=True)
+                model = agents.GEMINI_LLM
+                assert agents.llm_ready() and agents.llm_status()["model"] == "gemini-test"
+
+                # A 429 on the periodic re-probe: keep serving, don't publish the failure to other workers
+                probes.append((None, "429 Resource has been exhausted"))
+                agents.initialize_llm(force=True)
+                status = agents.llm_status()
+                assert agents.llm_ready() and agents.GEMINI_LLM is model
+                assert status["state"] == "ready" and status["model"] == "gemini-test" and "429" in status["error"]
+                with open(agents.LLM_PROBE_CACHE) as f:
+                    assert json.load(f)["model"] == "gemini-test"
+
+                # The next successful refresh clears the error
+                probes.append(("gemini-test", None))
+                agents.initialize_llm(force=True)
+                assert agents.GEMINI_LLM is model and agents.llm_status()["error"] is None
+
+                # A worker that never had a model still reports (and shares) the failure
+                agents.GEMINI_LLM, agents.LLM_INITIALIZED = None, False
+                agents._LLM_STATUS.update(state="not_started", model=None)
+                probes.append((None, "429 Resource has been exhausted"))
+                agents.initialize_llm(force=True)
+                assert not agents.llm_ready() and agents.llm_status()["state"] == "unavailable"
+                with open(agents.LLM_PROBE_CACHE) as f:
+                    assert json.load(f)["model"] is None
+            finally:
+                for name, value in saved.items():
+                    setattr(agents, name, value)
+                agents._LLM_STATUS.clear()
+                agents._LLM_STATUS.update(saved_status)
+                if saved_key is None:
+                    os.environ.pop("GEMINI_API_KEY", None)
+                else:
+                    os.environ["GEMINI_API_KEY"] = saved_key
+        print("✅ A failed Gemini refresh keeps the working model")
+        return True
+    except Exception as e:
+        print(f"❌ Gemini refresh failure handling failed: {e}")
+        return False
+
+
+def main():
+    print("🧪 Testing LLM runtime...")
+    tests = [
+        ("Rate Limiter", test_rate_limiter_waits_only_under_pressure),
+        ("Shared Rate Limiter", test_rate_limiter_shared_across_workers),
+        ("Async Rate Limit Wait", test_async_rate_limit_wait_does_not_block_loop),
+        ("Semantic Answer Cache", test_semantic_answer_cache),
+        ("LLM Memo", test_llm_memo_tiers),
+        ("Hashed Intent Model", test_hashed_intent_model),
+        ("Understanding Confidence", test_understanding_confidence_adjusts_only_the_topic),
+        ("Gemini Refresh Failure", test_llm_refresh_failure_keeps_working_model),
+    ]
+    passed = 0
+    for name, fn in tests:
+        print(f"\n🔍 Running {name}...")
+        try:
+            # Newer tests assert instead of returning a bool
+            ok = fn() is not False
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+            ok = False
+        if ok:
+            passed += 1
+        else:
+            print(f"❌ {name} failed")
+    print(f"\n📊 Test Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)